@@ -1,26 +1,47 @@
 # cart/cart.py
 from __future__ import annotations
 
-from decimal import Decimal
-from typing import Dict, Iterable, Iterator, List
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
 
 from django.conf import settings
 from django.utils.functional import cached_property
 
 # Đổi tên key nếu bạn muốn; đảm bảo thống nhất trong context processor & views
 CART_SESSION_ID = getattr(settings, "CART_SESSION_ID", "cart")
+# Key cũ (v1) lưu gói dịch vụ tách riêng — chỉ còn dùng để migrate
+LEGACY_PLANS_SESSION_ID = "cart_plans"
+CART_SESSION_VERSION = 2
+
+
+def to_dong(value) -> int:
+    """Decimal/str/int -> số nguyên đồng (làm tròn nửa lên)."""
+    try:
+        return int(Decimal(str(value or 0)).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+    except Exception:
+        return 0
+
+
+class CartLine(NamedTuple):
+    product_id: int
+    plan_id: Optional[int]
+    quantity: int
+    price: Decimal  # đơn giá (đồng)
 
 
 class Cart:
     """
-    Lưu giỏ hàng vào session theo cấu trúc:
+    Lưu giỏ hàng vào session theo định dạng gọn, có version:
     session[CART_SESSION_ID] = {
-        "<product_id>": {
-            "quantity": int,
-            "price": "decimal-as-string"
-        },
-        ...
+        "v": 2,
+        "l": [[product_id, plan_id|null, quantity, price_dong], ...]
     }
+    - Mỗi sản phẩm tối đa 1 dòng; gói dịch vụ nằm ngay trong dòng (không còn
+      session["cart_plans"] lặp lại tên/kỳ hạn/giá gói dưới dạng chuỗi).
+    - Giá là số nguyên đồng.
+
+    Session cũ (v1: {"<pid>": {"quantity", "price"}} + session["cart_plans"])
+    được chuyển đổi tự động ở lần đọc đầu tiên.
 
     LƯU Ý:
     - KHÔNG lưu object Product vào session (tránh lỗi JSON serializable).
@@ -29,15 +50,58 @@ class Cart:
 
     def __init__(self, request):
         self.session = request.session
-        cart = self.session.get(CART_SESSION_ID)
-        if cart is None:
-            cart = self.session[CART_SESSION_ID] = {}
-        self.cart: Dict[str, Dict] = cart
+        raw = self.session.get(CART_SESSION_ID)
+        self.cart: Dict[str, list] = self._load(raw)
+        # Giỏ chưa có thì KHÔNG ghi gì vào session (context processor chạy ở mọi
+        # request -> tránh tạo bản ghi django_session rỗng cho khách vãng lai).
+        if raw is not None and not (isinstance(raw, dict) and raw.get("v") == CART_SESSION_VERSION):
+            # migrate session cũ sang định dạng mới
+            self.session.pop(LEGACY_PLANS_SESSION_ID, None)
+            self.save()
+
+    # -------------------- Encoding ------------------------
+    def _load(self, raw) -> Dict[str, list]:
+        """Đọc session -> {"<pid>": [plan_id, quantity, price_dong]}."""
+        lines: Dict[str, list] = {}
+        if not raw:
+            return lines
+        if isinstance(raw, dict) and raw.get("v") == CART_SESSION_VERSION:
+            for row in raw.get("l") or []:
+                try:
+                    pid, plan_id, qty, price = row
+                    lines[str(int(pid))] = [int(plan_id) if plan_id else None, int(qty), int(price)]
+                except (TypeError, ValueError):
+                    continue  # dòng hỏng -> bỏ qua
+            return lines
+
+        # v1
+        legacy_plans = self.session.get(LEGACY_PLANS_SESSION_ID) or {}
+        if isinstance(raw, dict):
+            for pid, data in raw.items():
+                try:
+                    plan_id = (legacy_plans.get(str(pid)) or {}).get("plan_id")
+                    lines[str(int(pid))] = [
+                        int(plan_id) if plan_id else None,
+                        int(data.get("quantity", 0)),
+                        to_dong(data.get("price", "0")),
+                    ]
+                except (AttributeError, TypeError, ValueError):
+                    continue
+        return lines
+
+    def _dump(self) -> dict:
+        return {
+            "v": CART_SESSION_VERSION,
+            "l": [[int(pid), plan_id, qty, price] for pid, (plan_id, qty, price) in self.cart.items()],
+        }
 
     # -------------------- Core helpers --------------------
     def save(self) -> None:
-        """Đánh dấu session đã thay đổi."""
-        self.session[CART_SESSION_ID] = self.cart
+        """Ghi lại session & đánh dấu đã thay đổi (giỏ rỗng -> bỏ hẳn key)."""
+        if self.cart:
+            self.session[CART_SESSION_ID] = self._dump()
+        else:
+            self.session.pop(CART_SESSION_ID, None)
         self.session.modified = True
 
     def _norm_id(self, product_id) -> str:
@@ -45,30 +109,47 @@ class Cart:
         return str(product_id)
 
     # -------------------- Public API ----------------------
-    def add(self, product, quantity: int = 1, override_quantity: bool = False, price: Decimal | None = None) -> None:
+    def add(self, product, quantity: int = 1, override_quantity: bool = False,
+            price: Decimal | None = None, plan=None) -> None:
         """
         Thêm/ cập nhật một sản phẩm vào giỏ.
         - product: model Product
         - quantity: số lượng cộng thêm (hoặc set mới nếu override_quantity=True)
         - price: đơn giá (nếu None sẽ lấy product.price)
+        - plan: ServicePlan đã chọn (nếu có)
         """
         pid = self._norm_id(product.id)
         if price is None:
             price = getattr(product, "price", Decimal("0")) or Decimal("0")
 
-        if pid not in self.cart:
-            self.cart[pid] = {"quantity": 0, "price": str(price)}
+        line = self.cart.get(pid) or [None, 0, 0]
+        line[0] = plan.pk if plan is not None else line[0]
+        line[2] = to_dong(price)
         if override_quantity:
-            self.cart[pid]["quantity"] = max(int(quantity or 0), 0)
+            line[1] = max(int(quantity or 0), 0)
         else:
-            self.cart[pid]["quantity"] = int(self.cart[pid]["quantity"]) + int(quantity or 0)
+            line[1] = int(line[1]) + int(quantity or 0)
 
-        if self.cart[pid]["quantity"] <= 0:
+        if line[1] <= 0:
             # tự động loại bỏ nếu số lượng <= 0
-            del self.cart[pid]
+            self.cart.pop(pid, None)
+        else:
+            self.cart[pid] = line
 
         self.save()
 
+    def get(self, product_id) -> Optional[CartLine]:
+        """Dòng giỏ của một sản phẩm (hoặc None)."""
+        pid = self._norm_id(product_id)
+        line = self.cart.get(pid)
+        if line is None:
+            return None
+        plan_id, qty, price = line
+        return CartLine(int(pid), plan_id, int(qty), Decimal(price))
+
+    def __contains__(self, product_id) -> bool:
+        return self._norm_id(product_id) in self.cart
+
     def update(self, product_id, quantity: int) -> None:
         """Set số lượng tuyệt đối cho một item; nếu <=0 thì xóa."""
         pid = self._norm_id(product_id)
@@ -78,9 +159,16 @@ class Cart:
         if qty <= 0:
             del self.cart[pid]
         else:
-            self.cart[pid]["quantity"] = qty
+            self.cart[pid][1] = qty
         self.save()
 
+    def set_price(self, product_id, price: Decimal) -> None:
+        """Cập nhật đơn giá đã lưu của một item (dùng khi định giá lại ở checkout)."""
+        pid = self._norm_id(product_id)
+        if pid in self.cart:
+            self.cart[pid][2] = to_dong(price)
+            self.save()
+
     def remove(self, product_id) -> None:
         """Xóa một sản phẩm khỏi giỏ."""
         pid = self._norm_id(product_id)
@@ -105,26 +193,33 @@ class Cart:
         self.cart = {}
 
     # -------------------- Read-only helpers ----------------
+    def lines(self) -> List[CartLine]:
+        """Các dòng giỏ (không truy vấn DB)."""
+        return [self.get(pid) for pid in self.cart]
+
     def __iter__(self) -> Iterator[dict]:
         """
-        Lặp qua các item, kèm product thực tế & tổng dòng.
-        Truy vấn product 1 lần cho toàn giỏ để tránh N+1.
+        Lặp qua các item, kèm product/plan thực tế & tổng dòng.
+        Truy vấn product (và plan nếu có) 1 lần cho toàn giỏ để tránh N+1.
         """
-        from shop.models import Product  # import chậm để tránh vòng lặp import
+        from shop.models import Product, ServicePlan  # import chậm để tránh vòng lặp import
 
         product_ids: List[str] = list(self.cart.keys())
         products = Product.objects.filter(id__in=product_ids)
         product_map = {str(p.id): p for p in products}
+        plan_ids = {line[0] for line in self.cart.values() if line[0]}
+        plan_map = {pl.id: pl for pl in ServicePlan.objects.filter(id__in=plan_ids)} if plan_ids else {}
 
-        for pid, data in self.cart.items():
+        for pid, (plan_id, qty, price_dong) in self.cart.items():
             product = product_map.get(pid)
             # nếu product đã bị xóa khỏi DB, bỏ qua item rác
             if not product:
                 continue
-            price = Decimal(str(data.get("price", "0")))
-            qty = int(data.get("quantity", 0))
+            price = Decimal(price_dong)
+            qty = int(qty)
             yield {
                 "product": product,
+                "plan": plan_map.get(plan_id),
                 "price": price,
                 "quantity": qty,
                 "total_price": price * qty,
@@ -133,7 +228,7 @@ class Cart:
 
     def __len__(self) -> int:
         """Tổng số lượng sản phẩm (sum quantity)."""
-        return sum(int(item["quantity"]) for item in self.cart.values())
+        return sum(int(line[1]) for line in self.cart.values())
 
     @property
     def total_quantity(self) -> int:
@@ -156,78 +251,3 @@ class Cart:
     @cached_property
     def is_empty(self) -> bool:
         return not bool(self.cart)
-
-
-
-
-# cart/views.py
-import json
-from decimal import Decimal
-from django.contrib.auth.decorators import login_required
-from django.db import transaction
-from django.http import JsonResponse
-from django.shortcuts import redirect
-from django.urls import reverse
-from django.views.decorators.http import require_POST
-
-from .cart import Cart
-from .models import Order, OrderItem
-from shop.models import Product
-
-
-@login_required
-@require_POST
-def checkout_create_order(request):
-    """Nhận JSON: {"items":[{"product_id":13,"quantity":2}, ...]} từ modal xác nhận."""
-    is_ajax = request.headers.get("X-Requested-With") == "XMLHttpRequest"
-
-    items = []
-    if request.content_type.startswith("application/json"):
-        try:
-            payload = json.loads(request.body.decode("utf-8") or "{}")
-            items = payload.get("items") or []
-        except Exception:
-            items = []
-
-    # Fallback nếu sau này bạn cũng submit form (không dùng modal)
-    if not items:
-        ids = request.POST.getlist("selected_item_ids")
-        items = [{"product_id": int(x), "quantity": 0} for x in ids]  # qty sẽ lấy trong cart
-
-    cart = Cart(request)
-    # chỉ giữ những item thật sự đang có trong giỏ
-    selected = []
-    for obj in items:
-        pid = str(obj.get("product_id"))
-        if pid in cart.cart:
-            qty = int(obj.get("quantity") or cart.cart[pid]["quantity"] or 1)
-            selected.append((pid, qty))
-
-    if not selected:
-        if is_ajax:
-            return JsonResponse({"ok": False, "message": "Bạn chưa chọn sản phẩm nào."}, status=400)
-        return redirect("cart:cart_detail")
-
-    with transaction.atomic():
-        order = Order.objects.create(user=request.user, status=Order.Status.PENDING_ADMIN)
-
-        pids = [int(pid) for pid, _ in selected]
-        product_map = {str(p.id): p for p in Product.objects.filter(id__in=pids)}
-
-        bulk = []
-        for pid, qty in selected:
-            prod = product_map.get(pid)
-            if not prod:
-                continue
-            unit_price = Decimal(str(cart.cart[pid]["price"]))  # giá đã lưu trong session
-            bulk.append(OrderItem(order=order, product=prod, quantity=qty, price=unit_price))
-        OrderItem.objects.bulk_create(bulk)
-
-        # chỉ xóa khỏi giỏ các mục đã đặt
-        for pid, _ in selected:
-            cart.remove(pid)
-        cart.save()
-
-    if is_ajax:
-        return JsonResponse({"ok": True, "redirect_url": reverse("cart:checkout_success", args=[order.id])})
-    return redirect("cart:checkout_success", order_id=order.id)
@@ -0,0 +1,19 @@
+# cart/live.py
+"""Watermark cho feed live đơn chờ duyệt (xem shop/live.py)."""
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from shop.live import Watermark, _max_id_loader
+
+from .models import Order
+
+PENDING_ORDERS_WATERMARK = Watermark(_max_id_loader(Order))
+
+
+@receiver(post_save, sender=Order, dispatch_uid="live_pending_orders_watermark")
+def _bump_orders_watermark(sender, instance, created, **kwargs):
+    if created:
+        # checkout tạo Order + bulk_create items trong cùng transaction -> chờ commit
+        pk = instance.pk
+        transaction.on_commit(lambda: PENDING_ORDERS_WATERMARK.bump(pk))
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-19 14:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0005_orderitem_plan'),
+        ('shop', '0023_report_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'confirmed_at'], name='cart_order_status_f4ae54_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(fields=['order', 'product'], name='cart_orderi_order_i_bd3545_idx'),
+        ),
+    ]
@@ -55,6 +55,8 @@ class Order(models.Model):
         ordering = ("-created_at",)
         indexes = [
             models.Index(fields=("status", "created_at")),
+            # trang "đơn đã xác nhận": lọc status + khoảng/sắp xếp confirmed_at
+            models.Index(fields=("status", "confirmed_at")),
         ]
 
     def __str__(self) -> str:
@@ -111,6 +113,9 @@ class OrderItem(models.Model):
     price = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     quantity = models.PositiveIntegerField(default=1)
 
+    class Meta:
+        indexes = [models.Index(fields=("order", "product"))]
+
     def __str__(self) -> str:
         return f"{self.product} x {self.quantity}"
 
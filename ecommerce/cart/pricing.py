@@ -0,0 +1,135 @@
+# cart/pricing.py
+"""
+Định giá lại giỏ hàng ở bước checkout.
+
+Giá trong session chỉ là ảnh chụp lúc bấm "Thêm vào giỏ". Trước khi tạo đơn ta
+nạp toàn bộ Product + ServicePlan được tham chiếu (đúng 2 query), tính lại đơn giá
+và trả về danh sách chênh lệch để báo cho client trong MỘT response.
+
+Response 409 kèm `price_token` (ký bằng SECRET_KEY) ghi đúng các đơn giá khách đã
+thấy; lần gửi lại chỉ được bỏ qua chênh lệch khi giá hiện hành khớp token.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.core import signing
+
+from shop.models import Product, ServicePlan
+
+from .cart import to_dong
+
+CHECKOUT_PRICE_TOKEN_MAX_AGE = getattr(settings, "CHECKOUT_PRICE_TOKEN_MAX_AGE", 15 * 60)
+_TOKEN_SALT = "cart.checkout.prices"
+
+PriceKey = Tuple[int, Optional[int], int]  # (product_id, plan_id, đơn giá đồng)
+
+
+def unit_price(product, plan=None) -> Decimal:
+    """Đơn giá hiện hành: giá gói (nếu có & > 0), ngược lại Product.unit_price."""
+    if plan is not None and plan.price is not None and plan.price > 0:
+        return plan.price
+    return product.unit_price or Decimal("0")
+
+
+@dataclass
+class PricedLine:
+    product: Product
+    plan: Optional[ServicePlan]
+    quantity: int
+    price: Decimal
+
+    @property
+    def plan_id(self) -> Optional[int]:
+        return self.plan.pk if self.plan is not None else None
+
+
+@dataclass
+class Revalidation:
+    lines: List[PricedLine] = field(default_factory=list)
+    drift: List[dict] = field(default_factory=list)        # giá đổi so với session
+    unavailable: List[dict] = field(default_factory=list)  # SP/gói không còn bán
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.drift or self.unavailable)
+
+    def accepted_by(self, seen: Set[PriceKey]) -> bool:
+        """Mọi chênh lệch đều là giá khách đã xem (token) và không có dòng mới ngừng bán."""
+        if self.unavailable or not self.lines:
+            return False
+        return all((d["product_id"], d["plan_id"], to_dong(d["new_price"])) in seen for d in self.drift)
+
+
+def price_token(result: Revalidation, user_id) -> str:
+    """Token ký các đơn giá hiện hành của giỏ, trả kèm response 409."""
+    prices = [[ln.product.pk, ln.plan_id, to_dong(ln.price)] for ln in result.lines]
+    return signing.dumps({"u": user_id, "p": prices}, salt=_TOKEN_SALT, compress=True)
+
+
+def seen_prices(token: Optional[str], user_id) -> Set[PriceKey]:
+    """Các (product_id, plan_id, giá) ghi trong token; token sai/hết hạn/của user khác -> rỗng."""
+    if not token:
+        return set()
+    try:
+        data = signing.loads(token, salt=_TOKEN_SALT, max_age=CHECKOUT_PRICE_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return set()
+    if not isinstance(data, dict) or data.get("u") != user_id:
+        return set()
+    try:
+        return {(int(pid), int(plan_id) if plan_id else None, int(price)) for pid, plan_id, price in data.get("p") or []}
+    except (TypeError, ValueError):
+        return set()
+
+
+def revalidate(selected: Iterable[Tuple[int, Optional[int], int, Decimal]]) -> Revalidation:
+    """
+    selected: các bộ (product_id, plan_id, quantity, giá_trong_session).
+    """
+    selected = list(selected)
+    pids = {pid for pid, _, _, _ in selected}
+    plan_ids = {plan_id for _, plan_id, _, _ in selected if plan_id}
+
+    products: Dict[int, Product] = {p.pk: p for p in Product.objects.filter(pk__in=pids)}
+    plans: Dict[int, ServicePlan] = (
+        {pl.pk: pl for pl in ServicePlan.objects.filter(pk__in=plan_ids)} if plan_ids else {}
+    )
+
+    result = Revalidation()
+    for pid, plan_id, qty, session_price in selected:
+        product = products.get(pid)
+        if product is None or not product.is_active:
+            result.unavailable.append({
+                "product_id": pid,
+                "name": product.name if product else None,
+                "reason": "product_unavailable",
+            })
+            continue
+
+        plan = None
+        if plan_id:
+            plan = plans.get(plan_id)
+            if plan is None or not plan.is_active or plan.product_id != product.pk:
+                result.unavailable.append({
+                    "product_id": pid,
+                    "name": product.name,
+                    "reason": "plan_unavailable",
+                })
+                continue
+
+        price = unit_price(product, plan)
+        # giỏ lưu giá theo đồng nguyên -> so sánh ở cùng đơn vị
+        if session_price is None or to_dong(session_price) != to_dong(price):
+            result.drift.append({
+                "product_id": pid,
+                "name": product.name,
+                "plan_id": plan_id,
+                "old_price": str(session_price) if session_price is not None else None,
+                "new_price": str(price),
+            })
+        result.lines.append(PricedLine(product=product, plan=plan, quantity=qty, price=price))
+    return result
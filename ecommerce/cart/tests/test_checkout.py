@@ -0,0 +1,75 @@
+import json
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from shop.models import Category, Product
+
+from ..cart import CART_SESSION_ID, CART_SESSION_VERSION
+from ..models import Order
+
+
+class CheckoutPriceDriftTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cat = Category.objects.create(name="Danh mục checkout")
+        cls.product = Product.objects.create(name="SP checkout", category=cat, price=Decimal("150000"))
+        cls.user = User.objects.create_user("buyer")
+
+    def setUp(self):
+        cache.clear()  # bộ đếm rate limit
+        self.client.force_login(self.user)
+
+    def _put_in_cart(self, price):
+        session = self.client.session
+        session[CART_SESSION_ID] = {"v": CART_SESSION_VERSION, "l": [[self.product.pk, None, 1, price]]}
+        session.save()
+
+    def _checkout(self, **extra):
+        body = {"items": [{"product_id": self.product.pk, "quantity": 1}], **extra}
+        return self.client.post(reverse("cart:checkout"), json.dumps(body), content_type="application/json",
+                                HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+
+    def test_unchanged_prices_create_order(self):
+        self._put_in_cart(150000)
+        resp = self._checkout()
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(Order.objects.filter(user=self.user).count(), 1)
+
+    def test_drift_returns_409_even_if_client_claims_acceptance(self):
+        self._put_in_cart(100000)
+        resp = self._checkout(accept_price_changes=True)
+        self.assertEqual(resp.status_code, 409)
+        data = resp.json()
+        self.assertEqual(data["drift"][0]["new_price"], "150000.00")
+        self.assertTrue(data["price_token"])
+        self.assertFalse(Order.objects.exists())
+        # giỏ đã được cập nhật theo giá hiện hành
+        self.assertEqual(self.client.session[CART_SESSION_ID]["l"][0][3], 150000)
+
+    def test_resubmit_with_token_accepts_seen_prices(self):
+        self._put_in_cart(100000)
+        token = self._checkout().json()["price_token"]
+        self._put_in_cart(100000)  # vẫn lệch, nhưng đúng giá khách đã xem trong token
+        resp = self._checkout(price_token=token)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(Order.objects.get(user=self.user).items.get().price, Decimal("150000"))
+
+    def test_resubmit_rejects_price_changed_after_409(self):
+        self._put_in_cart(100000)
+        token = self._checkout().json()["price_token"]
+        Product.objects.filter(pk=self.product.pk).update(price=Decimal("180000"))
+        resp = self._checkout(price_token=token)
+        self.assertEqual(resp.status_code, 409)
+        self.assertEqual(resp.json()["drift"][0]["new_price"], "180000.00")
+        self.assertFalse(Order.objects.exists())
+
+    def test_token_of_other_user_is_ignored(self):
+        self._put_in_cart(100000)
+        token = self._checkout().json()["price_token"]
+        self.client.force_login(User.objects.create_user("other"))
+        self._put_in_cart(100000)
+        self.assertEqual(self._checkout(price_token=token).status_code, 409)
@@ -0,0 +1,60 @@
+from decimal import Decimal
+from importlib import import_module
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.test import RequestFactory, TestCase
+
+from shop.models import Category, Product
+
+from ..cart import CART_SESSION_ID, CART_SESSION_VERSION, LEGACY_PLANS_SESSION_ID, Cart
+
+
+def _request(session_data=None):
+    request = RequestFactory().get("/")
+    request.session = import_module(settings.SESSION_ENGINE).SessionStore()
+    for k, v in (session_data or {}).items():
+        request.session[k] = v
+    return request
+
+
+class CartSessionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cat = Category.objects.create(name="Danh mục test")
+        cls.product = Product.objects.create(name="SP test", category=cat, price=Decimal("150000"))
+
+    def test_migrates_v1_session(self):
+        request = _request({
+            CART_SESSION_ID: {"7": {"quantity": 2, "price": "99999.5"}, "8": {"quantity": "x"}},
+            LEGACY_PLANS_SESSION_ID: {"7": {"plan_id": 3, "plan_name": "Gói năm", "price": "99999.5"}},
+        })
+        cart = Cart(request)
+
+        self.assertEqual(request.session[CART_SESSION_ID], {"v": CART_SESSION_VERSION, "l": [[7, 3, 2, 100000]]})
+        self.assertNotIn(LEGACY_PLANS_SESSION_ID, request.session)
+        self.assertEqual(cart.get(7), (7, 3, 2, Decimal(100000)))
+        self.assertIsNone(cart.get(8))  # dòng hỏng bị bỏ
+
+    def test_v2_session_round_trip(self):
+        request = _request()
+        Cart(request).add(self.product, quantity=2, price=Decimal("120000.4"))
+        line = Cart(request).get(self.product.pk)
+        self.assertEqual(line, (self.product.pk, None, 2, Decimal(120000)))
+
+    def test_empty_cart_writes_nothing(self):
+        request = _request()
+        Cart(request)
+        self.assertNotIn(CART_SESSION_ID, request.session)
+
+    def test_add_without_plan_keeps_existing_plan(self):
+        request = _request()
+        cart = Cart(request)
+        cart.add(self.product, quantity=1, price=Decimal("200000"), plan=SimpleNamespace(pk=5))
+        cart.add(self.product, quantity=2, price=Decimal("200000"))  # plan=None: không xóa gói đã chọn
+        self.assertEqual(cart.get(self.product.pk).plan_id, 5)
+        self.assertEqual(cart.get(self.product.pk).quantity, 3)
+
+        cart.add(self.product, quantity=1, override_quantity=True, plan=SimpleNamespace(pk=6))
+        self.assertEqual(cart.get(self.product.pk).plan_id, 6)
+        self.assertEqual(cart.get(self.product.pk).quantity, 1)
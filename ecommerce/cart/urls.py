@@ -24,6 +24,7 @@ urlpatterns = [
 
     # ====== ADMIN DUYỆT ĐƠN ======
     path("admin/orders/pending/", views.admin_pending_orders, name="admin_pending_orders"),
+    path("admin/orders/pending/feed/", views.admin_pending_orders_feed, name="admin_pending_orders_feed"),
     path("admin/orders/<int:order_id>/confirm/", views.admin_confirm_order, name="admin_confirm_order"),
     path("admin/orders/<int:order_id>/cancel/", views.admin_cancel_order, name="admin_cancel_order"),
     path("admin/orders/confirmed/", views.admin_confirmed_orders, name="admin_confirmed_orders"),
@@ -50,9 +50,12 @@ from django.shortcuts import get_object_or_404
 from django.urls import reverse
 
 from shop.models import Product, ServicePlan
+from shop.ratelimit import ratelimit
 from .cart import Cart
+from .pricing import unit_price as current_unit_price
 
 
+@ratelimit("cart_add", json=True)
 def cart_add(request, product_id: int):
     # Bắt buộc đăng nhập
     if not request.user.is_authenticated:
@@ -69,14 +72,6 @@ def cart_add(request, product_id: int):
     cart = Cart(request)
     product = get_object_or_404(Product, pk=product_id, is_active=True)
 
-    # Lấy đơn giá linh hoạt
-    for f in ("price", "unit_price", "sale_price", "final_price", "premium"):
-        if hasattr(product, f) and getattr(product, f) not in (None, "", 0):
-            unit_price = Decimal(str(getattr(product, f)))
-            break
-    else:
-        unit_price = Decimal("0")
-
     # Lấy số lượng
     try:
         qty = int(request.POST.get("quantity", 1) or 1)
@@ -97,25 +92,11 @@ def cart_add(request, product_id: int):
         except (ValueError, ServicePlan.DoesNotExist):
             return JsonResponse({"ok": False, "error": "Gói dịch vụ không hợp lệ."}, status=400)
 
-        # Nếu muốn tính giá theo gói:
-        if getattr(plan, "price", None) not in (None, "", 0):
-            unit_price = Decimal(str(plan.price))
-
-    # => Gọi cart.add KHÔNG dùng kwargs lạ
-    cart.add(product, quantity=qty, price=unit_price)
-
-    # Lưu mapping plan vào session để dùng ở bước checkout
-    if plan:
-        plans = request.session.get("cart_plans", {})
-        plans[str(product.id)] = {
-            "plan_id": plan.id,
-            "plan_name": plan.name,
-            "plan_term": plan.term,
-            "plan_days": plan.duration_days(),
-            "plan_price": str(plan.price) if getattr(plan, "price", None) not in (None, "", 0) else None,
-        }
-        request.session["cart_plans"] = plans
-        request.session.modified = True
+    # Đơn giá: cùng quy tắc với bước định giá lại ở checkout (cart/pricing.py)
+    unit_price = current_unit_price(product, plan)
+
+    # Gói đã chọn lưu ngay trong dòng giỏ (dùng ở bước checkout)
+    cart.add(product, quantity=qty, price=unit_price, plan=plan)
 
     return JsonResponse({
         "ok": True,
@@ -153,11 +134,10 @@ def cart_update(request, product_id: int):
         qty = 1
     cart.update(product_id, qty)
 
-    pid = str(product_id)
-    if pid in cart.cart:
-        price = Decimal(str(cart.cart[pid]["price"]))
-        line_total = float(price * Decimal(cart.cart[pid]["quantity"]))
-        quantity = int(cart.cart[pid]["quantity"])
+    line = cart.get(product_id)
+    if line is not None:
+        line_total = float(line.price * line.quantity)
+        quantity = line.quantity
     else:
         line_total = 0.0
         quantity = 0
@@ -186,6 +166,8 @@ from django.http import JsonResponse
 
 # --- CẬP NHẬT HÀNH VI consult_request: lưu về admin ---
 @require_POST
+@ratelimit("consult_form", key="ip", json=True,
+           message="Bạn đã gửi nhiều yêu cầu tư vấn. Vui lòng thử lại sau ít phút.")
 def consult_request(request):
     """
     Nhận: name, phone, note, product_id, product_name
@@ -221,6 +203,7 @@ import json
 
 from .cart import Cart
 from .models import Order, OrderItem
+from shop.signals import order_lines_created
 from shop.models import Product
 # cart/views.py
 # cart/views.py
@@ -235,11 +218,13 @@ import json
 
 from .cart import Cart
 from .models import Order, OrderItem
+from .pricing import price_token, revalidate, seen_prices
 from shop.models import Product
 
 
 @login_required
 @require_POST
+@ratelimit("checkout")
 def checkout_create_order(request):
     """Xử lý đặt hàng từ form hoặc từ AJAX."""
     is_ajax = request.headers.get("x-requested-with") == "XMLHttpRequest"
@@ -247,10 +232,13 @@ def checkout_create_order(request):
     cart = Cart(request)
 
     items = []
+    token = None
     if request.content_type.startswith("application/json"):
         try:
             payload = json.loads(request.body.decode("utf-8") or "{}")
             items = payload.get("items") or []
+            # token từ response 409 trước đó: các đơn giá khách đã xem & đồng ý
+            token = payload.get("price_token")
         except Exception:
             items = []
 
@@ -262,10 +250,10 @@ def checkout_create_order(request):
     # lọc item còn trong giỏ
     selected = []
     for obj in items:
-        pid = str(obj.get("product_id"))
-        if pid in cart.cart:
-            qty = int(obj.get("quantity") or cart.cart[pid]["quantity"] or 1)
-            selected.append((pid, qty))
+        line = cart.get(obj.get("product_id"))
+        if line is not None:
+            qty = int(obj.get("quantity") or line.quantity or 1)
+            selected.append((line.product_id, line.plan_id, qty, line.price))
 
     if not selected:
         if is_ajax:
@@ -273,25 +261,42 @@ def checkout_create_order(request):
         messages.error(request, "Bạn chưa chọn sản phẩm nào để thanh toán.")
         return redirect("cart:cart_detail")
 
+    # Định giá lại toàn bộ dòng đã chọn (2 query: Product + ServicePlan)
+    priced = revalidate(selected)
+    if priced.changed:
+        # cập nhật giỏ theo giá hiện hành & bỏ dòng không còn bán
+        for d in priced.drift:
+            cart.set_price(d["product_id"], Decimal(d["new_price"]))
+        for u in priced.unavailable:
+            cart.remove(u["product_id"])
+
+        if not priced.accepted_by(seen_prices(token, request.user.pk)):
+            msg = ("Giá hoặc tình trạng một số sản phẩm đã thay đổi. "
+                   "Vui lòng kiểm tra lại trước khi đặt hàng.")
+            if is_ajax:
+                return JsonResponse({
+                    "ok": False,
+                    "price_changed": True,
+                    "drift": priced.drift,
+                    "unavailable": priced.unavailable,
+                    "price_token": price_token(priced, request.user.pk) if priced.lines else None,
+                    "message": msg,
+                }, status=409)
+            messages.warning(request, msg)
+            return redirect("cart:cart_detail")
+
     with transaction.atomic():
         order = Order.objects.create(user=request.user, status=Order.Status.PENDING_ADMIN)
-
-        pids = [int(pid) for pid, _ in selected]
-        product_map = {str(p.id): p for p in Product.objects.filter(id__in=pids)}
-
-        bulk = []
-        for pid, qty in selected:
-            prod = product_map.get(pid)
-            if not prod:
-                continue
-            unit_price = Decimal(str(cart.cart[pid]["price"]))
-            bulk.append(OrderItem(order=order, product=prod, quantity=qty, price=unit_price))
-        OrderItem.objects.bulk_create(bulk)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=ln.product, plan_id=ln.plan_id,
+                      quantity=ln.quantity, price=ln.price)
+            for ln in priced.lines
+        ])
+        # bulk_create không phát post_save -> báo cho read model SalesLine
+        order_lines_created.send(sender=Order, order=order)
 
         # xóa item đã đặt khỏi giỏ
-        for pid, _ in selected:
-            cart.remove(pid)
-        cart.save()
+        cart.remove_many(ln.product.pk for ln in priced.lines)
 
     # trả về cho AJAX hoặc redirect thường
     if is_ajax:
@@ -386,12 +391,17 @@ from django.contrib.admin.views.decorators import staff_member_required
 from django.core.paginator import Paginator
 from django.http import JsonResponse, HttpResponseForbidden
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.http import require_POST
+from django.template.loader import render_to_string
+from django.views.decorators.http import require_GET, require_POST
+from shop.live import live_feed_response
+from .live import PENDING_ORDERS_WATERMARK
 from .models import Order
 
 @staff_member_required
 def admin_pending_orders(request):
     """Trang liệt kê các đơn CHỜ xác nhận + hiển thị chi tiết từng item."""
+    # đọc watermark trước khi query; đơn tạo xen giữa sẽ đến qua feed (JS tự bỏ trùng)
+    feed_after = PENDING_ORDERS_WATERMARK.current()
     qs = (Order.objects
           .filter(status=Order.Status.PENDING_ADMIN)
           .select_related("user")
@@ -411,8 +421,32 @@ def admin_pending_orders(request):
     return render(request, "cart/admin_pending_orders.html", {
         "orders": orders,
         "recent_confirmed": recent_confirmed,
+        "feed_after": feed_after,
+        # đơn cũ trước -> đơn mới chỉ nối vào cuối khi đang ở trang cuối
+        "feed_append": not orders.has_next(),
     })
 
+
+@staff_member_required
+@require_GET
+def admin_pending_orders_feed(request):
+    """
+    SSE (hoặc long-poll ?poll=1): đẩy các đơn PENDING_ADMIN mới tạo.
+    Client gửi ?after=<id> (hoặc header Last-Event-ID khi tự nối lại).
+    """
+    def fetch_new(after, limit):
+        return (Order.objects
+                .filter(pk__gt=after, status=Order.Status.PENDING_ADMIN)
+                .select_related("user")
+                .prefetch_related("items__product")
+                .order_by("pk")[:limit])
+
+    def render_item(o):
+        html = render_to_string("cart/_pending_order_card.html", {"o": o}, request=request)
+        return {"id": o.pk, "html": html}
+
+    return live_feed_response(request, PENDING_ORDERS_WATERMARK, fetch_new, render_item)
+
 @staff_member_required
 @require_POST
 def admin_confirm_order(request, order_id: int):
@@ -451,10 +485,21 @@ def admin_cancel_order(request, order_id: int):
 # cart/views.py
 from django.contrib.admin.views.decorators import staff_member_required
 from django.core.paginator import Paginator
+from datetime import timedelta
 from django.db.models import Q
 from django.shortcuts import render
+from django.utils.dateparse import parse_date
+from shop.facts import day_start
 from .models import Order
 
+
+def _parse_day(value):
+    """YYYY-MM-DD -> date; rỗng/sai định dạng -> None (bỏ qua bộ lọc)."""
+    try:
+        return parse_date(value) if value else None
+    except ValueError:
+        return None
+
 @staff_member_required
 def admin_confirmed_orders(request):
     """
@@ -478,11 +523,13 @@ def admin_confirmed_orders(request):
 
     date_from = (request.GET.get("date_from") or "").strip()
     date_to   = (request.GET.get("date_to") or "").strip()
-    # lọc theo ngày xác nhận (nếu có)
-    if date_from:
-        qs = qs.filter(confirmed_at__date__gte=date_from)
-    if date_to:
-        qs = qs.filter(confirmed_at__date__lte=date_to)
+    # lọc theo ngày xác nhận (nếu có); so sánh khoảng thời điểm thay vì __date
+    # để dùng được index (status, confirmed_at)
+    d_from, d_to = _parse_day(date_from), _parse_day(date_to)
+    if d_from:
+        qs = qs.filter(confirmed_at__gte=day_start(d_from))
+    if d_to:
+        qs = qs.filter(confirmed_at__lt=day_start(d_to + timedelta(days=1)))
 
     paginator = Paginator(qs, 15)  # 15 đơn/trang (điều chỉnh tùy ý)
     page = request.GET.get("page") or 1
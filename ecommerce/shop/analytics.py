@@ -0,0 +1,407 @@
+# shop/analytics.py
+"""
+Ghi PageView bất đồng bộ.
+
+Middleware chỉ đẩy 1 dict sự kiện vào hàng đợi trong bộ nhớ (có giới hạn) rồi
+trả request ngay (ASGI: qua asyncio.Queue của AsyncPageViewRelay). Một thread nền gom sự kiện và ghi bằng bulk_create mỗi
+PAGEVIEW_FLUSH_EVERY sự kiện hoặc PAGEVIEW_FLUSH_SECONDS giây; khi process tắt
+thì flush nốt phần còn lại (atexit).
+
+PAGEVIEW_ASYNC (mặc định None = tự chọn): khi DEBUG hoặc đang chạy test
+(django.core.mail.outbox tồn tại) thì ghi đồng bộ ngay trong request, trên kết
+nối của request -> nằm trong transaction của test, không có thread nền/atexit
+ghi vào DB test đã bị xóa. True/False ép chế độ.
+
+Luật "1 lượt / ngày / session":
+- Middleware hỏi SeenTodayFilter (Bloom filter trong bộ nhớ, đổi mới mỗi ngày)
+  trước; session đã thấy hôm nay thì không xếp hàng nữa. Session chỉ được đánh
+  dấu khi sự kiện đã vào hàng đợi của writer (hàng đợi đầy -> lần sau thử lại).
+- Filter không chắc chắn (miss) -> writer kiểm tra lại bằng DB: lọc trùng
+  trong lô + 1 query cho cả lô để bỏ các session đã có lượt hôm nay.
+"""
+from __future__ import annotations
+
+import asyncio
+import atexit
+import hashlib
+import logging
+import math
+import os
+import queue
+import threading
+import time
+import weakref
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.core import mail
+from django.db import close_old_connections, transaction
+from django.urls import Resolver404, resolve
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+PAGEVIEW_QUEUE_MAX = getattr(settings, "PAGEVIEW_QUEUE_MAX", 10000)
+PAGEVIEW_FLUSH_EVERY = getattr(settings, "PAGEVIEW_FLUSH_EVERY", 200)
+PAGEVIEW_FLUSH_SECONDS = getattr(settings, "PAGEVIEW_FLUSH_SECONDS", 2.0)
+# None: ghi nền, trừ khi DEBUG / chạy test; True/False: luôn nền / luôn đồng bộ
+PAGEVIEW_ASYNC = getattr(settings, "PAGEVIEW_ASYNC", None)
+# Hàng đợi asyncio cho ASGI (mỗi event loop 1 hàng đợi)
+PAGEVIEW_ASYNC_QUEUE_MAX = getattr(settings, "PAGEVIEW_ASYNC_QUEUE_MAX", 10000)
+# Bloom filter "đã đếm hôm nay": ~1.44 * capacity * log2(1/fp) bit
+# (mặc định 100k session, fp 0.1% -> ~175 KB mỗi process)
+PAGEVIEW_SEEN_FILTER_CAPACITY = getattr(settings, "PAGEVIEW_SEEN_FILTER_CAPACITY", 100_000)
+PAGEVIEW_SEEN_FILTER_FP_RATE = getattr(settings, "PAGEVIEW_SEEN_FILTER_FP_RATE", 0.001)
+
+
+def _start_of_day(dt=None):
+    local = timezone.localtime(dt or timezone.now())
+    return local.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class BloomFilter:
+    """Bloom filter tối giản trên bytearray (k hàm băm suy từ 1 lần blake2b)."""
+
+    def __init__(self, capacity: int, fp_rate: float):
+        capacity = max(1, int(capacity))
+        fp_rate = min(max(float(fp_rate), 1e-9), 0.5)
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.num_bits = max(8, int(math.ceil(-capacity * math.log(fp_rate) / (math.log(2) ** 2))))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8", "ignore"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def __contains__(self, key: str) -> bool:
+        bits = self._bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def add(self, key: str) -> bool:
+        """Thêm key; trả True nếu key CHƯA có (ít nhất 1 bit mới được bật)."""
+        bits = self._bits
+        new = False
+        for pos in self._positions(key):
+            mask = 1 << (pos & 7)
+            if not bits[pos >> 3] & mask:
+                bits[pos >> 3] |= mask
+                new = True
+        if new:
+            self.count += 1
+        return new
+
+    @property
+    def saturated(self) -> bool:
+        return self.count >= self.capacity
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self._bits)
+
+
+class SeenTodayFilter:
+    """
+    "Session này đã được đếm hôm nay chưa?" trả lời trong bộ nhớ.
+
+    - Tự đổi filter mới khi sang ngày (theo giờ địa phương).
+    - Bộ nhớ cố định theo capacity/fp_rate. Khi filter đầy (vượt capacity)
+      thì ngừng khẳng định "đã thấy" để tỉ lệ sai không tăng -> mọi thứ rơi về
+      kiểm tra DB ở writer.
+    - Chỉ là bộ lọc trước: dương tính giả nghĩa là bỏ sót 1 lượt (xác suất ~fp_rate),
+      âm tính thì luôn được DB kiểm tra lại.
+    """
+
+    def __init__(self, capacity: int = PAGEVIEW_SEEN_FILTER_CAPACITY,
+                 fp_rate: float = PAGEVIEW_SEEN_FILTER_FP_RATE):
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self._lock = threading.Lock()
+        self._day = None
+        self._bloom: Optional[BloomFilter] = None
+
+    def _current(self) -> BloomFilter:
+        today = timezone.localdate()
+        if self._bloom is None or self._day != today:
+            self._bloom = BloomFilter(self.capacity, self.fp_rate)
+            self._day = today
+        return self._bloom
+
+    def seen(self, key: str) -> bool:
+        """True nếu (gần như chắc chắn) đã thấy hôm nay. Không ghi nhận — xem mark()."""
+        if not key:
+            return False
+        with self._lock:
+            bloom = self._current()
+            return not bloom.saturated and key in bloom
+
+    def mark(self, key: str) -> None:
+        """Ghi nhận key cho hôm nay (gọi sau khi sự kiện đã vào hàng đợi)."""
+        if not key:
+            return
+        with self._lock:
+            bloom = self._current()
+            if not bloom.saturated:
+                bloom.add(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            bloom = self._current()
+            return {
+                "day": str(self._day),
+                "count": bloom.count,
+                "capacity": bloom.capacity,
+                "bits": bloom.num_bits,
+                "hashes": bloom.num_hashes,
+                "bytes": bloom.size_bytes,
+                "saturated": bloom.saturated,
+            }
+
+
+class PageViewWriter:
+    """Hàng đợi có giới hạn + thread nền ghi PageView theo lô."""
+
+    def __init__(self, max_queue: int = PAGEVIEW_QUEUE_MAX, batch_size: int = PAGEVIEW_FLUSH_EVERY,
+                 flush_seconds: float = PAGEVIEW_FLUSH_SECONDS, seen: Optional[SeenTodayFilter] = None):
+        self.batch_size = max(1, batch_size)
+        self.flush_seconds = flush_seconds
+        self._queue: "queue.Queue[dict]" = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self.dropped = 0  # số sự kiện bị bỏ vì hàng đợi đầy
+        self.seen = seen  # đánh dấu "đã đếm hôm nay" khi xếp hàng thành công
+
+    # ---------- phía request ----------
+    @property
+    def buffered(self) -> bool:
+        """Ghi qua hàng đợi + thread nền (False: ghi ngay trong request)."""
+        if PAGEVIEW_ASYNC is not None:
+            return bool(PAGEVIEW_ASYNC)
+        # setup_test_environment() tạo mail.outbox, teardown thì xóa
+        return not settings.DEBUG and not hasattr(mail, "outbox")
+
+    def put(self, event: dict) -> bool:
+        """Không bao giờ chặn: hàng đợi đầy thì bỏ sự kiện (session chưa bị đánh dấu)."""
+        if not self.buffered:
+            self._write([event], own_connection=False)
+            if self.seen is not None:
+                self.seen.mark(event.get("session_key"))
+            return True
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        if self.seen is not None:
+            self.seen.mark(event.get("session_key"))
+        return True
+
+    # ---------- vòng đời thread ----------
+    def _ensure_started(self) -> None:
+        # Sau fork (gunicorn preload) thread của process cha không còn -> khởi động lại
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._stop.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="pageview-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Dừng thread và ghi nốt sự kiện còn trong hàng đợi (không làm gì nếu chưa từng chạy nền)."""
+        t = self._thread
+        if t is None or self._pid != os.getpid():
+            return
+        self._stop.set()
+        if t.is_alive():
+            t.join(timeout)
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            batch = self._collect()
+            if batch:
+                self._write(batch)
+
+    def _collect(self) -> List[dict]:
+        """Gom tới batch_size sự kiện hoặc tới khi hết flush_seconds."""
+        batch: List[dict] = []
+        deadline = time.monotonic() + self.flush_seconds
+        while len(batch) < self.batch_size and not self._stop.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=min(remaining, 0.5)))
+            except queue.Empty:
+                continue
+        return batch
+
+    def flush(self) -> int:
+        """Ghi đồng bộ mọi thứ đang chờ (dùng khi tắt process, hoặc trong lệnh/test)."""
+        written = 0
+        while True:
+            batch: List[dict] = []
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            if not batch:
+                return written
+            written += self._write(batch)
+
+    # ---------- ghi DB ----------
+    def _write(self, batch: List[dict], own_connection: bool = True) -> int:
+        """own_connection=False: chạy trong request, dùng (và không đóng) kết nối của request."""
+        from .models import PageView, Product
+
+        with self._write_lock:
+            if own_connection:
+                close_old_connections()
+            try:
+                rows = self._dedupe(batch)
+                if not rows:
+                    return 0
+                # map trang chi tiết sản phẩm -> product_id (1 query cho cả lô)
+                for r in rows:
+                    r["product_slug"] = product_slug_for(r["path"])
+                slugs = {r["product_slug"] for r in rows if r["product_slug"]}
+                product_ids: Dict[str, int] = (
+                    dict(Product.objects.filter(slug__in=slugs).values_list("slug", "id")) if slugs else {}
+                )
+                objs = [
+                    PageView(
+                        path=r["path"][:300],
+                        referer=(r.get("referer") or "")[:300],
+                        user_agent=(r.get("user_agent") or "")[:300],
+                        ip=r.get("ip") or None,
+                        session_key=r["session_key"],
+                        user_id=r.get("user_id"),
+                        product_id=product_ids.get(r["product_slug"]),
+                        is_bot=bool(r.get("is_bot")),
+                        created_at=r["created_at"],
+                    )
+                    for r in rows
+                ]
+                return self._insert(objs)
+            except Exception:
+                logger.exception("Không ghi được %d PageView", len(batch))
+                return 0
+            finally:
+                if own_connection:
+                    close_old_connections()
+
+    def _insert(self, objs: list) -> int:
+        """bulk_create; lỗi thì chia đôi lô và thử lại -> chỉ bỏ đúng dòng hỏng (vd. user/product vừa bị xóa)."""
+        from .models import PageView
+
+        try:
+            # savepoint: dòng lỗi không làm hỏng transaction của request (chế độ đồng bộ)
+            with transaction.atomic():
+                PageView.objects.bulk_create(objs, batch_size=self.batch_size)
+            return len(objs)
+        except Exception:
+            if len(objs) == 1:
+                logger.warning("Bỏ 1 PageView không ghi được (%s)", objs[0].path, exc_info=True)
+                return 0
+        mid = len(objs) // 2
+        return self._insert(objs[:mid]) + self._insert(objs[mid:])
+
+    def _dedupe(self, batch: List[dict]) -> List[dict]:
+        """1 lượt / ngày / session (ngày theo giờ request): bỏ trùng trong lô + bỏ lượt đã có trong DB."""
+        from .models import PageView
+
+        seen = set()
+        rows = []
+        for ev in batch:
+            key = ev.get("session_key")
+            ev.setdefault("created_at", timezone.now())
+            day_key = (key, timezone.localdate(ev["created_at"]))
+            if not key or day_key in seen:
+                continue
+            seen.add(day_key)
+            rows.append(ev)
+        if not rows:
+            return rows
+        start = _start_of_day(min(r["created_at"] for r in rows))
+        existing = {
+            (key, timezone.localdate(created))
+            for key, created in PageView.objects
+            .filter(session_key__in={k for k, _ in seen}, created_at__gte=start)
+            .values_list("session_key", "created_at")
+        }
+        return [r for r in rows if (r["session_key"], timezone.localdate(r["created_at"])) not in existing]
+
+
+def product_slug_for(path: str) -> Optional[str]:
+    """Slug sản phẩm nếu path là trang chi tiết sản phẩm."""
+    try:
+        match = resolve(path)
+    except Resolver404:
+        return None
+    if match.url_name == "product_detail":
+        return match.kwargs.get("slug")
+    return None
+
+
+class AsyncPageViewRelay:
+    """
+    Phía ASGI: request chỉ put_nowait vào asyncio.Queue của event loop hiện tại;
+    1 task nền (mỗi loop) rút hàng đợi và chuyển sang PageViewWriter.
+    Không await gì trên đường đi của request, không nhảy sang thread.
+    """
+
+    def __init__(self, writer: PageViewWriter, max_queue: int = PAGEVIEW_ASYNC_QUEUE_MAX):
+        self.writer = writer
+        self.max_queue = max_queue
+        self._queues: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, tuple]" = weakref.WeakKeyDictionary()
+        self.dropped = 0
+
+    def put(self, event: dict) -> bool:
+        """Gọi từ trong event loop; không bao giờ chặn."""
+        q = self._queue_for(asyncio.get_running_loop())
+        try:
+            q.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+
+    def _queue_for(self, loop: asyncio.AbstractEventLoop) -> asyncio.Queue:
+        entry = self._queues.get(loop)
+        if entry is None or entry[1].done():
+            q: asyncio.Queue = asyncio.Queue(maxsize=self.max_queue)
+            task = loop.create_task(self._drain(q), name="pageview-relay")
+            entry = self._queues[loop] = (q, task)
+        return entry[0]
+
+    async def _drain(self, q: asyncio.Queue) -> None:
+        while True:
+            event = await q.get()
+            try:
+                self.writer.put(event)
+                # rút nốt phần đang chờ trong 1 lượt, không nhường loop từng cái
+                while True:
+                    self.writer.put(q.get_nowait())
+            except asyncio.QueueEmpty:
+                pass
+            except Exception:
+                logger.exception("PageView relay lỗi")
+
+
+seen_today = SeenTodayFilter()
+pageview_writer = PageViewWriter(seen=seen_today)
+pageview_relay = AsyncPageViewRelay(pageview_writer)
+atexit.register(pageview_writer.stop)
@@ -5,4 +5,12 @@ class ShopConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'shop'
 
+    def ready(self):
+        from . import live  # noqa: F401  (đăng ký signal watermark cho feed live)
+        from . import cube  # noqa: F401  (signal làm mới cube báo cáo)
+        from . import facts  # noqa: F401  (signal cập nhật OrderDailyFact)
+        from . import sales  # noqa: F401  (signal đồng bộ SalesLine)
+        from . import consult_stats  # noqa: F401  (signal cập nhật sketch thời gian xử lý tư vấn)
+        from . import assignment  # noqa: F401  (signal tự phân công tư vấn + bảng tải)
+
 
@@ -0,0 +1,226 @@
+# shop/archive.py
+"""
+Lưu trữ lạnh PageView cũ.
+
+- Dòng cũ hơn PAGEVIEW_RETENTION_DAYS được ghi ra file gzip JSONL theo ngày:
+      <PAGEVIEW_ARCHIVE_DIR>/YYYY/MM/pageviews-YYYY-MM-DD.jsonl.gz
+  rồi xóa khỏi DB theo lô nhỏ (giống session_sweeper).
+- Trước khi xóa luôn chạy rollup để PageViewDaily đã có đủ số liệu; chỉ xóa
+  những dòng đã nằm dưới watermark của rollup (watermark có độ trễ an toàn
+  cho dòng commit trễ, xem rollups.PAGEVIEW_ROLLUP_LAG_SECONDS).
+- Thư mục lưu trữ là PAGEVIEW_ARCHIVE_DIR: báo cáo đọc lại file từ đó, nên
+  không đổi được theo từng lần chạy.
+- Chạy lại an toàn: id đã có trong file của ngày đó sẽ không ghi lặp; dòng
+  đã ghi file nhưng chưa kịp xóa (tiến trình chết giữa 2 bước) được xóa ở lần sau.
+- Báo cáo cần dòng thô thì đọc qua iter_rows (file + DB): id trong file là
+  danh sách đã lưu trữ, dòng DB trùng id bị bỏ -> không đếm 2 lần.
+
+    python manage.py archive_pageviews --days 90
+"""
+from __future__ import annotations
+
+import glob
+import gzip
+import json
+import os
+import shutil
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import PageView, RollupWatermark
+
+PAGEVIEW_RETENTION_DAYS = getattr(settings, "PAGEVIEW_RETENTION_DAYS", 90)
+PAGEVIEW_ARCHIVE_DIR = getattr(
+    settings, "PAGEVIEW_ARCHIVE_DIR",
+    os.path.join(str(getattr(settings, "BASE_DIR", os.getcwd())), "archive", "pageviews"),
+)
+ARCHIVE_BATCH_SIZE = getattr(settings, "PAGEVIEW_ARCHIVE_BATCH_SIZE", 1000)
+ARCHIVE_PAUSE_SECONDS = getattr(settings, "PAGEVIEW_ARCHIVE_PAUSE_SECONDS", 0.05)
+
+FIELDS = ("id", "created_at", "path", "referer", "user_agent", "ip", "session_key", "user_id", "product_id", "is_bot")
+
+
+def partition_path(day: date, base: Optional[str] = None) -> str:
+    return os.path.join(base or PAGEVIEW_ARCHIVE_DIR, f"{day:%Y}", f"{day:%m}", f"pageviews-{day:%Y-%m-%d}.jsonl.gz")
+
+
+def has_partition(day: date, base: Optional[str] = None) -> bool:
+    return os.path.exists(partition_path(day, base))
+
+
+def iter_partition(day: date, base: Optional[str] = None) -> Iterator[dict]:
+    """Đọc từng dòng của 1 ngày đã lưu trữ (created_at đã parse lại thành datetime)."""
+    path = partition_path(day, base)
+    if not os.path.exists(path):
+        return
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        for line in fh:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            row["created_at"] = parse_datetime(row["created_at"])
+            yield row
+
+
+def _day_bounds(day: date) -> Tuple[datetime, datetime]:
+    start = timezone.make_aware(datetime.combine(day, datetime.min.time()))
+    return start, timezone.make_aware(datetime.combine(day + timedelta(days=1), datetime.min.time()))
+
+
+def iter_range(lo: datetime, hi: datetime, base: Optional[str] = None) -> Iterator[dict]:
+    """Các dòng đã lưu trữ có created_at trong [lo, hi)."""
+    day = timezone.localtime(lo).date()
+    last = timezone.localtime(hi).date()
+    while day <= last:
+        for row in iter_partition(day, base):
+            if lo <= row["created_at"] < hi:
+                yield row
+        day += timedelta(days=1)
+
+
+def iter_rows(lo: datetime, hi: datetime, product_id: Optional[int] = None,
+              base: Optional[str] = None) -> Iterator[dict]:
+    """
+    Mọi dòng PageView trong [lo, hi): file lưu trữ trước, rồi DB. Dòng DB có id
+    đã nằm trong file (ghi xong nhưng chưa xóa) bị bỏ qua.
+    """
+    archived = set()
+    for row in iter_range(lo, hi, base):
+        if product_id is not None and row.get("product_id") != product_id:
+            continue
+        archived.add(row["id"])
+        yield row
+    qs = PageView.objects.filter(created_at__gte=lo, created_at__lt=hi)
+    if product_id is not None:
+        qs = qs.filter(product_id=product_id)
+    for row in qs.values(*FIELDS).iterator(chunk_size=2000):
+        if row["id"] not in archived:
+            yield row
+
+
+def visitor_key(row: dict) -> str:
+    """Khóa khách của 1 dòng lưu trữ (giống rollups.session_expr)."""
+    return row.get("session_key") or f"{row.get('ip') or ''}|{row.get('user_agent') or ''}"
+
+
+def daily_counts(lo: datetime, hi: datetime, base: Optional[str] = None) -> Dict[date, Tuple[int, int]]:
+    """{ngày: (views, sessions)} của người thật trong [lo, hi) (file lưu trữ + DB, mỗi id 1 lần)."""
+    views: Dict[date, int] = {}
+    keys: Dict[date, set] = {}
+    for row in iter_rows(lo, hi, base=base):
+        if row.get("is_bot"):
+            continue
+        d = timezone.localtime(row["created_at"]).date()
+        views[d] = views.get(d, 0) + 1
+        keys.setdefault(d, set()).add(visitor_key(row))
+    return {d: (n, len(keys[d])) for d, n in views.items()}
+
+
+def partition_days(base: Optional[str] = None) -> List[date]:
+    """Các ngày đã có partition (tăng dần)."""
+    days = []
+    for path in glob.glob(os.path.join(base or PAGEVIEW_ARCHIVE_DIR, "*", "*", "pageviews-*.jsonl.gz")):
+        try:
+            days.append(date.fromisoformat(os.path.basename(path)[len("pageviews-"):-len(".jsonl.gz")]))
+        except ValueError:
+            continue
+    return sorted(days)
+
+
+@dataclass
+class ArchiveResult:
+    days: int = 0
+    written: int = 0
+    deleted: int = 0
+
+
+def archive_pageviews(
+    *,
+    older_than_days: int = PAGEVIEW_RETENTION_DAYS,
+    batch_size: int = ARCHIVE_BATCH_SIZE,
+    pause: float = ARCHIVE_PAUSE_SECONDS,
+    dry_run: bool = False,
+    base: Optional[str] = None,
+    log: Optional[Callable[[str], None]] = None,
+) -> ArchiveResult:
+    from .rollups import WATERMARK_NAME, rollup_pageviews  # import chậm: rollups dùng module này
+
+    log = log or (lambda msg: None)
+    batch_size = max(1, int(batch_size))
+    result = ArchiveResult()
+    cutoff, _ = _day_bounds(timezone.localdate() - timedelta(days=max(0, older_than_days)))
+
+    if not dry_run:
+        rollup_pageviews()
+    rolled_up_to = RollupWatermark.objects.filter(name=WATERMARK_NAME).values_list("last_id", flat=True).first() or 0
+
+    old = PageView.objects.filter(created_at__lt=cutoff, id__lte=rolled_up_to)
+    first = old.order_by("created_at").values_list("created_at", flat=True).first()
+    if first is None:
+        return result
+
+    day = timezone.localtime(first).date()
+    while True:
+        start, end = _day_bounds(day)
+        if start >= cutoff:
+            break
+        qs = old.filter(created_at__gte=start, created_at__lt=end)
+        if dry_run:
+            n = qs.count()
+            if n:
+                result.days += 1
+                result.written += n
+        else:
+            ids = _write_partition(day, qs, base)
+            if ids:
+                result.days += 1
+                result.written += len(ids)
+                for i in range(0, len(ids), batch_size):
+                    result.deleted += PageView.objects.filter(id__in=ids[i:i + batch_size]).delete()[0]
+                    if pause:
+                        time.sleep(pause)
+                log(f"{day}: {len(ids)} dòng -> {partition_path(day, base)}")
+        # nhảy thẳng tới ngày kế tiếp còn dữ liệu
+        nxt = old.filter(created_at__gte=end).order_by("created_at").values_list("created_at", flat=True).first()
+        if nxt is None:
+            break
+        day = timezone.localtime(nxt).date()
+    return result
+
+
+def _write_partition(day: date, qs, base: Optional[str]) -> List[int]:
+    """
+    Ghi các dòng của 1 ngày vào partition; trả id các dòng đã nằm trong file.
+    Ghi ra file tạm (bản sao partition cũ + 1 gzip member mới) rồi os.replace,
+    nên partition luôn đọc được kể cả khi tiến trình chết giữa chừng.
+    """
+    path = partition_path(day, base)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    archived = {row["id"] for row in iter_partition(day, base)}
+
+    ids: List[int] = []
+    fresh = []
+    for row in qs.order_by("id").values(*FIELDS).iterator(chunk_size=2000):
+        ids.append(row["id"])
+        if row["id"] not in archived:
+            row["created_at"] = row["created_at"].isoformat()
+            fresh.append(json.dumps(row, ensure_ascii=False, separators=(",", ":")))
+    if not fresh:
+        return ids
+
+    tmp = path + ".tmp"
+    if archived:
+        shutil.copyfile(path, tmp)
+    elif os.path.exists(tmp):
+        os.remove(tmp)  # file tạm sót lại từ lần chạy hỏng
+    # gzip.open đọc được file nhiều member -> chỉ cần nối member mới vào cuối
+    with open(tmp, "ab") as raw, gzip.GzipFile(fileobj=raw, mode="ab") as gz:
+        gz.write(("\n".join(fresh) + "\n").encode("utf-8"))
+    os.replace(tmp, path)
+    return ids
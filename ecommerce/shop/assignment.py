@@ -0,0 +1,197 @@
+# shop/assignment.py
+"""
+Tự phân công yêu cầu tư vấn mới cho nhân viên (ConsultationRequest.handled_by).
+
+- CONSULT_ASSIGN_MODE: "least_loaded" (mặc định: ít yêu cầu đang mở nhất,
+  hòa thì xoay vòng), "round_robin", hoặc "off".
+- Nhân viên nhận việc: user is_staff + is_active (hoặc thuộc nhóm
+  CONSULT_ASSIGN_GROUP nếu đặt); danh sách cache CONSULT_ASSIGN_STAFF_TTL giây,
+  xóa sớm khi is_staff/is_active/nhóm của user đổi (không phải mỗi lần lưu User,
+  vd. cập nhật last_login khi đăng nhập).
+- Bảng tải: 1 bộ đếm cache/nhân viên (số yêu cầu đang mở được giao), cập nhật
+  tăng dần bằng cache.incr/decr khi giao, đóng, đổi người, xóa — không đếm lại
+  mỗi lần giao. Bảng dựng lại từ DB (1 GROUP BY trên index handled_by/status)
+  khi chưa có hoặc mỗi CONSULT_LOAD_RESYNC_SECONDS giây, bù sai lệch do
+  QuerySet.update()/bulk_create không phát signal.
+"""
+from __future__ import annotations
+
+import logging
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Count
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .models import ConsultationRequest
+
+logger = logging.getLogger(__name__)
+
+CONSULT_ASSIGN_MODE = getattr(settings, "CONSULT_ASSIGN_MODE", "least_loaded")
+CONSULT_ASSIGN_GROUP = getattr(settings, "CONSULT_ASSIGN_GROUP", "")
+CONSULT_ASSIGN_STAFF_TTL = getattr(settings, "CONSULT_ASSIGN_STAFF_TTL", 300)
+CONSULT_LOAD_RESYNC_SECONDS = getattr(settings, "CONSULT_LOAD_RESYNC_SECONDS", 600)
+
+_STAFF_KEY = "consult:assign:staff"
+_READY_KEY = "consult:load:ready"
+_RR_KEY = "consult:assign:rr"
+
+
+def _load_key(staff_id: int) -> str:
+    return f"consult:load:{staff_id}"
+
+
+# ---------------------------------------------------------------- nhân viên & bảng tải
+def active_staff() -> List[int]:
+    ids = cache.get(_STAFF_KEY)
+    if ids is None:
+        qs = User.objects.filter(is_active=True)
+        qs = qs.filter(groups__name=CONSULT_ASSIGN_GROUP) if CONSULT_ASSIGN_GROUP else qs.filter(is_staff=True)
+        ids = sorted(set(qs.values_list("id", flat=True)))
+        cache.set(_STAFF_KEY, ids, CONSULT_ASSIGN_STAFF_TTL)
+    return ids
+
+
+def rebuild_loads(staff_ids: Optional[List[int]] = None) -> Dict[int, int]:
+    """Đếm lại số yêu cầu đang mở theo nhân viên và ghi đè bảng tải trong cache."""
+    staff_ids = active_staff() if staff_ids is None else staff_ids
+    counts = dict(
+        ConsultationRequest.objects
+        .filter(handled_by__in=staff_ids, status__in=ConsultationRequest.OPEN_STATUSES)
+        .values("handled_by").annotate(n=Count("id")).values_list("handled_by", "n")
+    )
+    loads = {sid: counts.get(sid, 0) for sid in staff_ids}
+    cache.set_many({_load_key(sid): n for sid, n in loads.items()}, None)
+    cache.set(_READY_KEY, 1, CONSULT_LOAD_RESYNC_SECONDS)
+    return loads
+
+
+def loads(staff_ids: Optional[List[int]] = None) -> Dict[int, int]:
+    """Bảng tải {staff_id: số yêu cầu đang mở}; tự dựng lại nếu hết hạn/thiếu."""
+    staff_ids = active_staff() if staff_ids is None else staff_ids
+    if not staff_ids:
+        return {}
+    if cache.get(_READY_KEY) is None:
+        return rebuild_loads(staff_ids)
+    got = cache.get_many([_load_key(sid) for sid in staff_ids])
+    if len(got) < len(staff_ids):  # nhân viên mới / key bị cache đẩy ra
+        return rebuild_loads(staff_ids)
+    return {sid: got[_load_key(sid)] for sid in staff_ids}
+
+
+def _adjust(staff_id: Optional[int], delta: int) -> None:
+    if not staff_id or cache.get(_READY_KEY) is None:
+        return  # chưa có bảng: lần đọc sau dựng lại từ DB
+    try:
+        if delta > 0:
+            cache.incr(_load_key(staff_id), delta)
+        else:
+            cache.decr(_load_key(staff_id), -delta)
+    except ValueError:  # key không có (nhân viên chưa vào bảng)
+        pass
+
+
+# ---------------------------------------------------------------- chọn người
+def _next_rr() -> int:
+    if cache.add(_RR_KEY, 0, None):
+        return 0
+    try:
+        return cache.incr(_RR_KEY)
+    except ValueError:
+        cache.set(_RR_KEY, 0, None)
+        return 0
+
+
+def pick_staff(mode: str = CONSULT_ASSIGN_MODE) -> Optional[int]:
+    staff_ids = active_staff()
+    if not staff_ids or mode == "off":
+        return None
+    turn = _next_rr()
+    if mode == "round_robin":
+        return staff_ids[turn % len(staff_ids)]
+    table = loads(staff_ids)
+    low = min(table.values())
+    candidates = [sid for sid in staff_ids if table[sid] <= low]
+    return candidates[turn % len(candidates)]
+
+
+def assign(obj: ConsultationRequest, mode: str = CONSULT_ASSIGN_MODE) -> Optional[int]:
+    """Giao 1 yêu cầu đang mở, chưa có người; trả staff_id (hoặc None)."""
+    if obj.handled_by_id or not obj.is_open:
+        return None
+    staff_id = pick_staff(mode)
+    if staff_id is None:
+        return None
+    # update có điều kiện: không đè nếu ai đó vừa nhận tay
+    if ConsultationRequest.objects.filter(pk=obj.pk, handled_by__isnull=True).update(handled_by_id=staff_id):
+        obj.handled_by_id = staff_id
+        obj._assign_prev = (staff_id, True)
+        _adjust(staff_id, +1)
+        return staff_id
+    return None
+
+
+# ---------------------------------------------------------------- signal
+def _state(obj: ConsultationRequest):
+    return obj.handled_by_id, obj.status in ConsultationRequest.OPEN_STATUSES
+
+
+@receiver(post_init, sender=ConsultationRequest, dispatch_uid="consult_assign_init")
+def _remember(sender, instance, **kwargs):
+    instance._assign_prev = _state(instance)
+
+
+@receiver(post_save, sender=ConsultationRequest, dispatch_uid="consult_assign_saved")
+def _saved(sender, instance, created, **kwargs):
+    (old_staff, old_open), (new_staff, new_open) = instance._assign_prev, _state(instance)
+    if created:
+        old_staff, old_open = None, False
+    if (old_staff if old_open else None) != (new_staff if new_open else None):
+        _adjust(old_staff if old_open else None, -1)
+        _adjust(new_staff if new_open else None, +1)
+    instance._assign_prev = (new_staff, new_open)
+    if created and not new_staff and new_open and CONSULT_ASSIGN_MODE != "off":
+        try:
+            assign(instance)
+        except Exception:
+            # không làm hỏng việc khách gửi yêu cầu; staff vẫn thấy ở tab "Đang chờ"
+            logger.exception("Không tự phân công được yêu cầu tư vấn #%s", instance.pk)
+
+
+@receiver(post_delete, sender=ConsultationRequest, dispatch_uid="consult_assign_deleted")
+def _deleted(sender, instance, **kwargs):
+    staff_id, is_open = _state(instance)
+    if is_open:
+        _adjust(staff_id, -1)
+
+
+_STAFF_FIELDS = ("is_staff", "is_active")
+
+
+def _staff_state(user: User):
+    # đọc __dict__: trường bị defer (only()/defer()) không kéo thêm query
+    return tuple(user.__dict__.get(f) for f in _STAFF_FIELDS)
+
+
+@receiver(post_init, sender=User, dispatch_uid="consult_assign_user_init")
+def _remember_staff(sender, instance, **kwargs):
+    instance._assign_staff_prev = _staff_state(instance)
+
+
+@receiver(post_save, sender=User, dispatch_uid="consult_assign_staff_changed")
+def _staff_changed(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not set(update_fields) & set(_STAFF_FIELDS):
+        return  # vd. update_last_login: save(update_fields=["last_login"])
+    state = _staff_state(instance)
+    if created or state != getattr(instance, "_assign_staff_prev", None):
+        cache.delete(_STAFF_KEY)
+    instance._assign_staff_prev = state
+
+
+@receiver(m2m_changed, sender=User.groups.through, dispatch_uid="consult_assign_groups_changed")
+def _groups_changed(sender, action, **kwargs):
+    if CONSULT_ASSIGN_GROUP and action in ("post_add", "post_remove", "post_clear"):
+        cache.delete(_STAFF_KEY)
@@ -0,0 +1,159 @@
+# shop/consult_stats.py
+"""
+Phân vị thời gian xử lý tư vấn (handled_at - created_at): p50/p90/p99.
+
+Mỗi ngày (theo ngày tạo yêu cầu) lưu 1 QuantileSketch cho mọi nhân viên và
+1 sketch cho từng nhân viên (ConsultSketch). Khoảng bất kỳ = gộp sketch các
+ngày trọn vẹn + sketch dựng từ dữ liệu thô cho phần lẻ đầu/cuối, không phải
+nạp mọi ConsultationRequest để sắp xếp.
+
+Sketch của 1 ngày được dựng lại (từ vài chục dòng của đúng ngày đó) sau khi
+yêu cầu được xử lý/sửa/xóa; lịch sử: manage.py rebuild_consult_sketches.
+"""
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Min
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .facts import day_start, edge_ranges, whole_days
+from .models import ConsultationRequest, ConsultSketch
+from .quantiles import QuantileSketch
+from .rollups import period_start
+
+CONSULT_SKETCH_ALPHA = getattr(settings, "CONSULT_SKETCH_ALPHA", 0.01)
+PERCENTILES = (("p50_seconds", 0.50), ("p90_seconds", 0.90), ("p99_seconds", 0.99))
+
+Key = Tuple[date, Optional[int]]  # (ngày, staff_id | None = mọi nhân viên)
+
+
+def _raw_sketches(lo: datetime, hi: datetime) -> Dict[Key, QuantileSketch]:
+    rows = (
+        ConsultationRequest.objects
+        .filter(created_at__gte=lo, created_at__lt=hi, handled_at__isnull=False)
+        .values_list("created_at", "handled_at", "handled_by_id")
+    )
+    out: Dict[Key, QuantileSketch] = {}
+    for created, handled, staff_id in rows.iterator():
+        d = timezone.localtime(created).date()
+        secs = max(0.0, (handled - created).total_seconds())
+        for key in ((d, None), (d, staff_id)) if staff_id else ((d, None),):
+            sk = out.get(key)
+            if sk is None:
+                sk = out[key] = QuantileSketch(CONSULT_SKETCH_ALPHA)
+            sk.add(secs)
+    return out
+
+
+def _store(lo: date, hi: date) -> int:
+    """Dựng lại sketch các ngày [lo, hi)."""
+    sketches = _raw_sketches(day_start(lo), day_start(hi))
+    with transaction.atomic():
+        ConsultSketch.objects.filter(date__gte=lo, date__lt=hi).delete()
+        ConsultSketch.objects.bulk_create(
+            [ConsultSketch(date=d, staff_id=staff_id, count=sk.count, data=sk.to_bytes())
+             for (d, staff_id), sk in sketches.items()],
+            batch_size=500,
+        )
+    return len(sketches)
+
+
+def refresh_day(d: date) -> int:
+    return _store(d, d + timedelta(days=1))
+
+
+def rebuild(date_from: Optional[date] = None, date_to: Optional[date] = None,
+            log: Optional[Callable[[str], None]] = None) -> int:
+    """Dựng lại sketch trong [date_from, date_to] (mặc định toàn bộ lịch sử), từng tháng 1 lần."""
+    bounds = ConsultationRequest.objects.aggregate(lo=Min("created_at"), hi=Max("created_at"))
+    if bounds["lo"] is None:
+        return 0
+    cur = date_from or timezone.localtime(bounds["lo"]).date()
+    hi = (date_to or timezone.localtime(bounds["hi"]).date()) + timedelta(days=1)
+    total = 0
+    while cur < hi:
+        nxt = min(hi, (cur.replace(day=1) + timedelta(days=32)).replace(day=1))
+        n = _store(cur, nxt)
+        total += n
+        if log:
+            log(f"{cur:%Y-%m}: {n} sketch")
+        cur = nxt
+    return total
+
+
+# ---------------------------------------------------------------- đọc
+def sketches(date_from: datetime, date_to: datetime) -> Dict[Key, QuantileSketch]:
+    """Sketch theo (ngày, nhân viên) cho [date_from, date_to): ngày trọn vẹn từ DB, phần lẻ từ dữ liệu thô."""
+    first_day, end_day = whole_days(date_from, date_to)
+    out: Dict[Key, QuantileSketch] = {}
+    for d, staff_id, data in (
+        ConsultSketch.objects.filter(date__gte=first_day, date__lt=end_day).values_list("date", "staff_id", "data")
+    ):
+        out[(d, staff_id)] = QuantileSketch.from_bytes(data)
+    for lo, hi in edge_ranges(date_from, date_to, first_day, end_day):
+        for key, sk in _raw_sketches(lo, hi).items():
+            if key in out:
+                out[key].merge(sk)
+            else:
+                out[key] = sk
+    return out
+
+
+def percentiles(sk: Optional[QuantileSketch]) -> dict:
+    if sk is None or not sk.count:
+        return {name: None for name, _ in PERCENTILES}
+    return {name: round(sk.quantile(q), 1) for name, q in PERCENTILES}
+
+
+def _merge_into(acc: Dict, key, sk: QuantileSketch) -> None:
+    if key in acc:
+        acc[key].merge(sk)
+    else:
+        acc[key] = QuantileSketch(sk.alpha).merge(sk)
+
+
+def by_period(date_from: datetime, date_to: datetime, group_by: str,
+              source: Optional[Dict[Key, QuantileSketch]] = None) -> Dict[date, dict]:
+    """{ngày đầu kỳ: {p50_seconds, p90_seconds, p99_seconds}} trên mọi nhân viên."""
+    acc: Dict[date, QuantileSketch] = {}
+    for (d, staff_id), sk in (source if source is not None else sketches(date_from, date_to)).items():
+        if staff_id is None:
+            _merge_into(acc, period_start(d, group_by), sk)
+    return {k: percentiles(sk) for k, sk in acc.items()}
+
+
+def by_staff(date_from: datetime, date_to: datetime,
+             source: Optional[Dict[Key, QuantileSketch]] = None) -> Dict[int, dict]:
+    """{staff_id: {p50_seconds, ...}} cho cả khoảng."""
+    acc: Dict[int, QuantileSketch] = {}
+    for (d, staff_id), sk in (source if source is not None else sketches(date_from, date_to)).items():
+        if staff_id is not None:
+            _merge_into(acc, staff_id, sk)
+    return {k: percentiles(sk) for k, sk in acc.items()}
+
+
+# ---------------------------------------------------------------- signal
+def _schedule(created_at: Optional[datetime]) -> None:
+    if created_at is None:
+        return
+    d = timezone.localtime(created_at).date()
+    transaction.on_commit(lambda: refresh_day(d))
+
+
+@receiver(post_save, sender=ConsultationRequest, dispatch_uid="consult_sketch_saved")
+def _consult_saved(sender, instance, update_fields=None, **kwargs):
+    # chỉ các lần lưu có thể đổi thời gian xử lý
+    if instance.handled_at is not None or (update_fields and {"handled_at", "handled_by"} & set(update_fields)):
+        _schedule(instance.created_at)
+
+
+@receiver(post_delete, sender=ConsultationRequest, dispatch_uid="consult_sketch_deleted")
+def _consult_deleted(sender, instance, **kwargs):
+    if instance.handled_at is not None:
+        _schedule(instance.created_at)
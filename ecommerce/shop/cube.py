@@ -0,0 +1,230 @@
+# shop/cube.py
+"""
+Khối dữ liệu bán hàng dạng cột trong bộ nhớ (NumPy) cho dashboard báo cáo.
+
+Mỗi SalesLine chưa hủy (shop + cart) là 1 fact: thời điểm đơn (epoch giây),
+ngày (ordinal, giờ địa phương), product_id, category (mã), supplier (mã),
+quantity, revenue.
+Đổi bộ lọc NCC/danh mục/khoảng ngày chỉ là vài mask boolean + np.bincount
+trên mảng, không chạy lại GROUP BY join OrderItem→Product→Category.
+
+- Làm mới tăng dần: mỗi CUBE_REFRESH_SECONDS chỉ nạp các SalesLine có id lớn
+  hơn id đã nạp, vào 1 bản dữ liệu MỚI (_Snapshot) rồi thay tham chiếu; truy
+  vấn đang chạy vẫn đọc trọn bản cũ.
+- Sửa/xóa/hủy dòng cũ (shop/sales.py gọi invalidate()) hay đổi NCC/danh mục
+  của sản phẩm: tăng "phiên bản" lưu trong DB (RollupWatermark "sales_cube",
+  cùng transaction với thay đổi) -> mọi process/worker nạp lại toàn bộ ở lần
+  làm mới kế tiếp. Không dùng django cache: LocMemCache là riêng từng process,
+  worker khác sẽ không bao giờ thấy phiên bản mới.
+- Tùy chọn: numpy KHÔNG nằm trong requirements.txt. Cube chỉ bật khi
+  REPORT_CUBE_ENABLED=True và đã cài numpy; mặc định (hoặc thiếu numpy)
+  available() trả False và reports.py đọc OrderDailyFact + SalesLine.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db.models import F
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Category, Product, RollupWatermark, SalesLine
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+REPORT_CUBE_ENABLED = getattr(settings, "REPORT_CUBE_ENABLED", False)
+CUBE_REFRESH_SECONDS = getattr(settings, "CUBE_REFRESH_SECONDS", 30)
+CUBE_LOAD_CHUNK = getattr(settings, "CUBE_LOAD_CHUNK", 50000)
+
+VERSION_NAME = "sales_cube"  # RollupWatermark.last_id = phiên bản dữ liệu cube
+GROUPS = ("supplier", "category", "product", "day")
+
+
+def available() -> bool:
+    return REPORT_CUBE_ENABLED and np is not None
+
+
+_COLUMNS = ("ts", "day", "product", "category", "supplier", "qty", "revenue")
+
+
+class _Snapshot:
+    """
+    1 bản dữ liệu cube bất biến: refresh() dựng bản mới rồi thay 1 tham chiếu,
+    không sửa mảng/danh sách của bản đang được query() đọc.
+    """
+    __slots__ = _COLUMNS + ("suppliers", "supplier_codes", "last_id", "version")
+
+    def __init__(self, version=None, last_id: int = 0, suppliers=(), columns: Optional[dict] = None):
+        self.version = version
+        self.last_id = last_id
+        self.suppliers = tuple(suppliers)    # mã -> tên NCC
+        self.supplier_codes: Dict[str, int] = {name: i for i, name in enumerate(self.suppliers)}
+        for name in _COLUMNS:
+            setattr(self, name, (columns or {}).get(name))
+
+    def __len__(self) -> int:
+        return 0 if self.ts is None else len(self.ts)
+
+    def extended(self, after_id: int) -> "_Snapshot":
+        """Bản mới = bản này + các SalesLine có id > after_id (trả chính nó nếu không có dòng mới)."""
+        qs = (
+            SalesLine.objects.filter(id__gt=after_id).exclude(state=SalesLine.State.CANCELLED).order_by("id")
+            .values_list("id", "created_at", "product_id", "category_id", "supplier", "quantity", "line_total")
+        )
+        suppliers = list(self.suppliers)
+        codes = dict(self.supplier_codes)
+        cols = {k: [] for k in _COLUMNS}
+        last = after_id
+        for pk, created, product_id, category_id, supplier, qty, total in qs.iterator(chunk_size=CUBE_LOAD_CHUNK):
+            local = timezone.localtime(created)
+            name = supplier or ""
+            code = codes.get(name)
+            if code is None:
+                code = codes[name] = len(suppliers)
+                suppliers.append(name)
+            cols["ts"].append(int(created.timestamp()))
+            cols["day"].append(local.toordinal())
+            cols["product"].append(product_id)
+            cols["category"].append(category_id or 0)
+            cols["supplier"].append(code)
+            cols["qty"].append(qty or 0)
+            cols["revenue"].append(float(total or 0))
+            last = pk
+        if last == after_id:
+            return self
+
+        dtypes = {"revenue": np.float64}
+        merged = {}
+        for name, values in cols.items():
+            arr = np.asarray(values, dtype=dtypes.get(name, np.int64))
+            old = getattr(self, name)
+            merged[name] = arr if old is None else np.concatenate([old, arr])
+        return _Snapshot(self.version, last, suppliers, merged)
+
+
+class SalesCube:
+    def __init__(self):
+        self._lock = threading.Lock()  # chỉ 1 luồng dựng bản mới; luồng đọc không cần khóa
+        self._snap = _Snapshot()
+        self.checked_at = 0.0
+
+    # ---------- nạp dữ liệu ----------
+    def refresh(self, force: bool = False) -> _Snapshot:
+        """Làm mới nếu đến hạn; trả bản dữ liệu hiện hành (để caller đọc đúng 1 bản)."""
+        now = time.monotonic()
+        if not force and now - self.checked_at < CUBE_REFRESH_SECONDS:
+            return self._snap
+        with self._lock:
+            if not force and now - self.checked_at < CUBE_REFRESH_SECONDS:
+                return self._snap
+            snap = self._snap
+            version = current_version()
+            if force or version != snap.version:
+                snap = _Snapshot(version)
+            self._snap = snap.extended(snap.last_id)
+            self.checked_at = time.monotonic()
+            return self._snap
+
+    def __len__(self) -> int:
+        return len(self._snap)
+
+    # ---------- truy vấn ----------
+    @staticmethod
+    def _mask(snap: _Snapshot, date_from: datetime, date_to: datetime, supplier: str = "",
+              category_id: Optional[int] = None):
+        m = (snap.ts >= int(date_from.timestamp())) & (snap.ts < int(date_to.timestamp()))
+        if supplier:
+            want = supplier.casefold()
+            codes = [i for i, s in enumerate(snap.suppliers) if s.casefold() == want]
+            m &= np.isin(snap.supplier, codes)
+        if category_id:
+            m &= snap.category == category_id
+        return m
+
+    def query(self, group_by: str, date_from: datetime, date_to: datetime,
+              supplier: str = "", category_id: Optional[int] = None) -> List[dict]:
+        """[{key, orders, quantity, revenue}] theo nhóm, bỏ nhóm rỗng, sắp theo key."""
+        if group_by not in GROUPS:
+            raise ValueError(group_by)
+        snap = self.refresh()  # đọc 1 bản duy nhất suốt truy vấn
+        if not len(snap):
+            return []
+
+        m = self._mask(snap, date_from, date_to, supplier, category_id)
+        keys = getattr(snap, group_by)[m]
+        if not keys.size:
+            return []
+        # nén khóa về 0..k-1 để bincount không phụ thuộc giá trị lớn (ordinal ngày, id)
+        uniq, idx = np.unique(keys, return_inverse=True)
+        orders = np.bincount(idx)
+        qty = np.bincount(idx, weights=snap.qty[m])
+        revenue = np.bincount(idx, weights=snap.revenue[m])
+
+        if group_by == "supplier":
+            labels = [snap.suppliers[k] for k in uniq]
+        elif group_by == "day":
+            labels = [datetime.fromordinal(int(k)).date() for k in uniq]
+        else:
+            labels = [int(k) for k in uniq]
+        return [
+            {"key": labels[i], "orders": int(orders[i]), "quantity": int(qty[i]), "revenue": round(float(revenue[i]), 2)}
+            for i in range(len(uniq))
+        ]
+
+
+sales_cube = SalesCube()
+
+
+def _merge_by(rows: List[dict], label) -> Dict[str, dict]:
+    out: Dict[str, dict] = {}
+    for r in rows:
+        name = label(r["key"])
+        acc = out.setdefault(name, {"orders": 0, "quantity": 0, "revenue": 0.0})
+        acc["orders"] += r["orders"]
+        acc["quantity"] += r["quantity"]
+        acc["revenue"] += r["revenue"]
+    return out
+
+
+def orders_by(field: str, params, fallback: str) -> List[dict]:
+    """Tương đương reports._orders_by nhưng tính trên cube (field: supplier|category)."""
+    rows = sales_cube.query(field, params.date_from, params.date_to, params.supplier, params.category_id)
+    if field == "category":
+        # ORM gom theo product__category__name -> gom lại theo tên
+        names = dict(Category.objects.values_list("id", "name"))
+        merged = _merge_by(rows, lambda k: names.get(k) or fallback)
+    else:
+        merged = _merge_by(rows, lambda k: k or fallback)
+    return [
+        {
+            field: name,
+            "orders": acc["orders"],
+            "quantity": acc["quantity"],
+            "revenue": round(acc["revenue"], 2) if params.can_see_revenue else None,
+        }
+        for name, acc in sorted(merged.items())
+    ]
+
+
+# ---------- vô hiệu hóa khi dữ liệu cũ thay đổi ----------
+def current_version() -> int:
+    return RollupWatermark.objects.filter(name=VERSION_NAME).values_list("last_id", flat=True).first() or 0
+
+
+def invalidate() -> None:
+    """Tăng phiên bản trong DB (UPDATE nguyên tử, commit cùng thay đổi dữ liệu)."""
+    if not RollupWatermark.objects.filter(name=VERSION_NAME).update(last_id=F("last_id") + 1):
+        RollupWatermark.objects.get_or_create(name=VERSION_NAME, defaults={"last_id": 1})
+
+
+@receiver(post_save, sender=Product, dispatch_uid="cube_product_saved")
+def _dimension_changed(sender, **kwargs):
+    invalidate()
@@ -0,0 +1,186 @@
+# shop/exports.py
+"""
+Xuất file báo cáo dạng stream.
+
+CSV: StreamingHttpResponse, BOM UTF-8 ghi đúng 1 lần ở đầu, sau đó mỗi lần
+yield 1 khối vài trăm dòng -> bộ nhớ không phụ thuộc số dòng, byte đầu tiên
+tới client ngay khi có dòng đầu tiên. Dữ liệu lấy qua shop.reports.iter_rows
+(dataset "streaming" như order_lines đi thẳng từ .iterator(chunk_size)).
+
+XLSX: ghi từng dòng ra file tạm rồi trả FileResponse (file tự xóa khi đóng).
+Có openpyxl thì dùng workbook write_only; không có thì dùng bộ ghi
+SpreadsheetML tối giản bên dưới (zipfile + inline string). Cả hai đều không giữ
+toàn bộ bảng trong bộ nhớ.
+"""
+from __future__ import annotations
+
+import codecs
+import csv
+import re
+import tempfile
+import zipfile
+from decimal import Decimal
+from typing import IO, Iterable, Iterator, List, Sequence
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+
+try:
+    import openpyxl
+except Exception:
+    openpyxl = None
+
+EXPORT_CSV_CHUNK_ROWS = getattr(settings, "EXPORT_CSV_CHUNK_ROWS", 500)
+
+# ký tự XML 1.0 không cho phép (escape() không xử lý) -> Excel từ chối cả workbook
+_XML_ILLEGAL_RE = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]")
+
+
+def _xml_text(value) -> str:
+    return _XML_ILLEGAL_RE.sub("", str(value))
+
+
+class _Echo:
+    """File giả cho csv.writer: write() trả lại chuỗi thay vì ghi."""
+
+    def write(self, value):
+        return value
+
+
+def _values(row, headers: Sequence[str]) -> list:
+    if isinstance(row, dict):
+        return [("" if row.get(h) is None else row.get(h)) for h in headers]
+    return list(row)
+
+
+def csv_chunks(headers: Sequence[str], rows: Iterable, chunk_rows: int = EXPORT_CSV_CHUNK_ROWS) -> Iterator[bytes]:
+    writer = csv.writer(_Echo())
+    yield codecs.BOM_UTF8 + writer.writerow(headers).encode("utf-8")
+    buf: List[str] = []
+    for row in rows:
+        buf.append(writer.writerow(_values(row, headers)))
+        if len(buf) >= chunk_rows:
+            yield "".join(buf).encode("utf-8")
+            buf = []
+    if buf:
+        yield "".join(buf).encode("utf-8")
+
+
+def export_filename(name: str, ext: str) -> str:
+    return f"{name}-{timezone.now():%Y%m%d%H%M%S}.{ext}"
+
+
+def csv_response(name: str, headers: Sequence[str], rows: Iterable) -> StreamingHttpResponse:
+    resp = StreamingHttpResponse(csv_chunks(headers, rows), content_type="text/csv; charset=UTF-8")
+    resp["Content-Disposition"] = f'attachment; filename="{export_filename(name, "csv")}"'
+    return resp
+
+
+# ---------------------------------------------------------------- XLSX
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def _xlsx_openpyxl(fh: IO[bytes], title: str, headers: Sequence[str], rows: Iterable) -> None:
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(title=title)
+    ws.append(list(headers))
+    for row in rows:
+        ws.append([
+            float(v) if isinstance(v, Decimal) else _xml_text(v) if isinstance(v, str) else v
+            for v in _values(row, headers)
+        ])
+    wb.save(fh)
+
+
+_XLSX_STATIC = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/></Relationships>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/></Relationships>'
+    ),
+}
+
+
+def _xlsx_cell(value) -> str:
+    if value is None or value == "":
+        return "<c/>"
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float, Decimal)):
+        return f"<c><v>{value}</v></c>"
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(_xml_text(value))}</t></is></c>'
+
+
+def _xlsx_minimal(fh: IO[bytes], title: str, headers: Sequence[str], rows: Iterable) -> None:
+    with zipfile.ZipFile(fh, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, body in _XLSX_STATIC.items():
+            zf.writestr(name, body)
+        zf.writestr("xl/workbook.xml", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{escape(_xml_text(title))}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+        ))
+        # sheet ghi thẳng vào entry zip theo khối dòng
+        with zf.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as out:
+            out.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            out.write(("<row>" + "".join(_xlsx_cell(h) for h in headers) + "</row>").encode("utf-8"))
+            buf: List[str] = []
+            for row in rows:
+                buf.append("<row>" + "".join(_xlsx_cell(v) for v in _values(row, headers)) + "</row>")
+                if len(buf) >= EXPORT_CSV_CHUNK_ROWS:
+                    out.write("".join(buf).encode("utf-8"))
+                    buf = []
+            if buf:
+                out.write("".join(buf).encode("utf-8"))
+            out.write(b"</sheetData></worksheet>")
+
+
+def xlsx_response(name: str, headers: Sequence[str], rows: Iterable) -> FileResponse:
+    fh = tempfile.TemporaryFile()
+    try:
+        write_export(fh, "xlsx", name, headers, rows)
+        fh.seek(0)
+    except Exception:
+        fh.close()
+        raise
+    # FileResponse đọc file theo khối & đóng (xóa) file tạm khi gửi xong
+    return FileResponse(fh, as_attachment=True, filename=export_filename(name, "xlsx"),
+                        content_type=XLSX_CONTENT_TYPE)
+
+
+def write_export(fh: IO[bytes], fmt: str, name: str, headers: Sequence[str], rows: Iterable) -> None:
+    """Ghi file xuất (csv/xlsx) vào file nhị phân đã mở — dùng cho job chạy nền."""
+    if fmt == "csv":
+        for chunk in csv_chunks(headers, rows):
+            fh.write(chunk)
+    elif fmt == "xlsx":
+        writer = _xlsx_openpyxl if openpyxl is not None else _xlsx_minimal
+        writer(fh, name[:31], headers, rows)
+    else:
+        raise ValueError(f"định dạng không hỗ trợ: {fmt}")
@@ -0,0 +1,180 @@
+# shop/facts.py
+"""
+Bảng tổng hợp bán hàng theo ngày (OrderDailyFact), cho cả shop.Order và cart.Order.
+
+1 dòng = (ngày tạo đơn, nguồn, sản phẩm, trạng thái đơn) với số đơn, số dòng,
+số lượng, doanh thu; NCC/danh mục sao chép từ Product để lọc không cần join.
+Báo cáo 1 năm đọc tối đa 365 x số sản phẩm dòng thay vì mọi OrderItem.
+
+Cập nhật tăng dần qua signal: đơn được tạo / xác nhận / hủy / sửa dòng hàng ->
+sau khi transaction commit, tính lại đúng các ô (ngày, sản phẩm) của đơn đó
+(checkout cart dùng bulk_create nên chờ on_commit mới đọc được dòng hàng).
+Dòng hàng đổi sản phẩm -> tính lại cả ô của sản phẩm cũ (nhớ ở pre_save).
+Sai lệch (sửa thẳng DB, QuerySet.update...) sửa bằng:
+    python manage.py rebuild_order_facts [--from YYYY-MM-DD] [--to YYYY-MM-DD]
+"""
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Max, Min, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import OrderDailyFact, Product
+
+SOURCES = {
+    OrderDailyFact.Source.SHOP: ("shop.Order", "shop.OrderItem"),
+    OrderDailyFact.Source.CART: ("cart.Order", "cart.OrderItem"),
+}
+
+
+def source_models(source: str):
+    order_label, item_label = SOURCES[source]
+    return apps.get_model(order_label), apps.get_model(item_label)
+
+
+def day_start(d: date) -> datetime:
+    return timezone.make_aware(datetime.combine(d, datetime.min.time()))
+
+
+def whole_days(date_from: datetime, date_to: datetime) -> Tuple[date, date]:
+    """[first_day, end_day): các ngày trọn vẹn nằm trong [date_from, date_to)."""
+    local_from = timezone.localtime(date_from)
+    first_day = local_from.date()
+    if local_from != day_start(first_day):
+        first_day += timedelta(days=1)
+    end_day = timezone.localtime(date_to).date()
+    return first_day, max(first_day, end_day)
+
+
+def edge_ranges(date_from: datetime, date_to: datetime, first_day: date, end_day: date):
+    """Phần lẻ đầu/cuối khoảng (không trọn ngày) -> đọc từ dữ liệu thô."""
+    if first_day < end_day:
+        ranges = [(date_from, day_start(first_day)), (day_start(end_day), date_to)]
+    else:
+        ranges = [(date_from, date_to)]
+    return [(lo, hi) for lo, hi in ranges if lo < hi]
+
+
+# ---------------------------------------------------------------- tính lại
+def _aggregate(source: str, lo: date, hi: date, product_ids: Optional[Iterable[int]] = None) -> List[OrderDailyFact]:
+    _, Item = source_models(source)
+    items = Item.objects.filter(order__created_at__gte=day_start(lo), order__created_at__lt=day_start(hi))
+    if product_ids is not None:
+        items = items.filter(product_id__in=list(product_ids))
+    line_total = ExpressionWrapper(
+        Coalesce(F("price"), 0) * Coalesce(F("quantity"), 0),
+        output_field=DecimalField(max_digits=18, decimal_places=2),
+    )
+    qs = (
+        items.annotate(d=TruncDate("order__created_at"))
+        .values("d", "product_id", "order__status", "product__category_id", "product__supplier")
+        .annotate(orders=Count("order_id", distinct=True), lines=Count("id"),
+                  qty=Sum("quantity"), rev=Sum(line_total))
+        .order_by()
+    )
+    return [
+        OrderDailyFact(
+            day=r["d"], source=source, status=r["order__status"], product_id=r["product_id"],
+            category_id=r["product__category_id"], supplier=r["product__supplier"] or "",
+            orders=r["orders"], lines=r["lines"], quantity=r["qty"] or 0, revenue=r["rev"] or 0,
+        )
+        for r in qs
+    ]
+
+
+def refresh_buckets(source: str, day: date, product_ids: Iterable[int]) -> int:
+    """Tính lại các ô (day, product) của 1 nguồn, mọi trạng thái."""
+    product_ids = set(product_ids)
+    if not product_ids:
+        return 0
+    with transaction.atomic():
+        OrderDailyFact.objects.filter(source=source, day=day, product_id__in=product_ids).delete()
+        facts = _aggregate(source, day, day + timedelta(days=1), product_ids)
+        OrderDailyFact.objects.bulk_create(facts)
+    return len(facts)
+
+
+def refresh_order(source: str, order_id: int) -> int:
+    Order, _ = source_models(source)
+    order = Order.objects.filter(pk=order_id).only("created_at").first()
+    if order is None:
+        return 0
+    day = timezone.localtime(order.created_at).date()
+    product_ids = set(order.items.values_list("product_id", flat=True))
+    if not product_ids:
+        # đơn không còn dòng nào -> tính lại mọi sản phẩm đã có fact trong ngày
+        product_ids = set(OrderDailyFact.objects.filter(source=source, day=day).values_list("product_id", flat=True))
+    return refresh_buckets(source, day, product_ids)
+
+
+def rebuild(sources: Iterable[str] = tuple(SOURCES), date_from: Optional[date] = None,
+            date_to: Optional[date] = None, log: Optional[Callable[[str], None]] = None) -> int:
+    """Dựng lại fact trong [date_from, date_to] (mặc định: toàn bộ lịch sử), từng tháng 1 lần."""
+    total = 0
+    for source in sources:
+        Order, _ = source_models(source)
+        bounds = Order.objects.aggregate(lo=Min("created_at"), hi=Max("created_at"))
+        if bounds["lo"] is None:
+            continue
+        lo = date_from or timezone.localtime(bounds["lo"]).date()
+        hi = (date_to or timezone.localtime(bounds["hi"]).date()) + timedelta(days=1)
+        cur = lo
+        while cur < hi:
+            nxt = min(hi, (cur.replace(day=1) + timedelta(days=32)).replace(day=1))
+            with transaction.atomic():
+                OrderDailyFact.objects.filter(source=source, day__gte=cur, day__lt=nxt).delete()
+                facts = _aggregate(source, cur, nxt)
+                OrderDailyFact.objects.bulk_create(facts)
+            total += len(facts)
+            if log:
+                log(f"{source} {cur:%Y-%m}: {len(facts)} dòng")
+            cur = nxt
+    return total
+
+
+# ---------------------------------------------------------------- signal
+def _order_saved(source: str):
+    def handler(sender, instance, **kwargs):
+        transaction.on_commit(lambda: refresh_order(source, instance.pk))
+    return handler
+
+
+def _remember_product(sender, instance, **kwargs):
+    # sản phẩm trước khi lưu: đổi sản phẩm của dòng thì ô cũ cũng phải tính lại
+    instance._facts_prev_product = (
+        sender.objects.filter(pk=instance.pk).values_list("product_id", flat=True).first() if instance.pk else None
+    )
+
+
+def _item_changed(source: str):
+    def handler(sender, instance, **kwargs):
+        try:
+            created_at = instance.order.created_at
+        except Exception:  # đơn đã bị xóa cùng lúc
+            return
+        day = timezone.localtime(created_at).date()
+        product_ids = {instance.product_id, getattr(instance, "_facts_prev_product", None)} - {None}
+        transaction.on_commit(lambda: refresh_buckets(source, day, product_ids))
+    return handler
+
+
+for _source, (_order_label, _item_label) in SOURCES.items():
+    post_save.connect(_order_saved(_source), sender=_order_label, weak=False, dispatch_uid=f"facts_{_source}_order")
+    pre_save.connect(_remember_product, sender=_item_label, dispatch_uid=f"facts_{_source}_item_presave")
+    post_save.connect(_item_changed(_source), sender=_item_label, weak=False, dispatch_uid=f"facts_{_source}_item_saved")
+    post_delete.connect(_item_changed(_source), sender=_item_label, weak=False, dispatch_uid=f"facts_{_source}_item_deleted")
+
+
+@receiver(post_save, sender=Product, dispatch_uid="facts_product_saved")
+def _product_saved(sender, instance, **kwargs):
+    # NCC/danh mục đổi -> cập nhật bản sao trong fact (1 UPDATE)
+    OrderDailyFact.objects.filter(product_id=instance.pk).exclude(
+        supplier=instance.supplier or "", category_id=instance.category_id,
+    ).update(supplier=instance.supplier or "", category_id=instance.category_id)
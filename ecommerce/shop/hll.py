@@ -0,0 +1,100 @@
+# shop/hll.py
+"""
+HyperLogLog tối giản (thuần Python) để ước lượng số khách duy nhất.
+
+- p=12 -> 4096 thanh ghi, sai số chuẩn ~1.04/sqrt(4096) ≈ 1.6%.
+- Gộp 2 sketch = lấy max từng thanh ghi -> cộng được qua ngày/tuần/tháng mà
+  không phải đếm DISTINCT trên dữ liệu thô.
+- to_bytes() lưu dạng thưa (idx, rank) khi ít thanh ghi khác 0 (đa số
+  sketch theo sản phẩm/ngày chỉ vài chục khách), ngược lại lưu dạng đặc.
+"""
+from __future__ import annotations
+
+import hashlib
+import math
+import struct
+from typing import Iterable, Optional
+
+DEFAULT_PRECISION = 12
+
+_DENSE = b"D"
+_SPARSE = b"S"
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8", "ignore"), digest_size=8).digest(), "big")
+
+
+class HyperLogLog:
+    __slots__ = ("p", "m", "registers")
+
+    def __init__(self, p: int = DEFAULT_PRECISION, registers: Optional[bytearray] = None):
+        if not 4 <= p <= 16:
+            raise ValueError("precision phải trong khoảng 4..16")
+        self.p = p
+        self.m = 1 << p
+        self.registers = registers if registers is not None else bytearray(self.m)
+
+    def add(self, value: str) -> None:
+        x = _hash64(value)
+        idx = x >> (64 - self.p)
+        rest = x & ((1 << (64 - self.p)) - 1)
+        # vị trí bit 1 đầu tiên trong (64 - p) bit còn lại, tính từ 1
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    def update(self, values: Iterable[str]) -> "HyperLogLog":
+        for v in values:
+            self.add(v)
+        return self
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        if other.p != self.p:
+            raise ValueError("không gộp được 2 sketch khác precision")
+        regs = self.registers
+        for i, r in enumerate(other.registers):
+            if r > regs[i]:
+                regs[i] = r
+        return self
+
+    def count(self) -> int:
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        zeros = 0
+        total = 0.0
+        for r in self.registers:
+            total += 2.0 ** -r
+            if not r:
+                zeros += 1
+        estimate = alpha * m * m / total
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # linear counting cho tập nhỏ
+        return int(round(estimate))
+
+    __len__ = count
+
+    def is_empty(self) -> bool:
+        return not any(self.registers)
+
+    # ---------- lưu trữ ----------
+    def to_bytes(self) -> bytes:
+        nz = [(i, r) for i, r in enumerate(self.registers) if r]
+        if len(nz) * 3 < self.m:
+            return _SPARSE + bytes([self.p]) + b"".join(struct.pack(">HB", i, r) for i, r in nz)
+        return _DENSE + bytes([self.p]) + bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        data = bytes(data)
+        kind, p = data[:1], data[1]
+        hll = cls(p)
+        if kind == _DENSE:
+            hll.registers[:] = data[2:2 + hll.m]
+        elif kind == _SPARSE:
+            for off in range(2, len(data), 3):
+                i, r = struct.unpack_from(">HB", data, off)
+                hll.registers[i] = r
+        else:
+            raise ValueError("dữ liệu sketch không hợp lệ")
+        return hll
@@ -0,0 +1,255 @@
+# shop/jobs.py
+"""
+Hàng đợi job xuất báo cáo dựa trên DB (không cần Redis/Celery).
+
+- View chỉ tạo ExportJob(status=queued) rồi trả về ngay.
+- Worker (manage.py run_export_jobs) giành job bằng UPDATE có điều kiện
+  (status=queued -> running), nên chạy nhiều worker song song vẫn không trùng;
+  mỗi job chạy trong 1 process con của ProcessPoolExecutor (giới hạn số job
+  đồng thời = số process).
+- File ghi vào storage riêng (models.export_storage, ngoài MEDIA_ROOT, tên có
+  token ngẫu nhiên) dưới tên .part rồi os.replace khi xong; chỉ tải qua view staff.
+- Mỗi lượt giành job nhận 1 token (ExportJob.claim); worker cha cập nhật
+  heartbeat_at của job đang chạy mỗi EXPORT_JOB_HEARTBEAT_SECONDS (tối đa
+  EXPORT_JOB_TIMEOUT giây kể từ lúc bắt đầu). Job "running" không có heartbeat
+  quá EXPORT_JOB_STALE_SECONDS (worker chết / job treo) được đưa lại hàng đợi,
+  tối đa EXPORT_JOB_MAX_ATTEMPTS lần. Kết quả chỉ được ghi bằng UPDATE có điều
+  kiện claim=token của lượt đó: lượt cũ chạy xong muộn không đè lượt mới, file
+  của nó bị xóa.
+- Job cũ hơn EXPORT_JOB_KEEP_DAYS bị xóa cùng file.
+"""
+from __future__ import annotations
+
+import multiprocessing
+import os
+import secrets
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, List, Optional, Tuple
+
+import django
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ExportJob
+
+EXPORT_JOB_WORKERS = getattr(settings, "EXPORT_JOB_WORKERS", 2)
+EXPORT_JOB_POLL_SECONDS = getattr(settings, "EXPORT_JOB_POLL_SECONDS", 2)
+EXPORT_JOB_TIMEOUT = getattr(settings, "EXPORT_JOB_TIMEOUT", 3600)
+EXPORT_JOB_HEARTBEAT_SECONDS = getattr(settings, "EXPORT_JOB_HEARTBEAT_SECONDS", 30)
+EXPORT_JOB_STALE_SECONDS = getattr(settings, "EXPORT_JOB_STALE_SECONDS", 180)
+EXPORT_JOB_MAX_ATTEMPTS = getattr(settings, "EXPORT_JOB_MAX_ATTEMPTS", 2)
+EXPORT_JOB_MAX_PENDING = getattr(settings, "EXPORT_JOB_MAX_PENDING", 3)  # mỗi user
+EXPORT_JOB_KEEP_DAYS = getattr(settings, "EXPORT_JOB_KEEP_DAYS", 7)
+
+EXPORT_DIR = "exports"
+_MAINTENANCE_EVERY = 60  # giây
+
+PENDING = (ExportJob.Status.QUEUED, ExportJob.Status.RUNNING)
+
+
+class JobLimitExceeded(Exception):
+    pass
+
+
+# ---------------------------------------------------------------- enqueue
+def enqueue_export(kind: str, fmt: str, query, user) -> ExportJob:
+    """Tạo job xuất file; ValueError nếu kind/fmt sai, JobLimitExceeded nếu user còn quá nhiều job chờ."""
+    from .reports import resolve
+
+    ds = resolve(kind)
+    if ds is None:
+        raise ValueError("invalid kind")
+    fmt = (fmt or "csv").lower()
+    if fmt not in ("csv", "xlsx"):
+        raise ValueError("invalid format")
+    if ExportJob.objects.filter(created_by=user, status__in=PENDING).count() >= EXPORT_JOB_MAX_PENDING:
+        raise JobLimitExceeded
+
+    keep = ("date_from", "date_to", "group_by", "supplier", "category_id")
+    return ExportJob.objects.create(
+        kind=ds.name,
+        fmt=fmt,
+        params={k: query.get(k) for k in keep if query.get(k)},
+        can_see_revenue=bool(user.is_staff or user.is_superuser),
+        created_by=user,
+    )
+
+
+# ---------------------------------------------------------------- worker side
+def claim_jobs(limit: int) -> List[Tuple[int, str]]:
+    """Giành tối đa `limit` job đang chờ (cũ nhất trước); trả [(job_id, claim token)]."""
+    claimed: List[Tuple[int, str]] = []
+    candidates = ExportJob.objects.filter(status=ExportJob.Status.QUEUED).order_by("created_at", "id")
+    for job_id in candidates.values_list("id", flat=True)[: limit * 2]:
+        if len(claimed) >= limit:
+            break
+        claim = uuid.uuid4().hex
+        now = timezone.now()
+        ok = ExportJob.objects.filter(pk=job_id, status=ExportJob.Status.QUEUED).update(
+            status=ExportJob.Status.RUNNING, claim=claim, started_at=now, heartbeat_at=now, error="",
+            attempts=F("attempts") + 1,
+        )
+        if ok:
+            claimed.append((job_id, claim))
+    return claimed
+
+
+def _owned(job_id: int, claim: str):
+    """Job còn thuộc lượt chạy `claim` (chưa bị requeue_stale giao cho lượt khác)."""
+    return ExportJob.objects.filter(pk=job_id, status=ExportJob.Status.RUNNING, claim=claim)
+
+
+def heartbeat(running: List[Tuple[int, str]]) -> int:
+    """Đánh dấu các job đang chạy còn sống (bỏ qua job đã chạy quá EXPORT_JOB_TIMEOUT: coi như treo)."""
+    if not running:
+        return 0
+    now = timezone.now()
+    return (
+        ExportJob.objects
+        .filter(pk__in=[job_id for job_id, _ in running], claim__in=[claim for _, claim in running],
+                status=ExportJob.Status.RUNNING, started_at__gte=now - timezone.timedelta(seconds=EXPORT_JOB_TIMEOUT))
+        .update(heartbeat_at=now)
+    )
+
+
+def _counting(rows, counter: list):
+    for r in rows:
+        counter[0] += 1
+        yield r
+
+
+def run_job(job_id: int, claim: str) -> str:
+    """Chạy 1 job (trong process con) với token `claim` của lượt giành job. Trả về trạng thái cuối."""
+    from .exports import export_filename, write_export
+    from .reports import ReportParams, iter_rows, resolve
+
+    close_old_connections()
+    job = ExportJob.objects.get(pk=job_id)
+    part = None
+    try:
+        ds = resolve(job.kind)
+        if ds is None:
+            raise ValueError(f"dataset không tồn tại: {job.kind}")
+        params = ReportParams.from_query(job.params, can_see_revenue=job.can_see_revenue)
+
+        # token ngẫu nhiên: tên file không đoán được từ id + giờ
+        rel = f"{EXPORT_DIR}/{job.pk}-{secrets.token_hex(16)}-{export_filename(ds.name, job.fmt)}"
+        path = job.file.storage.path(rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        part = path + ".part"
+
+        counter = [0]
+        with open(part, "wb") as fh:
+            write_export(fh, job.fmt, ds.name, ds.headers(params), _counting(iter_rows(ds, params), counter))
+        os.replace(part, path)
+        part = None
+
+        done = _owned(job.pk, claim).update(
+            status=ExportJob.Status.DONE, file=rel, rows=counter[0], finished_at=timezone.now(),
+        )
+        if not done:  # đã bị đưa lại hàng đợi: lượt khác ghi kết quả
+            os.remove(path)
+            return "stale"
+        return ExportJob.Status.DONE
+    except Exception as e:
+        mark_failed(job.pk, e, claim)
+        return ExportJob.Status.FAILED
+    finally:
+        if part and os.path.exists(part):
+            os.remove(part)
+        close_old_connections()
+
+
+def mark_failed(job_id: int, error, claim: str) -> None:
+    _owned(job_id, claim).update(
+        status=ExportJob.Status.FAILED, error=f"{type(error).__name__}: {error}"[:2000], finished_at=timezone.now(),
+    )
+
+
+def requeue_stale() -> int:
+    """Job running mất heartbeat (worker chết / job treo) -> chạy lại, hoặc failed nếu đã hết lượt."""
+    cutoff = timezone.now() - timezone.timedelta(seconds=EXPORT_JOB_STALE_SECONDS)
+    stale = ExportJob.objects.filter(status=ExportJob.Status.RUNNING, heartbeat_at__lt=cutoff)
+    # xóa claim: lượt cũ nếu còn chạy sẽ không ghi được kết quả
+    failed = stale.filter(attempts__gte=EXPORT_JOB_MAX_ATTEMPTS).update(
+        status=ExportJob.Status.FAILED, claim="", error="timeout", finished_at=timezone.now(),
+    )
+    return failed + stale.update(status=ExportJob.Status.QUEUED, claim="")
+
+
+def purge_old() -> int:
+    cutoff = timezone.now() - timezone.timedelta(days=EXPORT_JOB_KEEP_DAYS)
+    old = ExportJob.objects.exclude(status__in=PENDING).filter(created_at__lt=cutoff)
+    n = 0
+    for job in old.iterator():
+        if job.file:
+            job.file.delete(save=False)
+        job.delete()
+        n += 1
+    return n
+
+
+def _new_pool(workers: int) -> ProcessPoolExecutor:
+    # spawn: process con không dùng chung kết nối DB/luồng của worker cha;
+    # django.setup() chạy trước khi process con unpickle run_job (import models)
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn"), initializer=django.setup,
+    )
+
+
+def run_worker(workers: int = EXPORT_JOB_WORKERS, poll: float = EXPORT_JOB_POLL_SECONDS, once: bool = False,
+               log: Optional[Callable[[str], None]] = None) -> int:
+    """Vòng lặp worker; once=True: chạy hết job đang chờ rồi thoát. Trả về số job đã xử lý."""
+    workers = max(1, workers)
+    running: Dict = {}
+    handled = 0
+    last_maintenance = last_heartbeat = float("-inf")
+    pool = _new_pool(workers)
+    try:
+        while True:
+            if time.monotonic() - last_maintenance > _MAINTENANCE_EVERY:
+                requeue_stale()
+                purge_old()
+                last_maintenance = time.monotonic()
+            if running and time.monotonic() - last_heartbeat > EXPORT_JOB_HEARTBEAT_SECONDS:
+                heartbeat(list(running.values()))
+                last_heartbeat = time.monotonic()
+
+            for fut in [f for f in running if f.done()]:
+                job_id, claim = running.pop(fut)
+                handled += 1
+                try:
+                    status = fut.result()
+                except Exception as e:  # process con chết (OOM/kill)
+                    mark_failed(job_id, e, claim)
+                    status = ExportJob.Status.FAILED
+                if log:
+                    log(f"job #{job_id}: {status}")
+
+            free = workers - len(running)
+            claimed = claim_jobs(free) if free > 0 else []
+            for job_id, claim in claimed:
+                try:
+                    fut = pool.submit(run_job, job_id, claim)
+                except BrokenProcessPool:
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = _new_pool(workers)
+                    fut = pool.submit(run_job, job_id, claim)
+                running[fut] = (job_id, claim)
+                if log:
+                    log(f"job #{job_id}: bắt đầu")
+
+            if once and not running and not claimed:
+                return handled
+            if running:
+                wait(list(running), timeout=poll, return_when=FIRST_COMPLETED)
+            else:
+                close_old_connections()
+                time.sleep(poll)
+    finally:
+        pool.shutdown(wait=True)
@@ -0,0 +1,248 @@
+# shop/live.py
+"""
+Feed "live" cho các hàng đợi của staff (đơn chờ duyệt, yêu cầu tư vấn).
+
+Mỗi hàng đợi có một Watermark = id lớn nhất đã biết, giữ trong bộ nhớ process
+và dùng chung cho mọi request:
+- signal post_save (created) đẩy watermark lên ngay, đánh thức các kết nối đang chờ;
+- định kỳ mới đọc lại MAX(id) từ DB (1 query rẻ cho cả process) để bắt các bản ghi
+  do process/worker khác tạo ra.
+
+Trang staff mở 1 EventSource tới endpoint feed và chỉ nhận id + HTML của dòng mới,
+không phải reload cả trang (không chạy lại count phân trang / prefetch).
+
+Giữ kết nối mở (SSE dài / long-poll) chỉ khi chạy dưới ASGI: kết nối chờ bằng
+asyncio, không chiếm worker. Dưới WSGI mỗi kết nối giữ nguyên 1 worker sync, nên
+mặc định trả ngay phần mới rồi đóng; EventSource tự nối lại sau
+LIVE_FEED_POLL_SECONDS (trường "retry") với Last-Event-ID -> thành short-poll,
+JS phía trang không cần đổi. LIVE_FEED_STREAM=True/False ép chế độ.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+import time
+from typing import AsyncIterator, Callable, Iterable, Iterator, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections, transaction
+from django.db.models import Max
+from django.dispatch import receiver
+from django.db.models.signals import post_save
+from django.http import JsonResponse, StreamingHttpResponse
+
+from .models import ConsultationRequest
+
+# Bao lâu thì đọc lại MAX(id) từ DB (giây)
+LIVE_REFRESH_SECONDS = getattr(settings, "LIVE_FEED_REFRESH_SECONDS", 5)
+# Nhịp gửi comment giữ kết nối (giây)
+LIVE_HEARTBEAT_SECONDS = getattr(settings, "LIVE_FEED_HEARTBEAT_SECONDS", 15)
+# Thời gian tối đa 1 kết nối SSE; hết hạn thì đóng, EventSource tự nối lại với Last-Event-ID
+LIVE_MAX_SECONDS = getattr(settings, "LIVE_FEED_MAX_SECONDS", 55)
+# Số dòng tối đa gửi trong 1 lượt
+LIVE_BATCH_SIZE = getattr(settings, "LIVE_FEED_BATCH_SIZE", 50)
+# None: giữ kết nối chỉ khi chạy ASGI; True/False: luôn / không bao giờ
+LIVE_FEED_STREAM = getattr(settings, "LIVE_FEED_STREAM", None)
+# Chế độ short-poll: client nối lại sau chừng này giây
+LIVE_POLL_SECONDS = getattr(settings, "LIVE_FEED_POLL_SECONDS", 5)
+
+_ASYNC_CHECK_SECONDS = 0.5  # nhịp kiểm tra watermark của kết nối async
+
+
+class Watermark:
+    """
+    Id lớn nhất đã biết của một bảng, dùng chung trong process.
+
+    - bump(pk): gọi từ signal khi có bản ghi mới.
+    - current(): giá trị hiện tại (tự làm mới từ DB nếu đã cũ).
+    - wait_for(after, timeout): chặn tới khi watermark > after hoặc hết giờ.
+    - await_for(after, timeout): như wait_for nhưng không chặn event loop (ASGI).
+    """
+
+    def __init__(self, loader: Callable[[], Optional[int]], refresh_seconds: float = LIVE_REFRESH_SECONDS):
+        self._loader = loader
+        self._refresh_seconds = refresh_seconds
+        self._value: Optional[int] = None
+        self._checked_at = 0.0
+        self._refreshing = False
+        self._cond = threading.Condition()
+
+    def bump(self, pk: int) -> None:
+        with self._cond:
+            if self._value is None or pk > self._value:
+                self._value = pk
+                self._cond.notify_all()
+
+    def _refresh_if_stale(self) -> None:
+        # Chỉ 1 thread đọc DB tại 1 thời điểm; các thread khác dùng giá trị đang có.
+        with self._cond:
+            if self._refreshing or (time.monotonic() - self._checked_at) < self._refresh_seconds:
+                return
+            self._refreshing = True
+        try:
+            value = self._loader() or 0
+        except Exception:
+            value = None
+        with self._cond:
+            self._refreshing = False
+            self._checked_at = time.monotonic()
+            if value is not None and (self._value is None or value > self._value):
+                self._value = value
+                self._cond.notify_all()
+
+    def current(self) -> int:
+        self._refresh_if_stale()
+        return self._value or 0
+
+    def wait_for(self, after: int, timeout: float) -> int:
+        deadline = time.monotonic() + timeout
+        while True:
+            self._refresh_if_stale()
+            with self._cond:
+                if (self._value or 0) > after:
+                    return self._value
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return self._value or 0
+                self._cond.wait(min(remaining, self._refresh_seconds))
+
+    async def await_for(self, after: int, timeout: float) -> int:
+        deadline = time.monotonic() + timeout
+        while True:
+            if time.monotonic() - self._checked_at >= self._refresh_seconds:
+                await sync_to_async(self._refresh_if_stale)()
+            value = self._value or 0
+            remaining = deadline - time.monotonic()
+            if value > after or remaining <= 0:
+                return value
+            await asyncio.sleep(min(remaining, _ASYNC_CHECK_SECONDS))
+
+
+def _max_id_loader(model) -> Callable[[], Optional[int]]:
+    def load():
+        return model._default_manager.aggregate(m=Max("pk"))["m"]
+    return load
+
+
+CONSULT_WATERMARK = Watermark(_max_id_loader(ConsultationRequest))
+
+
+@receiver(post_save, sender=ConsultationRequest, dispatch_uid="live_consult_watermark")
+def _bump_consult_watermark(sender, instance, created, **kwargs):
+    if created:
+        # chờ commit để luồng feed đọc được bản ghi khi được đánh thức
+        pk = instance.pk
+        transaction.on_commit(lambda: CONSULT_WATERMARK.bump(pk))
+
+
+# ---------- Helpers cho view ----------
+
+def _parse_after(request, default: int) -> int:
+    raw = request.headers.get("Last-Event-ID") or request.GET.get("after") or ""
+    try:
+        return max(0, int(raw))
+    except (TypeError, ValueError):
+        return default
+
+
+def _holds_connection(request) -> bool:
+    if LIVE_FEED_STREAM is not None:
+        return bool(LIVE_FEED_STREAM)
+    return isinstance(request, ASGIRequest)
+
+
+def _sse(event: str, data: dict, event_id: Optional[int] = None) -> str:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def live_feed_response(
+    request,
+    watermark: Watermark,
+    fetch_new: Callable[[int, int], Iterable],
+    render_item: Callable[[object], dict],
+):
+    """
+    Trả về SSE (mặc định) hoặc JSON (?poll=1).
+
+    Dưới ASGI (hoặc LIVE_FEED_STREAM=True): SSE giữ kết nối tới LIVE_MAX_SECONDS,
+    ?poll=1 chờ tối đa 1 nhịp heartbeat. Còn lại: trả ngay phần mới rồi đóng.
+
+    fetch_new(after, limit) -> các bản ghi có pk > after (tăng dần theo pk)
+    render_item(obj)        -> dict gửi cho client (tối thiểu có "id")
+    """
+    after = _parse_after(request, default=watermark.current())
+    hold = _holds_connection(request)
+    is_async = isinstance(request, ASGIRequest)
+
+    def collect(after_id: int, top: int):
+        objs = list(fetch_new(after_id, LIVE_BATCH_SIZE))
+        items = [render_item(o) for o in objs]
+        last = max([o.pk for o in objs], default=after_id)
+        # Lô chưa đầy nghĩa là đã lấy hết -> có thể nhảy tới watermark
+        # (các id ở giữa không khớp bộ lọc, vd: đơn đã được duyệt).
+        if len(objs) < LIVE_BATCH_SIZE:
+            last = max(last, top)
+        return items, last
+
+    def events(items, last) -> Iterator[str]:
+        for it in items:
+            yield _sse("item", it, event_id=it.get("id"))
+        yield _sse("watermark", {"after": last}, event_id=last)
+
+    # ---- Long-poll / short-poll JSON ----
+    if request.GET.get("poll"):
+        items, last = [], after
+        # view sync: dưới ASGI chạy trong thread riêng của request, chờ ở đây không chặn event loop
+        top = watermark.wait_for(after, LIVE_HEARTBEAT_SECONDS if hold else 0)
+        if top > after:
+            items, last = collect(after, top)
+        return JsonResponse({"items": items, "after": last, "retry": 0 if hold else LIVE_POLL_SECONDS})
+
+    # ---- SSE ngắn: gửi phần mới rồi đóng, EventSource nối lại sau `retry` ----
+    if not hold:
+        items, last = [], after
+        top = watermark.current()
+        if top > after:
+            items, last = collect(after, top)
+        body = [f"retry: {LIVE_POLL_SECONDS * 1000}\n\n", *events(items, last)]
+        return _sse_response(body)
+
+    # ---- SSE dài ----
+    def stream() -> Iterator[str]:
+        nonlocal after
+        started = time.monotonic()
+        yield "retry: 3000\n\n"
+        while time.monotonic() - started < LIVE_MAX_SECONDS:
+            top = watermark.wait_for(after, LIVE_HEARTBEAT_SECONDS)
+            if top > after:
+                close_old_connections()
+                items, after = collect(after, top)
+                yield from events(items, after)
+            else:
+                yield ": ping\n\n"
+
+    async def astream() -> AsyncIterator[str]:
+        nonlocal after
+        started = time.monotonic()
+        yield "retry: 3000\n\n"
+        while time.monotonic() - started < LIVE_MAX_SECONDS:
+            top = await watermark.await_for(after, LIVE_HEARTBEAT_SECONDS)
+            if top > after:
+                items, after = await sync_to_async(collect)(after, top)
+                for chunk in events(items, after):
+                    yield chunk
+            else:
+                yield ": ping\n\n"
+
+    return _sse_response(astream() if is_async else stream())
+
+
+def _sse_response(content):
+    resp = StreamingHttpResponse(content, content_type="text/event-stream; charset=utf-8")
+    resp["Cache-Control"] = "no-cache"
+    resp["X-Accel-Buffering"] = "no"  # tắt buffer của nginx cho SSE
+    return resp
@@ -0,0 +1,38 @@
+# shop/management/commands/archive_pageviews.py
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from shop.archive import (
+    ARCHIVE_BATCH_SIZE, ARCHIVE_PAUSE_SECONDS, PAGEVIEW_RETENTION_DAYS, archive_pageviews,
+)
+
+
+class Command(BaseCommand):
+    help = ("Chuyển PageView cũ ra file gzip JSONL theo ngày (thư mục PAGEVIEW_ARCHIVE_DIR) "
+            "rồi xóa khỏi DB theo lô.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=PAGEVIEW_RETENTION_DAYS, help="Giữ lại N ngày gần nhất trong DB.")
+        parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+        parser.add_argument("--pause", type=float, default=ARCHIVE_PAUSE_SECONDS, help="Nghỉ giữa các lô xóa (giây).")
+        parser.add_argument("--dry-run", action="store_true", help="Chỉ đếm, không ghi/xóa.")
+        parser.add_argument("--vacuum", action="store_true", help="VACUUM sau khi xóa (SQLite) để thu nhỏ file DB.")
+
+    def handle(self, *args, **opts):
+        res = archive_pageviews(
+            older_than_days=max(0, opts["days"]),
+            batch_size=max(1, opts["batch_size"]),
+            pause=max(0.0, opts["pause"]),
+            dry_run=opts["dry_run"],
+            log=(lambda m: self.stdout.write(f"  … {m}")) if opts["verbosity"] > 1 else None,
+        )
+        if opts["dry_run"]:
+            self.stdout.write(self.style.SUCCESS(f"Sẽ lưu trữ {res.written} dòng của {res.days} ngày."))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Đã lưu trữ {res.written} dòng của {res.days} ngày, xóa {res.deleted} dòng khỏi DB."
+        ))
+        if opts["vacuum"] and res.deleted and connection.vendor == "sqlite":
+            with connection.cursor() as cur:
+                cur.execute("VACUUM")
+            self.stdout.write("Đã VACUUM.")
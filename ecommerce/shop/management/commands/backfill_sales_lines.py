@@ -0,0 +1,19 @@
+# shop/management/commands/backfill_sales_lines.py
+from django.core.management.base import BaseCommand
+
+from shop.facts import SOURCES
+from shop.sales import SALES_BACKFILL_BATCH, backfill
+
+
+class Command(BaseCommand):
+    help = "Đồng bộ SalesLine từ toàn bộ shop.OrderItem / cart.OrderItem."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=SALES_BACKFILL_BATCH, help="Số đơn mỗi lô.")
+        parser.add_argument("--source", choices=sorted(SOURCES), action="append",
+                            help="Chỉ đồng bộ nguồn này (lặp lại được); mặc định cả hai.")
+
+    def handle(self, *args, **opts):
+        log = (lambda m: self.stdout.write(f"  … {m}")) if opts["verbosity"] > 1 else None
+        n = backfill(opts["source"] or tuple(SOURCES), batch_size=max(1, opts["batch_size"]), log=log)
+        self.stdout.write(self.style.SUCCESS(f"Đã thêm/sửa/xóa {n} dòng SalesLine."))
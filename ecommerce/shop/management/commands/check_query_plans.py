@@ -0,0 +1,29 @@
+# shop/management/commands/check_query_plans.py
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.query_plans import QUERY_PLAN_LARGE_ROWS, run
+
+
+class Command(BaseCommand):
+    help = ("Chạy mọi truy vấn báo cáo và trang danh sách trên dữ liệu mẫu (DB test tạm), "
+            "EXPLAIN QUERY PLAN từng câu; lỗi nếu có full scan trên bảng lớn.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=5000, help="Số đơn mẫu mỗi nguồn (shop/cart).")
+        parser.add_argument("--large-rows", type=int, default=QUERY_PLAN_LARGE_ROWS,
+                            help="Bảng từ chừng này dòng trở lên coi là bảng lớn.")
+
+    def handle(self, *args, **opts):
+        planned = run(rows=max(1, opts["rows"]), large_rows=opts["large_rows"])
+
+        bad = [pq for pq in planned if pq.full_scans]
+        for pq in planned:
+            if opts["verbosity"] > 1 or pq.full_scans:
+                self.stdout.write(("✗ " if pq.full_scans else "  ") + pq.label)
+                if opts["verbosity"] > 2 or pq.full_scans:
+                    self.stdout.write(f"    {pq.sql[:300]}")
+                for line in pq.plan:
+                    self.stdout.write(f"      {line}")
+        if bad:
+            raise CommandError(f"{len(bad)}/{len(planned)} câu truy vấn full scan bảng lớn.")
+        self.stdout.write(self.style.SUCCESS(f"OK: {len(planned)} câu truy vấn, không full scan bảng lớn."))
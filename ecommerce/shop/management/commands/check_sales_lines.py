@@ -0,0 +1,29 @@
+# shop/management/commands/check_sales_lines.py
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.facts import SOURCES
+from shop.sales import check
+
+
+class Command(BaseCommand):
+    help = "Đối soát SalesLine với dữ liệu gốc theo từng đơn (số dòng, số lượng, tổng tiền, trạng thái)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fix", action="store_true", help="Đồng bộ lại các đơn bị lệch.")
+        parser.add_argument("--source", choices=sorted(SOURCES), action="append",
+                            help="Chỉ kiểm tra nguồn này (lặp lại được); mặc định cả hai.")
+
+    def handle(self, *args, **opts):
+        result = check(opts["source"] or tuple(SOURCES), fix=opts["fix"])
+        total = 0
+        for source, bad in result.items():
+            total += len(bad)
+            if bad:
+                sample = ", ".join(f"#{o}" for o in bad[:20]) + (" …" if len(bad) > 20 else "")
+                self.stdout.write(self.style.WARNING(f"{source}: {len(bad)} đơn lệch: {sample}"))
+            else:
+                self.stdout.write(f"{source}: khớp")
+        if total and not opts["fix"]:
+            raise CommandError(f"{total} đơn lệch (chạy lại với --fix để đồng bộ).")
+        if total:
+            self.stdout.write(self.style.SUCCESS(f"Đã đồng bộ lại {total} đơn."))
@@ -0,0 +1,24 @@
+# shop/management/commands/rebuild_consult_sketches.py
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.consult_stats import rebuild
+
+
+class Command(BaseCommand):
+    help = "Dựng lại ConsultSketch (phân vị thời gian xử lý tư vấn theo ngày) từ ConsultationRequest."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="date_from", help="Từ ngày (YYYY-MM-DD), mặc định: yêu cầu đầu tiên.")
+        parser.add_argument("--to", dest="date_to", help="Đến ngày, tính cả ngày này (YYYY-MM-DD).")
+
+    def handle(self, *args, **opts):
+        try:
+            date_from = date.fromisoformat(opts["date_from"]) if opts["date_from"] else None
+            date_to = date.fromisoformat(opts["date_to"]) if opts["date_to"] else None
+        except ValueError as e:
+            raise CommandError(f"Ngày không hợp lệ: {e}")
+        log = (lambda m: self.stdout.write(f"  … {m}")) if opts["verbosity"] > 1 else None
+        n = rebuild(date_from=date_from, date_to=date_to, log=log)
+        self.stdout.write(self.style.SUCCESS(f"Đã dựng lại {n} sketch."))
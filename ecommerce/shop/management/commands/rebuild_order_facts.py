@@ -0,0 +1,26 @@
+# shop/management/commands/rebuild_order_facts.py
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.facts import SOURCES, rebuild
+
+
+class Command(BaseCommand):
+    help = "Dựng lại OrderDailyFact từ shop.OrderItem / cart.OrderItem."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="date_from", help="Từ ngày (YYYY-MM-DD), mặc định: đơn đầu tiên.")
+        parser.add_argument("--to", dest="date_to", help="Đến ngày, tính cả ngày này (YYYY-MM-DD).")
+        parser.add_argument("--source", choices=sorted(SOURCES), action="append",
+                            help="Chỉ dựng nguồn này (lặp lại được); mặc định cả hai.")
+
+    def handle(self, *args, **opts):
+        try:
+            date_from = date.fromisoformat(opts["date_from"]) if opts["date_from"] else None
+            date_to = date.fromisoformat(opts["date_to"]) if opts["date_to"] else None
+        except ValueError as e:
+            raise CommandError(f"Ngày không hợp lệ: {e}")
+        log = (lambda m: self.stdout.write(f"  … {m}")) if opts["verbosity"] > 1 else None
+        n = rebuild(opts["source"] or tuple(SOURCES), date_from=date_from, date_to=date_to, log=log)
+        self.stdout.write(self.style.SUCCESS(f"Đã dựng lại {n} dòng fact."))
@@ -0,0 +1,24 @@
+# shop/management/commands/rollup_pageviews.py
+from django.core.management.base import BaseCommand
+
+from shop.rollups import PAGEVIEW_ROLLUP_BATCH, rebuild_sketches, rollup_pageviews
+
+
+class Command(BaseCommand):
+    help = "Tổng hợp PageView mới (từ watermark) vào PageViewDaily."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=PAGEVIEW_ROLLUP_BATCH, help="Số id PageView mỗi lô.")
+        parser.add_argument("--rebuild-sketches", action="store_true",
+                            help="Dựng lại toàn bộ sketch khách duy nhất (PageView + file lưu trữ).")
+
+    def handle(self, *args, **opts):
+        log = (lambda m: self.stdout.write(f"  … {m}")) if opts["verbosity"] > 1 else None
+        if opts["rebuild_sketches"]:
+            n = rebuild_sketches(batch_size=max(1, opts["batch_size"]), log=log)
+            self.stdout.write(self.style.SUCCESS(f"Đã dựng lại {n} sketch."))
+            return
+        res = rollup_pageviews(batch_size=max(1, opts["batch_size"]), log=log)
+        self.stdout.write(self.style.SUCCESS(
+            f"Đã tổng hợp {res.rows} lượt xem vào {res.buckets} dòng ngày (watermark id={res.last_id})."
+        ))
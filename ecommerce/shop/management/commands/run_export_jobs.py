@@ -0,0 +1,18 @@
+# shop/management/commands/run_export_jobs.py
+from django.core.management.base import BaseCommand
+
+from shop.jobs import EXPORT_JOB_POLL_SECONDS, EXPORT_JOB_WORKERS, run_worker
+
+
+class Command(BaseCommand):
+    help = "Worker chạy các job xuất báo cáo (ExportJob) trong process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=EXPORT_JOB_WORKERS, help="Số job chạy đồng thời.")
+        parser.add_argument("--poll", type=float, default=EXPORT_JOB_POLL_SECONDS, help="Giây giữa 2 lần kiểm tra hàng đợi.")
+        parser.add_argument("--once", action="store_true", help="Chạy hết job đang chờ rồi thoát (dùng cho cron).")
+
+    def handle(self, *args, **opts):
+        log = (lambda m: self.stdout.write(f"  … {m}")) if opts["verbosity"] > 1 else None
+        n = run_worker(workers=opts["workers"], poll=max(0.1, opts["poll"]), once=opts["once"], log=log)
+        self.stdout.write(self.style.SUCCESS(f"Đã xử lý {n} job."))
@@ -0,0 +1,41 @@
+# shop/management/commands/sweep_sessions.py
+from django.core.management.base import BaseCommand
+
+from shop.session_sweeper import (
+    SWEEP_BATCH_SIZE, SWEEP_PAUSE_SECONDS, session_table_stats, sweep_sessions,
+)
+
+
+class Command(BaseCommand):
+    help = "Dọn django_session theo lô: xóa session hết hạn (và session rỗng nếu có --empty)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--empty", action="store_true", help="Xóa cả session rỗng (chưa đăng nhập, giỏ trống).")
+        parser.add_argument("--batch-size", type=int, default=SWEEP_BATCH_SIZE)
+        parser.add_argument("--pause", type=float, default=SWEEP_PAUSE_SECONDS, help="Nghỉ giữa các lô (giây).")
+        parser.add_argument("--dry-run", action="store_true", help="Chỉ đếm, không xóa.")
+        parser.add_argument("--stats", action="store_true", help="Chỉ in số liệu bảng session.")
+
+    def handle(self, *args, **opts):
+        before = session_table_stats()
+        self.stdout.write(self._fmt("Trước", before))
+        if opts["stats"]:
+            return
+
+        res = sweep_sessions(
+            include_empty=opts["empty"],
+            batch_size=max(1, opts["batch_size"]),
+            pause=max(0.0, opts["pause"]),
+            dry_run=opts["dry_run"],
+            log=(lambda m: self.stdout.write(f"  … {m}")) if opts["verbosity"] > 1 else None,
+        )
+        verb = "Sẽ xóa" if opts["dry_run"] else "Đã xóa"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb}: {res.expired} hết hạn, {res.empty} rỗng (đã quét {res.scanned})."
+        ))
+        if not opts["dry_run"]:
+            self.stdout.write(self._fmt("Sau", session_table_stats()))
+
+    @staticmethod
+    def _fmt(label, st):
+        return f"{label}: {st['rows']} session, {st['expired']} hết hạn, ~{st['data_bytes'] / 1024:.1f} KiB dữ liệu"
@@ -1,40 +1,107 @@
 # shop/middleware.py
-from datetime import date
-from django.utils.deprecation import MiddlewareMixin
+import hashlib
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.contrib.auth import SESSION_KEY
 from django.utils import timezone
-from .models import PageView
 
-class PageViewMiddleware(MiddlewareMixin):
+from .analytics import pageview_relay, pageview_writer, seen_today
+from .bots import PAGEVIEW_BOT_MODE, is_bot_request
+
+
+def client_ip(request) -> str:
+    return request.META.get("HTTP_X_FORWARDED_FOR", "").split(",")[0].strip() or request.META.get("REMOTE_ADDR") or ""
+
+
+def visitor_key(request) -> str:
+    """Khóa nhận diện khách khi chưa có session: băm IP + User-Agent (40 ký tự)."""
+    raw = f"{client_ip(request)}|{request.META.get('HTTP_USER_AGENT', '')}"
+    return hashlib.sha1(raw.encode("utf-8", "ignore")).hexdigest()
+
+
+def _user_id(value):
+    return int(value) if value and str(value).isdigit() else None
+
+
+class PageViewMiddleware:
+    """
+    Ghi nhận lượt xem, chạy được cả WSGI (sync) lẫn ASGI (async).
+    - sync: đẩy sự kiện thẳng vào hàng đợi của pageview_writer (DEBUG/test: ghi ngay).
+    - async: đẩy vào asyncio.Queue (pageview_relay) rồi trả request ngay; 1 task
+      nền chuyển sang writer -> không nhảy thread, không chặn event loop.
+    """
+    sync_capable = True
+    async_capable = True
+
     EXCLUDE_PREFIXES = ("/admin/", "/static/", "/media/")
 
-    def process_request(self, request):
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
         try:
-            # bỏ qua admin/static/media
-            path = request.path or "/"
-            if any(path.startswith(p) for p in self.EXCLUDE_PREFIXES):
-                return
-
-            # đảm bảo có session
-            if not request.session.session_key:
-                request.session.create()
-            skey = request.session.session_key
-
-            # chỉ ghi 1 lần / ngày / session
-            now = timezone.now()
-            start = timezone.make_aware(timezone.datetime.combine(now.date(), timezone.datetime.min.time()))
-            exists = PageView.objects.filter(session_key=skey, created_at__gte=start).exists()
-            if exists:
-                return
-
-            # lấy IP
-            ip = request.META.get("HTTP_X_FORWARDED_FOR", "").split(",")[0].strip() or request.META.get("REMOTE_ADDR")
-
-            PageView.objects.create(
-                session_key=skey,
-                ip=ip or None,
-                path=path[:255],
-                user=request.user if request.user.is_authenticated else None,
-            )
+            event = self._event(request)
+            if event is not None:
+                session = getattr(request, "session", None)
+                # user id lấy thẳng từ session (không query bảng user)
+                if session is not None and session.session_key:
+                    event["user_id"] = _user_id(session.get(SESSION_KEY))
+                pageview_writer.put(event)
         except Exception:
             # không làm gián đoạn request khi log lỗi
             pass
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        try:
+            event = self._event(request)
+            if event is not None:
+                session = getattr(request, "session", None)
+                if session is not None and session.session_key:
+                    event["user_id"] = _user_id(await session.aget(SESSION_KEY))
+                if pageview_writer.buffered:
+                    pageview_relay.put(event)
+                else:  # DEBUG / test: ghi ngay, ngoài event loop
+                    await sync_to_async(pageview_writer.put)(event)
+        except Exception:
+            pass
+        return await self.get_response(request)
+
+    def _event(self, request):
+        """Dict sự kiện cho request này, hoặc None nếu không cần ghi."""
+        # đánh dấu bot sớm để view/phần sau có thể bỏ qua việc ghi session, thống kê...
+        bot = request.is_bot = is_bot_request(request)
+
+        # bỏ qua admin/static/media
+        path = request.path or "/"
+        if any(path.startswith(p) for p in self.EXCLUDE_PREFIXES):
+            return None
+        if bot and PAGEVIEW_BOT_MODE == "drop":
+            return None
+
+        # KHÔNG tạo session cho khách vãng lai (mỗi lần create() = 1 dòng django_session);
+        # chưa có session thì nhận diện theo IP + User-Agent.
+        session = getattr(request, "session", None)
+        skey = (session.session_key if session is not None else None) or visitor_key(request)
+
+        # Đã đếm hôm nay (filter trong bộ nhớ) -> khỏi xếp hàng; writer tự đánh dấu khi xếp hàng được
+        if seen_today.seen(skey):
+            return None
+
+        # Chỉ xếp hàng; thread nền ghi theo lô & kiểm tra lại bằng DB.
+        return {
+            "path": path,
+            "referer": request.META.get("HTTP_REFERER", ""),
+            "user_agent": request.META.get("HTTP_USER_AGENT", ""),
+            "ip": client_ip(request) or None,
+            "session_key": skey,
+            "user_id": None,
+            "is_bot": bot,
+            # giờ request, không phải giờ writer flush (lô cuối ngày / hàng đợi chậm)
+            "created_at": timezone.now(),
+        }
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.6 on 2026-10-19 13:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0015_pageview_session_key_pageview_user_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PageViewDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('path', models.CharField(max_length=300)),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('sessions', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pageview_dailies', to='shop.product')),
+            ],
+            options={
+                'verbose_name': 'Lượt xem theo ngày',
+                'verbose_name_plural': 'Lượt xem theo ngày',
+                'ordering': ['-date', 'path'],
+                'constraints': [models.UniqueConstraint(fields=('date', 'path'), name='uniq_pageviewdaily_date_path')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-19 13:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0016_rollupwatermark_pageviewdaily'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PageViewSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('data', models.BinaryField()),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='pageview_sketches', to='shop.product')),
+            ],
+            options={
+                'verbose_name': 'Sketch khách theo ngày',
+                'verbose_name_plural': 'Sketch khách theo ngày',
+                'constraints': [models.UniqueConstraint(fields=('date', 'product'), name='uniq_pageviewsketch_date_product'), models.UniqueConstraint(condition=models.Q(('product__isnull', True)), fields=('date',), name='uniq_pageviewsketch_date_site')],
+            },
+        ),
+    ]
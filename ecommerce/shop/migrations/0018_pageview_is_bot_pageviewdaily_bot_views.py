@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-19 13:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0017_pageviewsketch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pageview',
+            name='is_bot',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='pageviewdaily',
+            name='bot_views',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
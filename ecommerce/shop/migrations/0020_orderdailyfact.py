@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-19 13:52
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0019_exportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderDailyFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('source', models.CharField(choices=[('shop', 'shop.Order'), ('cart', 'cart.Order')], max_length=4)),
+                ('status', models.CharField(max_length=20)),
+                ('supplier', models.CharField(blank=True, default='', max_length=255)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('lines', models.PositiveIntegerField(default=0)),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=18)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='shop.category')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_facts', to='shop.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['source', 'day'], name='shop_orderd_source_f75683_idx')],
+                'constraints': [models.UniqueConstraint(fields=('day', 'source', 'product', 'status'), name='uniq_orderdailyfact_bucket')],
+            },
+        ),
+    ]
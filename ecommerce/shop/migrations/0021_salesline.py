@@ -0,0 +1,41 @@
+# Generated by Django 5.2.6 on 2026-10-19 13:54
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0020_orderdailyfact'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('shop', 'shop.Order'), ('cart', 'cart.Order')], max_length=4)),
+                ('item_id', models.BigIntegerField()),
+                ('order_id', models.BigIntegerField()),
+                ('created_at', models.DateTimeField()),
+                ('status', models.CharField(max_length=20)),
+                ('state', models.CharField(choices=[('open', 'Chưa xác nhận'), ('confirmed', 'Đã xác nhận/thanh toán'), ('cancelled', 'Đã hủy/hoàn tiền')], max_length=10)),
+                ('supplier', models.CharField(blank=True, default='', max_length=255)),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('price', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('line_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=18)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='shop.category')),
+                ('plan', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='shop.serviceplan')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='shop.product')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at'], name='shop_salesl_created_d36412_idx'), models.Index(fields=['state', 'created_at'], name='shop_salesl_state_cfc53c_idx'), models.Index(fields=['supplier', 'created_at'], name='shop_salesl_supplie_e4681b_idx'), models.Index(fields=['category', 'created_at'], name='shop_salesl_categor_fab190_idx'), models.Index(fields=['source', 'order_id'], name='shop_salesl_source_558b57_idx')],
+                'constraints': [models.UniqueConstraint(fields=('source', 'item_id'), name='uniq_salesline_item')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-19 14:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('shop', '0022_consultsketch'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='orderitem',
+            name='shop_orderi_order_i_08c5ca_idx',
+        ),
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(fields=['order', 'product'], name='shop_orderi_order_i_d3fcce_idx'),
+        ),
+        # auth.User không sửa Meta được: báo cáo user mới / cohort lọc theo khoảng date_joined
+        migrations.RunSQL(
+            "CREATE INDEX IF NOT EXISTS shop_auth_user_date_joined_idx ON auth_user (date_joined)",
+            reverse_sql="DROP INDEX IF EXISTS shop_auth_user_date_joined_idx",
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-19 14:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0023_report_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='consultationrequest',
+            index=models.Index(fields=['handled_by', 'status', 'created_at'], name='shop_consul_handled_ecf4e8_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-19 14:20
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0024_consult_queue_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pageview',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-19 14:24
+
+import shop.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0025_pageview_created_at_default'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='exportjob',
+            name='file',
+            field=models.FileField(blank=True, storage=shop.models.export_storage, upload_to='exports/'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-19 14:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0027_exportjob_claim_heartbeat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rollupwatermark',
+            name='horizon_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='rollupwatermark',
+            name='horizon_id',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
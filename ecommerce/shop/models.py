@@ -1,11 +1,13 @@
 # shop/models.py (rewritten)
 from __future__ import annotations
 from decimal import Decimal
+import os
 import re
 import unicodedata
 from typing import Optional
 
 from django.conf import settings
+from django.core.files.storage import FileSystemStorage
 from django.db import models
 from django.urls import reverse
 from django.core.validators import MinValueValidator
@@ -152,6 +154,9 @@ class ConsultationRequest(models.Model):
         DONE = "done", "Hoàn tất"
         CANCELLED = "cancelled", "Đã hủy"
 
+    # Các trạng thái còn cần staff xử lý (tab "Đang chờ")
+    OPEN_STATUSES = (Status.NEW, Status.CONTACTED)
+
     # Người gửi yêu cầu có thể là khách vãng lai
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="consult_requests")
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="consult_requests")
@@ -168,6 +173,8 @@ class ConsultationRequest(models.Model):
         indexes = [
             models.Index(fields=["status", "-created_at"]) ,
             models.Index(fields=["product", "status"]) ,
+            # hàng đợi của từng nhân viên (consult_my_queue) + đếm tải (assignment)
+            models.Index(fields=["handled_by", "status", "created_at"]) ,
         ]
         verbose_name = "Yêu cầu tư vấn"
         verbose_name_plural = "Yêu cầu tư vấn"
@@ -176,6 +183,10 @@ class ConsultationRequest(models.Model):
         who = self.user.username if self.user_id else (self.customer_name or "Khách")
         return f"{who} — {self.product.name}"
 
+    @property
+    def is_open(self) -> bool:
+        return self.status in self.OPEN_STATUSES
+
 from django.utils import timezone
 # ===================== Orders =====================
 class Order(models.Model):
@@ -252,7 +263,8 @@ class OrderItem(models.Model):
                              on_delete=models.PROTECT, related_name="order_items")
     class Meta:
         ordering = ["id"]
-        indexes = [models.Index(fields=["order"]) ]
+        # (order, product): tính lại fact/SalesLine theo đơn + sản phẩm không phải đọc bảng dòng hàng
+        indexes = [models.Index(fields=["order", "product"]) ]
         verbose_name = "Mục đơn hàng"
         verbose_name_plural = "Mục đơn hàng"
 
@@ -271,13 +283,20 @@ class PageView(models.Model):
     user_agent = models.CharField(max_length=300, blank=True)
     ip = models.GenericIPAddressField(blank=True, null=True)
     product = models.ForeignKey(Product, null=True, blank=True, on_delete=models.SET_NULL, related_name="pageviews")
-    created_at = models.DateTimeField(auto_now_add=True)
+    # session key, hoặc sha1(IP|UA) khi khách chưa có session — dùng cho luật 1 lượt/ngày
+    session_key = models.CharField(max_length=40, blank=True, default="")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name="pageviews")
+    is_bot = models.BooleanField(default=False)  # UA bot/crawler (shop/bots.py)
+    # thời điểm request (writer ghi trễ theo lô) -> default, không dùng auto_now_add
+    # vì auto_now_add ghi đè giá trị truyền vào bulk_create
+    created_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         ordering = ["-created_at"]
         indexes = [
             models.Index(fields=["-created_at"]) ,
             models.Index(fields=["path"]) ,
+            models.Index(fields=["session_key", "created_at"]) ,
         ]
         verbose_name = "Lượt xem trang"
         verbose_name_plural = "Lượt xem trang"
@@ -286,6 +305,194 @@ class PageView(models.Model):
         return f"{self.path} @ {self.created_at:%Y-%m-%d %H:%M}"
 
 
+class PageViewDaily(models.Model):
+    """Tổng hợp PageView theo ngày + path (do shop.rollups.rollup_pageviews duy trì)."""
+    date = models.DateField()
+    path = models.CharField(max_length=300)
+    product = models.ForeignKey(Product, null=True, blank=True, on_delete=models.SET_NULL, related_name="pageview_dailies")
+    views = models.PositiveIntegerField(default=0)       # chỉ người thật
+    sessions = models.PositiveIntegerField(default=0)
+    bot_views = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["-date", "path"]
+        constraints = [
+            models.UniqueConstraint(fields=["date", "path"], name="uniq_pageviewdaily_date_path"),
+        ]
+        verbose_name = "Lượt xem theo ngày"
+        verbose_name_plural = "Lượt xem theo ngày"
+
+    def __str__(self) -> str:
+        return f"{self.date} {self.path}: {self.views}"
+
+
+class PageViewSketch(models.Model):
+    """HyperLogLog khách duy nhất (không tính bot) theo ngày (product=None: toàn site) — xem shop/hll.py."""
+    date = models.DateField()
+    product = models.ForeignKey(Product, null=True, blank=True, on_delete=models.CASCADE, related_name="pageview_sketches")
+    data = models.BinaryField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["date", "product"], name="uniq_pageviewsketch_date_product"),
+            models.UniqueConstraint(fields=["date"], condition=models.Q(product__isnull=True),
+                                    name="uniq_pageviewsketch_date_site"),
+        ]
+        verbose_name = "Sketch khách theo ngày"
+        verbose_name_plural = "Sketch khách theo ngày"
+
+    def __str__(self) -> str:
+        return f"{self.date} {self.product_id or 'site'}"
+
+
+class ConsultSketch(models.Model):
+    """Sketch phân vị thời gian xử lý tư vấn theo ngày tạo (staff=None: mọi nhân viên) — xem shop/quantiles.py."""
+    date = models.DateField()
+    staff = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.CASCADE, related_name="+")
+    count = models.PositiveIntegerField(default=0)
+    data = models.BinaryField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["date", "staff"], name="uniq_consultsketch_date_staff"),
+            models.UniqueConstraint(fields=["date"], condition=models.Q(staff__isnull=True),
+                                    name="uniq_consultsketch_date_all"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.date} {self.staff_id or 'all'}"
+
+
+class RollupWatermark(models.Model):
+    """Vị trí đã xử lý (id nguồn lớn nhất) của từng job tổng hợp ("sales_cube": số phiên bản của cube)."""
+    name = models.CharField(max_length=50, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    # MAX(id) quan sát lúc horizon_at: chỉ được gom tới đó khi đã qua độ trễ an toàn
+    horizon_id = models.BigIntegerField(default=0)
+    horizon_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"{self.name} @ {self.last_id}"
+
+
+class OrderDailyFact(models.Model):
+    """Tổng theo ngày x sản phẩm x trạng thái đơn (shop.Order & cart.Order), cập nhật theo signal."""
+    class Source(models.TextChoices):
+        SHOP = "shop", "shop.Order"
+        CART = "cart", "cart.Order"
+
+    day = models.DateField()
+    source = models.CharField(max_length=4, choices=Source.choices)
+    status = models.CharField(max_length=20)
+    product = models.ForeignKey("Product", on_delete=models.CASCADE, related_name="daily_facts")
+    # sao chép từ Product để lọc/gom không cần join
+    category = models.ForeignKey("Category", null=True, blank=True, on_delete=models.SET_NULL, related_name="+")
+    supplier = models.CharField(max_length=255, blank=True, default="")
+    orders = models.PositiveIntegerField(default=0)   # số đơn khác nhau
+    lines = models.PositiveIntegerField(default=0)    # số dòng OrderItem
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=18, decimal_places=2, default=Decimal("0.00"))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["day", "source", "product", "status"], name="uniq_orderdailyfact_bucket"),
+        ]
+        indexes = [models.Index(fields=["source", "day"])]
+
+    def __str__(self) -> str:
+        return f"{self.day} {self.source} #{self.product_id} {self.status}"
+
+
+class SalesLine(models.Model):
+    """
+    Dòng bán hàng hợp nhất từ shop.OrderItem và cart.OrderItem (read model cho báo cáo).
+    Chỉ ghi qua shop/sales.py (signal / backfill), không sửa tay.
+    """
+    class State(models.TextChoices):
+        OPEN = "open", "Chưa xác nhận"
+        CONFIRMED = "confirmed", "Đã xác nhận/thanh toán"
+        CANCELLED = "cancelled", "Đã hủy/hoàn tiền"
+
+    source = models.CharField(max_length=4, choices=OrderDailyFact.Source.choices)
+    item_id = models.BigIntegerField()
+    order_id = models.BigIntegerField()
+    created_at = models.DateTimeField()  # thời điểm tạo đơn
+    status = models.CharField(max_length=20)  # trạng thái gốc của đơn
+    state = models.CharField(max_length=10, choices=State.choices)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name="+")
+    product = models.ForeignKey("Product", on_delete=models.CASCADE, related_name="+")
+    plan = models.ForeignKey("ServicePlan", null=True, blank=True, on_delete=models.SET_NULL, related_name="+")
+    # sao chép từ Product để lọc/gom không cần join
+    category = models.ForeignKey("Category", null=True, blank=True, on_delete=models.SET_NULL, related_name="+")
+    supplier = models.CharField(max_length=255, blank=True, default="")
+    quantity = models.PositiveIntegerField(default=0)
+    price = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
+    line_total = models.DecimalField(max_digits=18, decimal_places=2, default=Decimal("0.00"))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["source", "item_id"], name="uniq_salesline_item"),
+        ]
+        indexes = [
+            models.Index(fields=["created_at"]),
+            models.Index(fields=["state", "created_at"]),
+            models.Index(fields=["supplier", "created_at"]),
+            models.Index(fields=["category", "created_at"]),
+            models.Index(fields=["source", "order_id"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.source} #{self.order_id}/{self.item_id}"
+
+
+def export_storage():
+    """
+    Nơi lưu file xuất báo cáo: NGOÀI MEDIA_ROOT (MEDIA_ROOT được phục vụ công khai),
+    không có base_url -> chỉ tải được qua view staff admin_export_job_download.
+    """
+    root = getattr(settings, "EXPORT_ROOT", None) or os.path.join(str(settings.BASE_DIR), "private")
+    return FileSystemStorage(location=root, base_url=None)
+
+
+class ExportJob(models.Model):
+    """Job xuất báo cáo chạy nền (worker: manage.py run_export_jobs)."""
+    class Status(models.TextChoices):
+        QUEUED = "queued", "Đang chờ"
+        RUNNING = "running", "Đang chạy"
+        DONE = "done", "Xong"
+        FAILED = "failed", "Lỗi"
+
+    kind = models.CharField(max_length=50)
+    fmt = models.CharField(max_length=10, default="csv")
+    params = models.JSONField(default=dict, blank=True)  # query string lúc tạo job
+    can_see_revenue = models.BooleanField(default=False)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.QUEUED)
+    file = models.FileField(upload_to="exports/", storage=export_storage, blank=True)
+    rows = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # token của lượt chạy hiện tại: chỉ lượt đang giữ token mới được ghi kết quả
+    claim = models.CharField(max_length=32, blank=True, default="")
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name="export_jobs"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)  # worker còn sống
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["status", "created_at"]),
+            models.Index(fields=["created_by", "-created_at"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"#{self.pk} {self.kind}.{self.fmt} ({self.status})"
+
+
 # ===================== Service Plans & Subscriptions =====================
 class ServicePlan(models.Model):
     class Term(models.TextChoices):
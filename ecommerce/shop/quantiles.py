@@ -0,0 +1,111 @@
+# shop/quantiles.py
+"""
+Sketch phân vị gộp được (kiểu DDSketch, thuần Python) cho thời gian xử lý.
+
+- Giá trị x > 0 rơi vào bucket k = ceil(log_gamma(x)), gamma = (1+a)/(1-a):
+  mọi phân vị trả về có sai số tương đối <= a (mặc định 1%), kể cả p99 ở đuôi dài.
+- Gộp 2 sketch = cộng số đếm từng bucket -> gộp theo ngày/tuần/tháng/nhân viên
+  cho kết quả đúng như sketch dựng từ toàn bộ dữ liệu thô.
+- Thời gian xử lý trải từ vài giây tới vài tuần chỉ cần ~1500 bucket; thực tế
+  mỗi ngày vài chục bucket -> lưu dạng thưa (key, count).
+"""
+from __future__ import annotations
+
+import math
+import struct
+from typing import Dict, Iterable, Optional
+
+DEFAULT_ALPHA = 0.01
+MIN_VALUE = 1e-3  # nhỏ hơn (kể cả âm) coi như 0
+
+_MAGIC = b"Q"
+_HEADER = struct.Struct(">dQdd")  # alpha, zeros, min, max
+_BIN = struct.Struct(">iI")
+
+
+class QuantileSketch:
+    __slots__ = ("alpha", "gamma", "_log_gamma", "bins", "zeros", "min", "max")
+
+    def __init__(self, alpha: float = DEFAULT_ALPHA):
+        if not 0 < alpha < 1:
+            raise ValueError("alpha phải trong khoảng (0, 1)")
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = {}
+        self.zeros = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float, n: int = 1) -> None:
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if value <= MIN_VALUE:
+            self.zeros += n
+            return
+        k = math.ceil(math.log(value) / self._log_gamma)
+        self.bins[k] = self.bins.get(k, 0) + n
+
+    def update(self, values: Iterable[float]) -> "QuantileSketch":
+        for v in values:
+            self.add(v)
+        return self
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        if other.alpha != self.alpha:
+            raise ValueError("không gộp được 2 sketch khác alpha")
+        for k, c in other.bins.items():
+            self.bins[k] = self.bins.get(k, 0) + c
+        self.zeros += other.zeros
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def count(self) -> int:
+        return self.zeros + sum(self.bins.values())
+
+    def __len__(self) -> int:
+        return self.count
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Giá trị ở phân vị q (0..1); None nếu sketch rỗng."""
+        total = self.count
+        if not total:
+            return None
+        rank = q * (total - 1)
+        seen = self.zeros
+        if rank < seen:
+            return max(self.min, 0.0)
+        for k in sorted(self.bins):
+            seen += self.bins[k]
+            if seen > rank:
+                value = 2 * self.gamma ** k / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    # ---------- lưu trữ ----------
+    def to_bytes(self) -> bytes:
+        lo = self.min if self.count else 0.0
+        hi = self.max if self.count else 0.0
+        return (
+            _MAGIC + _HEADER.pack(self.alpha, self.zeros, lo, hi)
+            + b"".join(_BIN.pack(k, c) for k, c in sorted(self.bins.items()))
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "QuantileSketch":
+        data = bytes(data)
+        if data[:1] != _MAGIC:
+            raise ValueError("dữ liệu sketch không hợp lệ")
+        alpha, zeros, lo, hi = _HEADER.unpack_from(data, 1)
+        sk = cls(alpha)
+        sk.zeros = zeros
+        for off in range(1 + _HEADER.size, len(data), _BIN.size):
+            k, c = _BIN.unpack_from(data, off)
+            sk.bins[k] = c
+        if sk.count:
+            sk.min, sk.max = lo, hi
+        return sk
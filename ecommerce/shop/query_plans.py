@@ -0,0 +1,268 @@
+# shop/query_plans.py
+"""
+Kiểm tra kế hoạch truy vấn (SQLite: EXPLAIN QUERY PLAN) của báo cáo và các trang danh sách.
+
+Cách chạy (manage.py check_query_plans):
+1. Tạo DB test tạm (như manage.py test; SQLite: trong bộ nhớ), sinh dữ liệu mẫu
+   đủ lớn (user, đơn shop/cart, dòng hàng, tư vấn, lượt xem), dựng
+   SalesLine/fact/sketch/rollup như production rồi ANALYZE.
+2. Chạy mọi dataset báo cáo (cả nhánh cube và nhánh ORM) và GET các trang danh
+   sách admin/khách bằng test Client, ghi lại mọi câu SELECT.
+3. EXPLAIN QUERY PLAN từng câu; "SCAN <bảng>" không kèm index trên bảng có từ
+   QUERY_PLAN_LARGE_ROWS dòng trở lên = lỗi.
+4. Xóa DB tạm -> DB thật không bị ghi, không bị giữ khóa ghi.
+"""
+from __future__ import annotations
+
+import re
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import CommandError
+from django.db import DEFAULT_DB_ALIAS, connection
+from django.test import Client, override_settings
+from django.test.utils import (
+    CaptureQueriesContext, setup_databases, setup_test_environment, teardown_databases,
+    teardown_test_environment,
+)
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Category, ConsultationRequest, Order, OrderItem, PageView, Product
+
+QUERY_PLAN_LARGE_ROWS = getattr(settings, "QUERY_PLAN_LARGE_ROWS", 1000)
+
+_SCAN_RE = re.compile(r"^SCAN (?:TABLE )?(\S+)(.*)$")
+_ALIAS_RE = re.compile(r'"(\w+)" ([A-Z]\d+)\b')  # Django đặt alias U0/T3 cho subquery/join lặp
+_SPREAD_MINUTES = 2 * 365 * 24 * 60  # dữ liệu mẫu trải 2 năm
+
+
+@dataclass
+class PlannedQuery:
+    label: str
+    sql: str
+    plan: List[str] = field(default_factory=list)
+    full_scans: List[str] = field(default_factory=list)
+
+
+# ---------------------------------------------------------------- dữ liệu mẫu
+def _spread(model, column: str, salt: int = 7919, base_column: Optional[str] = None) -> None:
+    """Rải cột thời gian theo id (tất định) trong 2 năm gần nhất; bulk_create không đặt được auto_now_add."""
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    if base_column:
+        expr = f"datetime({qn(base_column)}, '+' || ((id * {salt}) %% 4320) || ' minutes')"
+        params: list = []
+    else:
+        expr = f"datetime(%s, '-' || ((id * {salt}) %% {_SPREAD_MINUTES}) || ' minutes')"
+        params = [timezone.now().strftime("%Y-%m-%d %H:%M:%S")]
+    with connection.cursor() as cur:
+        cur.execute(f"UPDATE {table} SET {qn(column)} = {expr}", params)
+
+
+def seed(rows: int = 5000) -> Dict[str, int]:
+    """Sinh dữ liệu mẫu: `rows` đơn shop và `rows` đơn cart (2 dòng/đơn), rows/2 user, rows/2 tư vấn."""
+    from cart.models import Order as CartOrder, OrderItem as CartItem
+    from . import consult_stats, facts, rollups, sales
+
+    staff = User.objects.create_superuser("qp_admin", "qp@example.com", None)
+    users = User.objects.bulk_create([User(username=f"qp_user_{i}") for i in range(max(1, rows // 2))])
+    _spread(User, "date_joined")
+
+    cats = [Category.objects.create(name=f"QP danh mục {i}") for i in range(5)]
+    products = [
+        Product.objects.create(name=f"QP sản phẩm {i}", category=cats[i % len(cats)], price=100 + i,
+                               supplier=f"QP NCC {i % 4}")
+        for i in range(20)
+    ]
+
+    shop_status = [s for s, _ in Order.Status.choices]
+    orders = Order.objects.bulk_create(
+        [Order(user=users[i % len(users)], status=shop_status[i % len(shop_status)]) for i in range(rows)],
+        batch_size=1000,
+    )
+    OrderItem.objects.bulk_create(
+        [OrderItem(order=o, product=products[(o.pk + k) % len(products)], quantity=1 + k, price=100)
+         for o in orders for k in range(2)],
+        batch_size=1000,
+    )
+    _spread(Order, "created_at")
+
+    cart_status = [s for s, _ in CartOrder.Status.choices]
+    cart_orders = CartOrder.objects.bulk_create(
+        [CartOrder(user=users[i % len(users)], status=cart_status[i % len(cart_status)]) for i in range(rows)],
+        batch_size=1000,
+    )
+    CartItem.objects.bulk_create(
+        [CartItem(order=o, product=products[(o.pk + k) % len(products)], quantity=1, price=100)
+         for o in cart_orders for k in range(2)],
+        batch_size=1000,
+    )
+    _spread(CartOrder, "created_at", salt=104729)
+    CartOrder.objects.filter(status=CartOrder.Status.CONFIRMED).update(confirmed_by=staff)
+    _spread(CartOrder, "confirmed_at", base_column="created_at")
+    CartOrder.objects.exclude(status=CartOrder.Status.CONFIRMED).update(confirmed_at=None)
+
+    consult_status = [s for s, _ in ConsultationRequest.Status.choices]
+    ConsultationRequest.objects.bulk_create(
+        [ConsultationRequest(product=products[i % len(products)], status=consult_status[i % len(consult_status)],
+                             handled_by=staff if i % 2 else None)
+         for i in range(max(1, rows // 2))],
+        batch_size=1000,
+    )
+    _spread(ConsultationRequest, "created_at", salt=6007)
+    _spread(ConsultationRequest, "handled_at", base_column="created_at")
+    ConsultationRequest.objects.filter(handled_by__isnull=True).update(handled_at=None)
+
+    PageView.objects.bulk_create(
+        [PageView(path=f"/product/qp-{i % 20}/", product=products[i % len(products)],
+                  session_key=f"qp{i % 997}") for i in range(rows)],
+        batch_size=1000,
+    )
+    _spread(PageView, "created_at", salt=15485863)
+
+    sales.backfill()
+    facts.rebuild()
+    consult_stats.rebuild()
+    rollups.rollup_pageviews()
+    with connection.cursor() as cur:
+        cur.execute("ANALYZE")
+    return {"users": len(users) + 1, "orders": rows, "cart_orders": rows, "consults": max(1, rows // 2)}
+
+
+# ---------------------------------------------------------------- thu câu SQL
+@contextmanager
+def _capture(label: str, out: List[Tuple[str, str]]) -> Iterator[None]:
+    with CaptureQueriesContext(connection) as ctx:
+        yield
+    for q in ctx.captured_queries:
+        out.append((label, q["sql"]))
+
+
+@contextmanager
+def _cube(enabled: bool) -> Iterator[None]:
+    """Ép bật/tắt cube (mặc định tắt) để đo cả 2 nhánh của orders_by_*."""
+    from . import cube
+
+    old, cube.REPORT_CUBE_ENABLED = cube.REPORT_CUBE_ENABLED, enabled
+    try:
+        yield
+    finally:
+        cube.REPORT_CUBE_ENABLED = old
+
+
+def _report_queries(out: List[Tuple[str, str]]) -> None:
+    from .reports import DATASETS, ReportParams
+
+    now = timezone.localtime()
+    variants = {
+        "30 ngày": {},
+        "1 năm/tháng + NCC": {"date_from": (now - timedelta(days=365)).date().isoformat(),
+                               "date_to": now.date().isoformat(), "group_by": "month", "supplier": "QP NCC 1"},
+        "lẻ giờ/tuần + danh mục": {"date_from": (now - timedelta(days=90, hours=5)).isoformat(timespec="seconds"),
+                                   "group_by": "week",
+                                   "category_id": str(Category.objects.filter(name="QP danh mục 2").values_list("id", flat=True).first() or "")},
+    }
+    for vname, query in variants.items():
+        params = ReportParams.from_query(query, can_see_revenue=True)
+        for engine, enabled in (("cube", True), ("orm", False)):
+            with _cube(enabled):
+                for name, ds in DATASETS.items():
+                    with _capture(f"report {name} [{vname}, {engine}]", out):
+                        for _ in ds.compute(params):
+                            pass
+
+
+def _page_queries(out: List[Tuple[str, str]]) -> None:
+    # không ghi PageView: câu INSERT/dedupe của lượt xem không thuộc các trang cần đo
+    middleware = [m for m in settings.MIDDLEWARE if not m.endswith("PageViewMiddleware")]
+    with override_settings(MIDDLEWARE=middleware):
+        _get_pages(Client(), out)
+
+
+def _get_pages(client: Client, out: List[Tuple[str, str]]) -> None:
+    client.force_login(User.objects.get(username="qp_admin"))
+    product = Product.objects.filter(name__startswith="QP ").first()
+    today = timezone.localdate()
+    month_ago = (today - timedelta(days=30)).isoformat()
+    pages = [
+        reverse("shop:home"),
+        reverse("shop:product_list"),
+        reverse("shop:product_by_category", kwargs={"slug": product.category.slug}),
+        reverse("shop:product_detail", kwargs={"slug": product.slug}),
+        reverse("shop:consult_list"),
+        reverse("shop:consult_list") + "?status=done",
+        reverse("shop:consult_my_queue"),
+        reverse("shop:consult_feed"),
+        reverse("shop:admin_export_jobs"),
+        reverse("shop:admin_reports_data") + f"?date_from={month_ago}&group_by=week",
+        reverse("cart:order_history"),
+        reverse("cart:admin_pending_orders"),
+        reverse("cart:admin_pending_orders_feed"),
+        reverse("cart:admin_confirmed_orders"),
+        reverse("cart:admin_confirmed_orders") + f"?date_from={month_ago}&date_to={today.isoformat()}",
+    ]
+    for url in pages:
+        with _capture(f"GET {url}", out):
+            client.get(url)
+
+
+# ---------------------------------------------------------------- EXPLAIN
+def _table_rows() -> Dict[str, int]:
+    qn = connection.ops.quote_name
+    counts = {}
+    with connection.cursor() as cur:
+        for table in connection.introspection.table_names(cur):
+            cur.execute(f"SELECT COUNT(*) FROM {qn(table)}")
+            counts[table] = cur.fetchone()[0]
+    return counts
+
+
+def explain(queries: List[Tuple[str, str]], large_rows: int = QUERY_PLAN_LARGE_ROWS) -> List[PlannedQuery]:
+    rows = _table_rows()
+    seen = set()
+    result = []
+    with connection.cursor() as cur:
+        for label, sql in queries:
+            if not sql.lstrip().upper().startswith(("SELECT", "WITH")) or sql in seen:
+                continue
+            seen.add(sql)
+            pq = PlannedQuery(label, sql)
+            aliases = {alias: table for table, alias in _ALIAS_RE.findall(sql)}
+            cur.execute("EXPLAIN QUERY PLAN " + sql)
+            for _id, _parent, _unused, detail in cur.fetchall():
+                pq.plan.append(detail)
+                m = _SCAN_RE.match(detail)
+                if not m or "USING" in m.group(2):
+                    continue
+                table = aliases.get(m.group(1), m.group(1))
+                if rows.get(table, 0) >= large_rows:
+                    pq.full_scans.append(f"{detail} ({table}: {rows[table]} dòng)")
+            result.append(pq)
+    return result
+
+
+def run(rows: int = 5000, large_rows: int = QUERY_PLAN_LARGE_ROWS) -> List[PlannedQuery]:
+    """Sinh dữ liệu trên DB test tạm, chạy báo cáo + trang danh sách, EXPLAIN; DB thật không bị đụng tới."""
+    if connection.vendor != "sqlite":
+        raise CommandError("check_query_plans chỉ hỗ trợ SQLite (EXPLAIN QUERY PLAN)")
+    setup_test_environment()  # ALLOWED_HOSTS testserver cho Client
+    try:
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={DEFAULT_DB_ALIAS})
+        try:
+            # cache riêng, rỗng: không đọc kết quả báo cáo đã cache, không ghi vào cache thật
+            with override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                                                       "LOCATION": "query-plans"}}):
+                seed(rows)
+                queries: List[Tuple[str, str]] = []
+                _report_queries(queries)
+                _page_queries(queries)
+                return explain(queries, large_rows)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+    finally:
+        teardown_test_environment()
@@ -0,0 +1,142 @@
+# shop/ratelimit.py
+"""
+Giới hạn tần suất request bằng cache (không query DB).
+
+Thuật toán "sliding window counter": mỗi khóa có 1 bộ đếm cho cửa sổ hiện tại
+và cửa sổ liền trước (cache.add + cache.incr, nguyên tử trên Redis/Memcached),
+tăng trước rồi mới so với giới hạn; số request ước lượng trong `period` giây
+gần nhất =
+    đếm_trước * (phần cửa sổ trước còn nằm trong khoảng) + đếm_hiện_tại.
+Vượt giới hạn -> trả 429 ngay trong decorator, view (và DB) không được gọi.
+
+Dùng:
+    @ratelimit("checkout", key="user")
+    def checkout_create_order(request): ...
+
+Tốc độ mặc định ở DEFAULT_RATES, ghi đè qua settings.RATELIMITS
+({"checkout": "10/m"}; None hoặc "" = tắt). RATELIMIT_ENABLED=False tắt hết.
+Lưu ý: LocMemCache đếm riêng từng process -> production nên dùng cache dùng chung.
+"""
+from __future__ import annotations
+
+import math
+import re
+import time
+from functools import wraps
+from typing import Callable, Tuple, Union
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.http import JsonResponse
+from django.shortcuts import redirect
+
+from .middleware import client_ip, visitor_key
+
+RATELIMIT_ENABLED = getattr(settings, "RATELIMIT_ENABLED", True)
+DEFAULT_RATES = {
+    "consult": "1/2m",        # shop: 1 yêu cầu / sản phẩm / user mỗi 2 phút
+    "consult_form": "3/10m",  # cart: form tư vấn (khách vãng lai được gửi), theo IP
+    "cart_add": "30/m",
+    "checkout": "5/m",
+}
+RATES = {**DEFAULT_RATES, **getattr(settings, "RATELIMITS", {})}
+
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+_RATE_RE = re.compile(r"^\s*(\d+)\s*/\s*(\d*)\s*([smhd])\s*$")
+
+KeyFunc = Callable[..., str]
+
+
+def parse_rate(rate: str) -> Tuple[int, int]:
+    """"5/m" -> (5, 60); "3/10m" -> (3, 600)."""
+    m = _RATE_RE.match(rate or "")
+    if not m:
+        raise ValueError(f"rate không hợp lệ: {rate!r}")
+    return int(m.group(1)), int(m.group(2) or 1) * _UNITS[m.group(3)]
+
+
+def _incr(key: str, ttl: int) -> int:
+    """Tăng bộ đếm (tạo nếu chưa có), trả giá trị SAU khi tăng."""
+    if cache.add(key, 1, ttl):
+        return 1
+    try:
+        return cache.incr(key)
+    except ValueError:  # vừa hết hạn giữa add và incr
+        cache.set(key, 1, ttl)
+        return 1
+
+
+def hit(key: str, limit: int, period: int) -> Tuple[bool, int]:
+    """Ghi nhận 1 request cho `key`; trả (được phép?, số giây nên chờ nếu bị chặn)."""
+    now = time.time()
+    window = int(now // period)
+    cur_key, prev_key = f"rl:{key}:{window}", f"rl:{key}:{window - 1}"
+    # tăng TRƯỚC rồi mới so: mỗi request thấy 1 giá trị đếm riêng, nên các request
+    # đồng thời không cùng lọt qua bước kiểm tra. Cửa sổ sống 2 chu kỳ: còn cần
+    # làm "cửa sổ trước" cho chu kỳ kế tiếp.
+    current = _incr(cur_key, period * 2)
+    elapsed = (now % period) / period
+    # làm tròn lên phần cửa sổ trước: với limit nhỏ (1/2m) không lọt request ngay sau mốc cửa sổ
+    estimated = math.ceil(cache.get(prev_key, 0) * (1 - elapsed)) + current
+    if estimated > limit:
+        try:
+            cache.decr(cur_key)  # request bị chặn không tính vào cửa sổ
+        except ValueError:
+            pass
+        return False, max(1, int(period - now % period))
+    return True, 0
+
+
+# ---------------------------------------------------------------- khóa
+def _session_or_ip(request) -> str:
+    session = getattr(request, "session", None)
+    skey = session.session_key if session is not None else None
+    return f"s:{skey}" if skey else f"v:{visitor_key(request)}"
+
+
+def _key_for(key: Union[str, KeyFunc], request, args, kwargs) -> str:
+    if callable(key):
+        return key(request, *args, **kwargs)
+    if key == "ip":
+        return f"ip:{client_ip(request)}"
+    if key == "session":
+        return _session_or_ip(request)
+    # "user": khách chưa đăng nhập rơi về session/IP
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return f"u:{user.pk}"
+    return _session_or_ip(request)
+
+
+def _limited_response(request, message: str, retry_after: int, json: bool):
+    wants_json = json or request.headers.get("x-requested-with") == "XMLHttpRequest" \
+        or "application/json" in request.headers.get("accept", "")
+    if wants_json:
+        resp = JsonResponse({"ok": False, "rate_limited": True, "message": message, "retry_after": retry_after},
+                            status=429)
+        resp["Retry-After"] = str(retry_after)
+        return resp
+    messages.warning(request, message)
+    return redirect(request.META.get("HTTP_REFERER") or "/")
+
+
+def ratelimit(scope: str, key: Union[str, KeyFunc] = "user", methods: Tuple[str, ...] = ("POST",),
+              message: str = "Bạn thao tác quá nhanh. Vui lòng thử lại sau ít phút.", json: bool = False):
+    """
+    Decorator giới hạn tần suất view theo `scope` (tên trong RATES) và khóa:
+    "user" (mặc định; chưa đăng nhập -> session/IP), "session", "ip" hoặc
+    hàm (request, *args, **kwargs) -> str. json=True: luôn trả JSON 429.
+    """
+    def deco(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            spec = RATES.get(scope)
+            if RATELIMIT_ENABLED and spec and request.method in methods:
+                limit, period = parse_rate(spec)
+                allowed, retry_after = hit(f"{scope}:{_key_for(key, request, args, kwargs)}", limit, period)
+                if not allowed:
+                    return _limited_response(request, message, retry_after, json)
+            return view(request, *args, **kwargs)
+        return wrapper
+    return deco
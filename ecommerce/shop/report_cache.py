@@ -0,0 +1,83 @@
+# shop/report_cache.py
+"""
+Cache kết quả báo cáo admin.
+
+- Khóa = tham số đã chuẩn hóa (date_from, date_to, group_by, supplier,
+  category_id, quyền xem doanh thu) -> cùng 1 màn hình mặc định của nhiều
+  nhân viên dùng chung 1 bản.
+- Kỳ đã đóng (date_to <= đầu ngày hôm nay) gần như không đổi -> TTL dài;
+  kỳ còn mở (chứa hôm nay / không chỉ định date_to) -> TTL ngắn.
+- Single-flight: trong 1 process dùng threading.Lock theo khóa; giữa các
+  process dùng cache.add() làm khóa, ai không giành được thì chờ kết quả.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Callable, Dict
+
+from django.conf import settings
+from django.core.cache import cache
+
+REPORT_CACHE_TTL_CLOSED = getattr(settings, "REPORT_CACHE_TTL_CLOSED", 7 * 24 * 3600)
+REPORT_CACHE_TTL_CURRENT = getattr(settings, "REPORT_CACHE_TTL_CURRENT", 60)
+REPORT_CACHE_LOCK_SECONDS = getattr(settings, "REPORT_CACHE_LOCK_SECONDS", 30)
+REPORT_CACHE_WAIT_SECONDS = getattr(settings, "REPORT_CACHE_WAIT_SECONDS", 10)
+
+_PREFIX = "reports:v3:"  # v3: tư vấn thêm p50/p90/p99 (v2: đơn hàng đọc từ SalesLine)
+
+_local_locks: Dict[str, threading.Lock] = {}
+_local_locks_guard = threading.Lock()
+
+
+def report_cache_key(**params: Any) -> str:
+    """Khóa cache ổn định từ các tham số (thứ tự không quan trọng)."""
+    raw = json.dumps(params, sort_keys=True, default=str, separators=(",", ":"))
+    return _PREFIX + hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def report_ttl(closed: bool) -> int:
+    return REPORT_CACHE_TTL_CLOSED if closed else REPORT_CACHE_TTL_CURRENT
+
+
+def _local_lock(key: str) -> threading.Lock:
+    with _local_locks_guard:
+        lock = _local_locks.get(key)
+        if lock is None:
+            lock = _local_locks[key] = threading.Lock()
+        return lock
+
+
+def get_or_compute(key: str, ttl: int, compute: Callable[[], Any]) -> Any:
+    """Trả giá trị trong cache, hoặc tính đúng 1 lần dù nhiều request cùng tới."""
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    with _local_lock(key):
+        value = cache.get(key)  # request khác trong process vừa tính xong
+        if value is not None:
+            return value
+
+        lock_key = key + ":lock"
+        if not cache.add(lock_key, 1, timeout=REPORT_CACHE_LOCK_SECONDS):
+            # process khác đang tính -> chờ kết quả; quá hạn thì tự tính
+            deadline = time.monotonic() + REPORT_CACHE_WAIT_SECONDS
+            while time.monotonic() < deadline:
+                time.sleep(0.1)
+                value = cache.get(key)
+                if value is not None:
+                    return value
+            lock_key = None
+
+        try:
+            value = compute()
+            cache.set(key, value, ttl)
+            return value
+        finally:
+            if lock_key:
+                cache.delete(lock_key)
+            with _local_locks_guard:
+                _local_locks.pop(key, None)
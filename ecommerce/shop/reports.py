@@ -0,0 +1,541 @@
+# shop/reports.py
+"""
+Số liệu báo cáo admin, tách thành từng dataset độc lập.
+
+Mỗi dataset là 1 hàm (ReportParams) -> list[dict] đăng ký trong DATASETS;
+dashboard gọi tất cả (build_payload), còn export chỉ tính đúng dataset được
+yêu cầu (get_dataset). Kết quả từng dataset được cache riêng theo tham số đã
+chuẩn hóa (shop/report_cache.py), nên dashboard và export dùng chung cache.
+
+Dataset streaming=True (vd. order_lines: từng dòng đơn hàng) không cache, không
+vào dashboard; chỉ dùng để xuất file, đọc bằng .iterator(chunk_size).
+
+orders_by_supplier/orders_by_category: đọc OrderDailyFact (+ SalesLine cho phần
+lẻ ngày), hoặc cube NumPy nếu bật REPORT_CUBE_ENABLED (xem _orders_by).
+
+Dashboard tự làm mới gửi lại "version" của lần trước (?since=...): build_delta
+chỉ tính lại các kỳ từ lần trước tới nay và chỉ trả kỳ/dataset có số liệu đổi.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import time
+from dataclasses import dataclass, replace
+from datetime import date, datetime, timezone as dt_timezone
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Min, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from . import consult_stats, cube, facts, sales
+from .models import ConsultationRequest, OrderDailyFact, SalesLine
+from .report_cache import get_or_compute, report_cache_key, report_ttl
+from .rollups import period_start
+
+# tùy chọn (không có trong requirements.txt): có numpy thì đếm ma trận cohort
+# bằng bincount, không có thì vòng lặp Python cho cùng kết quả
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+GROUP_FUNCS = {"day": TruncDate, "week": TruncWeek, "month": TruncMonth}
+EXPORT_CHUNK_SIZE = getattr(settings, "EXPORT_CHUNK_SIZE", 2000)
+# số cột tháng của bảng cohort (m0..m{N-1}), phần còn lại dồn vào m{N}_plus
+COHORT_MONTHS = getattr(settings, "REPORT_COHORT_MONTHS", 12)
+# delta chỉ xét lại các kỳ gần đây; quá chừng này giây kể từ lần gửi đủ -> gửi đủ lại
+# (bắt được thay đổi muộn ở kỳ cũ: hủy đơn, xử lý tư vấn cũ...)
+REPORT_DELTA_FULL_SECONDS = getattr(settings, "REPORT_DELTA_FULL_SECONDS", 600)
+_DELTA_SALT = "shop.reports.delta"
+
+
+@dataclass(frozen=True)
+class ReportParams:
+    date_from: datetime
+    date_to: datetime
+    group_by: str = "day"
+    supplier: str = ""
+    category_id: Optional[int] = None
+    can_see_revenue: bool = False
+    # không chỉ định date_from/date_to -> mốc trôi theo now (kỳ còn mở)
+    open_start: bool = True
+    open_ended: bool = True
+
+    @classmethod
+    def from_request(cls, request) -> "ReportParams":
+        return cls.from_query(
+            request.GET,
+            # Quyền xem doanh thu
+            can_see_revenue=bool(getattr(request.user, "is_staff", False) or getattr(request.user, "is_superuser", False)),
+        )
+
+    @classmethod
+    def from_query(cls, query, can_see_revenue: bool = False) -> "ReportParams":
+        """Từ QueryDict/dict tham số (request.GET, hoặc ExportJob.params khi chạy nền)."""
+        df = query.get("date_from")
+        dt = query.get("date_to")
+        category_id = query.get("category_id")
+        group_by = (query.get("group_by") or "day").lower()
+
+        now = timezone.now()
+        date_to = timezone.datetime.fromisoformat(dt) if dt else now
+        date_from = timezone.datetime.fromisoformat(df) if df else (now - timezone.timedelta(days=30))
+        if timezone.is_naive(date_from): date_from = timezone.make_aware(date_from)
+        if timezone.is_naive(date_to):   date_to   = timezone.make_aware(date_to)
+
+        return cls(
+            date_from=date_from,
+            date_to=date_to,
+            group_by=group_by if group_by in GROUP_FUNCS else "day",
+            supplier=(query.get("supplier") or "").strip(),
+            category_id=int(category_id) if category_id and str(category_id).isdigit() else None,
+            can_see_revenue=can_see_revenue,
+            open_start=not df,
+            open_ended=not dt,
+        )
+
+    @property
+    def group(self):
+        return GROUP_FUNCS[self.group_by]
+
+    @property
+    def closed(self) -> bool:
+        """Kỳ đã đóng: có date_to và date_to không vượt quá đầu ngày hôm nay."""
+        today = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+        return not self.open_ended and self.date_to <= today
+
+    def cache_key(self, dataset: str) -> str:
+        return report_cache_key(
+            dataset=dataset,
+            # mốc mặc định trôi theo now -> khóa theo "mặc định" thay vì giá trị
+            date_from="" if self.open_start else self.date_from.isoformat(),
+            date_to="" if self.open_ended else self.date_to.isoformat(),
+            group_by=self.group_by,
+            supplier=self.supplier.casefold(),
+            category_id=self.category_id,
+            can_see_revenue=self.can_see_revenue,
+        )
+
+
+@dataclass(frozen=True)
+class Dataset:
+    name: str
+    payload_key: str
+    compute: Callable[[ReportParams], List[dict]]
+    columns: Sequence[str]
+    money_columns: Sequence[str] = ()
+    streaming: bool = False
+
+    def headers(self, params: ReportParams) -> List[str]:
+        """Cột xuất file; ẩn cột doanh thu nếu không có quyền."""
+        return [c for c in self.columns if params.can_see_revenue or c not in self.money_columns]
+
+
+DATASETS: Dict[str, Dataset] = {}
+# tên cũ của /manage/reports/export/?kind=...
+ALIASES = {
+    "supplier": "orders_by_supplier",
+    "category": "orders_by_category",
+    "consult_status": "consult_by_status",
+    "consult_staff": "consult_by_staff",
+    "consult_period": "consult_by_period",
+    "cohort": "cohorts",
+}
+
+
+def dataset(name: str, payload_key: str, columns: Sequence[str], money_columns: Sequence[str] = (),
+            streaming: bool = False):
+    def deco(func: Callable[[ReportParams], Iterable[dict]]):
+        DATASETS[name] = Dataset(name, payload_key, func, tuple(columns), tuple(money_columns), streaming)
+        return func
+    return deco
+
+
+def resolve(kind: str) -> Optional[Dataset]:
+    kind = (kind or "").lower().strip()
+    return DATASETS.get(ALIASES.get(kind, kind))
+
+
+def get_dataset(name: str, params: ReportParams) -> List[dict]:
+    ds = resolve(name)
+    if ds is None or ds.streaming:
+        raise KeyError(name)
+    return get_or_compute(params.cache_key(ds.name), report_ttl(params.closed), lambda: ds.compute(params))
+
+
+def iter_rows(ds: Dataset, params: ReportParams) -> Iterable[dict]:
+    """Dòng để xuất file: dataset streaming đọc thẳng từ DB, còn lại lấy từ cache."""
+    if ds.streaming:
+        return ds.compute(params)
+    return get_dataset(ds.name, params)
+
+
+def build_payload(params: ReportParams) -> dict:
+    """JSON cho dashboard: mọi dataset + khách duy nhất + quyền doanh thu."""
+    from .rollups import unique_visitors
+
+    payload = {
+        ds.payload_key: get_dataset(name, params) for name, ds in DATASETS.items() if not ds.streaming
+    }
+    # khách duy nhất cả khoảng: gộp sketch HyperLogLog theo ngày (~1.6% sai số)
+    payload["unique_visitors"] = get_or_compute(
+        params.cache_key("unique_visitors"), report_ttl(params.closed),
+        lambda: unique_visitors(params.date_from, params.date_to),
+    )
+    payload["can_see_revenue"] = params.can_see_revenue
+    now = int(time.time())
+    payload["delta"] = False
+    payload["version"] = _version(params, base=now, now=now, digests=_digests(params, payload, now))
+    return payload
+
+
+# ---------------------------------------------------------------- delta
+def _digest(rows) -> str:
+    raw = json.dumps(rows, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
+
+def _is_series(ds: Dataset) -> bool:
+    return bool(ds.columns) and ds.columns[0] == "period"
+
+
+def _tail_day(params: ReportParams, ts: int) -> date:
+    """Ngày đầu của kỳ chứa thời điểm ts — các kỳ trước đó coi như không đổi."""
+    local = timezone.localtime(datetime.fromtimestamp(ts, tz=dt_timezone.utc))
+    return period_start(local.date(), params.group_by)
+
+
+def _row_day(period: str) -> date:
+    return date.fromisoformat(str(period)[:10])
+
+
+def _series_digests(rows: List[dict], from_day: date) -> Dict[str, str]:
+    return {str(r["period"]): _digest(r) for r in rows if _row_day(r["period"]) >= from_day}
+
+
+def _digests(params: ReportParams, payload: dict, now: int) -> dict:
+    """Dấu vân tay để lần sau so sánh: cả dataset tổng, hoặc từng kỳ (chỉ kỳ đang mở) với dataset theo kỳ."""
+    out = {}
+    for name, ds in DATASETS.items():
+        if ds.streaming or ds.payload_key not in payload:
+            continue
+        rows = payload[ds.payload_key]
+        if _is_series(ds):
+            out[name] = _series_digests(rows, _tail_day(params, now))
+        else:
+            out[name] = _digest(rows)
+    return out
+
+
+def _version(params: ReportParams, base: int, now: int, digests: dict) -> str:
+    return signing.dumps(
+        {"k": params.cache_key("delta"), "b": base, "t": now, "h": digests}, salt=_DELTA_SALT, compress=True,
+    )
+
+
+def build_delta(params: ReportParams, since: str) -> Optional[dict]:
+    """
+    Payload chỉ gồm phần đổi kể từ version `since`; None nếu token hỏng, khác bộ lọc
+    hoặc đã quá REPORT_DELTA_FULL_SECONDS (khi đó gọi build_payload).
+
+    - dataset theo kỳ: chỉ tính lại [đầu kỳ chứa `since`, date_to); trả các kỳ có
+      số liệu khác lần trước, kỳ biến mất nằm trong "removed".
+    - dataset tổng (NCC, danh mục, trạng thái...): lấy từ cache, chỉ gửi nếu đổi.
+    """
+    from .rollups import unique_visitors
+
+    try:
+        token = signing.loads(since, salt=_DELTA_SALT)
+    except signing.BadSignature:
+        return None
+    now = int(time.time())
+    if token.get("k") != params.cache_key("delta") or now - int(token.get("b", 0)) > REPORT_DELTA_FULL_SECONDS:
+        return None
+
+    old = token.get("h") or {}
+    tail_from = facts.day_start(_tail_day(params, int(token["t"])))
+    tail = replace(params, date_from=tail_from, open_start=False) if tail_from > params.date_from else params
+    keep_from = _tail_day(params, now)
+
+    payload: dict = {"delta": True, "removed": {}}
+    digests: dict = {}
+    for name, ds in DATASETS.items():
+        if ds.streaming:
+            continue
+        if _is_series(ds):
+            rows = get_dataset(name, tail)
+            prev = old.get(name) or {}
+            cur = {str(r["period"]): _digest(r) for r in rows}
+            changed = [r for r in rows if prev.get(str(r["period"])) != cur[str(r["period"])]]
+            gone = [p for p in prev if p not in cur]
+            if changed:
+                payload[ds.payload_key] = changed
+            if gone:
+                payload["removed"][ds.payload_key] = gone
+            digests[name] = _series_digests(rows, keep_from)
+        else:
+            rows = get_dataset(name, params)
+            digests[name] = _digest(rows)
+            if old.get(name) != digests[name]:
+                payload[ds.payload_key] = rows
+
+    payload["unique_visitors"] = get_or_compute(
+        params.cache_key("unique_visitors"), report_ttl(params.closed),
+        lambda: unique_visitors(params.date_from, params.date_to),
+    )
+    payload["can_see_revenue"] = params.can_see_revenue
+    payload["version"] = _version(params, base=int(token["b"]), now=now, digests=digests)
+    return payload
+
+
+def _period(p) -> str:
+    return p.isoformat() if hasattr(p, "isoformat") else str(p)
+
+
+def _period_day(p):
+    """Ngày (giờ địa phương) của giá trị Trunc* — TruncWeek/TruncMonth trả datetime."""
+    return timezone.localtime(p).date() if isinstance(p, datetime) else p
+
+
+# ====================== datasets ======================
+@dataset("users", "users_by_period", ["period", "count"])
+def users_by_period(params: ReportParams) -> List[dict]:
+    qs = (
+        User.objects.filter(date_joined__gte=params.date_from, date_joined__lt=params.date_to)
+        .annotate(p=params.group("date_joined"))
+        .values("p")
+        .annotate(count=Count("id"))
+        .order_by("p")
+    )
+    return [{"period": _period(x["p"]), "count": x["count"]} for x in qs]
+
+
+@dataset("visits", "visits_by_period", ["period", "views", "sessions", "bot_views"])
+def visits_by_period(params: ReportParams) -> List[dict]:
+    # ngày trọn vẹn đọc từ PageViewDaily, chỉ phần hôm nay/lẻ mới đọc PageView thô
+    from .rollups import visits_series
+    return visits_series(params.date_from, params.date_to, params.group_by)
+
+
+def sales_lines(params: ReportParams):
+    """SalesLine (shop + cart, bỏ đơn hủy) trong kỳ + bộ lọc NCC/danh mục."""
+    lines = SalesLine.objects.filter(
+        created_at__gte=params.date_from, created_at__lt=params.date_to
+    ).exclude(state=SalesLine.State.CANCELLED)
+    if params.supplier:
+        lines = lines.filter(supplier__iexact=params.supplier)
+    if params.category_id:
+        lines = lines.filter(category_id=params.category_id)
+    return lines
+
+
+def _orders_by(params: ReportParams, field: str, label: str, fallback: str) -> List[dict]:
+    """
+    Nguồn duy nhất theo cấu hình:
+    - mặc định: OrderDailyFact cho ngày trọn vẹn + SalesLine cho phần lẻ đầu/cuối;
+    - REPORT_CUBE_ENABLED=True và có numpy: cube trong bộ nhớ (cùng số liệu, từ SalesLine).
+    """
+    if cube.available():
+        # mask + bincount trên mảng trong bộ nhớ, không GROUP BY mỗi lần đổi bộ lọc
+        return cube.orders_by(label, params, fallback)
+
+    # ngày trọn vẹn đọc OrderDailyFact (<= số ngày x số sản phẩm dòng), phần lẻ đầu/cuối đọc SalesLine
+    first_day, end_day = facts.whole_days(params.date_from, params.date_to)
+    fq = OrderDailyFact.objects.filter(day__gte=first_day, day__lt=end_day).exclude(status__in=sales.CANCELLED_STATUSES)
+    if params.supplier:
+        fq = fq.filter(supplier__iexact=params.supplier)
+    if params.category_id:
+        fq = fq.filter(category_id=params.category_id)
+    parts = list(
+        fq.values(field).annotate(orders=Sum("lines"), quantity=Sum("quantity"), revenue=Sum("revenue")).order_by()
+    )
+    for lo, hi in facts.edge_ranges(params.date_from, params.date_to, first_day, end_day):
+        parts += list(
+            sales_lines(replace(params, date_from=lo, date_to=hi)).values(field)
+            .annotate(orders=Count("id"), quantity=Sum("quantity"), revenue=Sum("line_total")).order_by()
+        )
+
+    merged: Dict[str, list] = {}
+    for r in parts:
+        acc = merged.setdefault(r[field] or fallback, [0, 0, 0])
+        acc[0] += r["orders"] or 0
+        acc[1] += r["quantity"] or 0
+        acc[2] += r["revenue"] or 0
+    return [
+        {
+            label: name,
+            "orders": orders,
+            "quantity": int(quantity),
+            "revenue": float(revenue) if params.can_see_revenue else None,
+        }
+        for name, (orders, quantity, revenue) in sorted(merged.items())
+    ]
+
+
+@dataset("orders_by_supplier", "orders_by_supplier", ["supplier", "orders", "quantity", "revenue"], ["revenue"])
+def orders_by_supplier(params: ReportParams) -> List[dict]:
+    return _orders_by(params, "supplier", "supplier", "(khác/không rõ)")
+
+
+@dataset("orders_by_category", "orders_by_category", ["category", "orders", "quantity", "revenue"], ["revenue"])
+def orders_by_category(params: ReportParams) -> List[dict]:
+    return _orders_by(params, "category__name", "category", "(khác)")
+
+
+def _consults(params: ReportParams):
+    return ConsultationRequest.objects.filter(created_at__gte=params.date_from, created_at__lt=params.date_to)
+
+
+@dataset("consult_by_status", "consult_by_status", ["status", "count"])
+def consult_by_status(params: ReportParams) -> List[dict]:
+    qs = _consults(params).values("status").annotate(count=Count("id")).order_by("status")
+    return [{"status": c["status"], "count": c["count"]} for c in qs]
+
+
+@dataset("consult_by_staff", "consult_by_staff",
+         ["staff", "count", "p50_seconds", "p90_seconds", "p99_seconds"])
+def consult_by_staff(params: ReportParams) -> List[dict]:
+    qs = (
+        _consults(params).values("handled_by_id", staff=F("handled_by__username"))
+        .annotate(count=Count("id")).order_by("staff")
+    )
+    pct = consult_stats.by_staff(params.date_from, params.date_to)
+    return [
+        {
+            "staff": r["staff"] or "(chưa phân công)",
+            "count": r["count"],
+            **pct.get(r["handled_by_id"], consult_stats.percentiles(None)),
+        }
+        for r in qs
+    ]
+
+
+@dataset("consult_by_period", "consult_by_period",
+         ["period", "total", "done", "avg_seconds", "p50_seconds", "p90_seconds", "p99_seconds"])
+def consult_by_period(params: ReportParams) -> List[dict]:
+    # TB thời gian xử lý (handled_at - created_at); chỉ tính bản ghi có handled_at
+    handle_delta = ExpressionWrapper(F("handled_at") - F("created_at"), output_field=DurationField())
+    qs = (
+        _consults(params).annotate(p=params.group("created_at"))
+        .values("p")
+        .annotate(
+            total=Count("id"),
+            done=Count("id", filter=Q(status="done")),
+            avg_secs=Avg(handle_delta),
+        )
+        .order_by("p")
+    )
+    # p50/p90/p99 từ sketch theo ngày (shop/consult_stats.py), khóa = ngày đầu kỳ
+    pct = consult_stats.by_period(params.date_from, params.date_to, params.group_by)
+    return [
+        {
+            "period": _period(x["p"]),
+            "total": x["total"],
+            "done": x["done"],
+            "avg_seconds": x["avg_secs"].total_seconds() if x["avg_secs"] else None,
+            **pct.get(_period_day(x["p"]), consult_stats.percentiles(None)),
+        }
+        for x in qs
+    ]
+
+
+@dataset(
+    "order_lines", "order_lines",
+    ["source", "order_id", "created_at", "status", "user_id", "username", "product_id", "product_name",
+     "supplier", "category", "plan_name", "price", "quantity", "line_total"],
+    ["price", "line_total"],
+    streaming=True,
+)
+def order_lines(params: ReportParams) -> Iterable[dict]:
+    """Mọi dòng bán hàng (shop + cart, kể cả đơn hủy) trong kỳ từ SalesLine — stream, không cache."""
+    qs = SalesLine.objects.filter(created_at__gte=params.date_from, created_at__lt=params.date_to)
+    if params.supplier:
+        qs = qs.filter(supplier__iexact=params.supplier)
+    if params.category_id:
+        qs = qs.filter(category_id=params.category_id)
+    qs = qs.order_by("created_at", "id").values(
+        "source", "order_id", "created_at", "status", "user_id", "product_id", "supplier",
+        "price", "quantity", "line_total",
+        username=F("user__username"),
+        product_name=F("product__name"),
+        category_name=F("category__name"),  # "category" trùng tên FK
+        plan_name=F("plan__name"),
+    )
+    for r in qs.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        r["created_at"] = timezone.localtime(r["created_at"]).strftime("%Y-%m-%d %H:%M:%S")
+        r["category"] = r.pop("category_name")
+        yield r
+
+
+# ---------------------------------------------------------------- cohort
+def _month_index(dt) -> int:
+    local = timezone.localtime(dt)
+    return local.year * 12 + local.month - 1
+
+
+def _cohort_matrix(cohorts: List[int], offsets: List[int], n_rows: int, width: int) -> List[List[int]]:
+    """Đếm (cohort, offset) -> ma trận n_rows x (width + 1); offset -1 = chưa mua (cột cuối)."""
+    if np is not None:
+        c = np.asarray(cohorts, dtype=np.int64)
+        o = np.asarray(offsets, dtype=np.int64)
+        col = np.where(o < 0, width, np.minimum(o, width - 1))
+        flat = np.bincount(c * (width + 1) + col, minlength=n_rows * (width + 1))
+        return flat.reshape(n_rows, width + 1).tolist()
+    matrix = [[0] * (width + 1) for _ in range(n_rows)]
+    for ci, off in zip(cohorts, offsets):
+        matrix[ci][width if off < 0 else min(off, width - 1)] += 1
+    return matrix
+
+
+def _cohort_rows(date_from: datetime, date_to: datetime) -> List[dict]:
+    from cart.models import Order as CartOrder  # import chậm: cart phụ thuộc shop
+
+    users = User.objects.filter(date_joined__gte=date_from, date_joined__lt=date_to)
+    joined = list(users.values_list("id", "date_joined"))
+    if not joined:
+        return []
+    # đơn xác nhận đầu tiên của từng user (1 GROUP BY, không lặp theo user)
+    first = dict(
+        CartOrder.objects.filter(status=CartOrder.Status.CONFIRMED, user__in=users.values("id"))
+        .values("user_id")
+        .annotate(first=Min(Coalesce("confirmed_at", "created_at")))
+        .values_list("user_id", "first")
+    )
+
+    start = min(_month_index(d) for _, d in joined)
+    n_rows = max(_month_index(d) for _, d in joined) - start + 1
+    cohorts, offsets = [], []
+    for uid, d in joined:
+        m = _month_index(d)
+        cohorts.append(m - start)
+        f = first.get(uid)
+        offsets.append(max(0, _month_index(f) - m) if f else -1)
+
+    # m{COHORT_MONTHS} dồn mọi offset >= COHORT_MONTHS
+    width = COHORT_MONTHS + 1
+    matrix = _cohort_matrix(cohorts, offsets, n_rows, width)
+    rows = []
+    for i, counts in enumerate(matrix):
+        size = sum(counts)
+        if not size:
+            continue
+        y, mo = divmod(start + i, 12)
+        row = {"cohort": f"{y:04d}-{mo + 1:02d}", "users": size, "converted": size - counts[-1]}
+        row.update({f"m{k}": counts[k] for k in range(COHORT_MONTHS)})
+        row[f"m{COHORT_MONTHS}_plus"] = counts[COHORT_MONTHS]
+        rows.append(row)
+    return rows
+
+
+@dataset(
+    "cohorts", "cohorts",
+    ["cohort", "users", "converted", *[f"m{k}" for k in range(COHORT_MONTHS)], f"m{COHORT_MONTHS}_plus"],
+)
+def cohorts(params: ReportParams) -> List[dict]:
+    """User đăng ký theo tháng x số tháng tới đơn cart xác nhận đầu tiên (cache như mọi dataset: get_dataset)."""
+    return _cohort_rows(params.date_from, params.date_to)
@@ -0,0 +1,342 @@
+# shop/rollups.py
+"""
+Tổng hợp PageView theo ngày (PageViewDaily) + đọc chuỗi "visits" cho báo cáo.
+
+- rollup_pageviews(): job tăng dần, chỉ đọc PageView có id > watermark
+  (RollupWatermark "pageview_daily"), gom theo (ngày, path) bằng 1 câu GROUP BY
+  mỗi lô id rồi cộng dồn vào PageViewDaily.
+  Watermark chỉ tiến tới MAX(id) đã quan sát từ ít nhất
+  PAGEVIEW_ROLLUP_LAG_SECONDS trước: trên DB commit không theo thứ tự id
+  (PostgreSQL/MySQL nhiều writer), dòng id nhỏ commit trễ vẫn kịp hiện ra trước
+  khi watermark vượt qua nó (giả định: transaction ghi PageView ngắn hơn độ trễ
+  này). Nếu không, dòng đó không bao giờ được gom và archive_pageviews sẽ xóa nó. Cộng dồn sessions là chính xác vì
+  mỗi session chỉ có tối đa 1 PageView / ngày (xem shop/analytics.py).
+- Cùng lúc đó cập nhật PageViewSketch (HyperLogLog theo ngày, toàn site và
+  theo sản phẩm) để đếm khách duy nhất cho khoảng bất kỳ bằng cách gộp sketch.
+- visits_series()/unique_visitors() chỉ đọc rollup (kể cả hôm nay, tới
+  watermark) + 1 câu tổng hợp có giới hạn cho các PageView id > watermark
+  (phần job chưa kịp gom). Phần lẻ đầu/cuối khoảng (không trọn ngày) mới đọc
+  PageView thô (hoặc file lưu trữ nếu đã được archive_pageviews chuyển đi).
+  Request KHÔNG bao giờ tự chạy rollup.
+
+Chạy định kỳ (cron, vài phút 1 lần — phần chưa gom càng nhỏ báo cáo càng nhẹ):
+    python manage.py rollup_pageviews
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, CharField, Count, Max, Q, Sum, Value, When
+from django.db.models.functions import Concat, TruncDate
+from django.utils import timezone
+
+from . import archive
+from .facts import day_start, edge_ranges, whole_days
+from .hll import HyperLogLog
+from .models import PageView, PageViewDaily, PageViewSketch, RollupWatermark
+
+PAGEVIEW_ROLLUP_BATCH = getattr(settings, "PAGEVIEW_ROLLUP_BATCH", 50_000)
+PAGEVIEW_ROLLUP_LAG_SECONDS = getattr(settings, "PAGEVIEW_ROLLUP_LAG_SECONDS", 60)
+
+WATERMARK_NAME = "pageview_daily"
+
+
+# PageView của người thật (không phải bot/crawler)
+HUMAN = Q(is_bot=False)
+
+
+def session_expr():
+    """Khóa đếm session: session_key; dòng cũ (trước khi có session_key) dùng IP|UA."""
+    return Case(
+        When(session_key="", then=Concat("ip", Value("|"), "user_agent", output_field=CharField())),
+        default="session_key",
+        output_field=CharField(),
+    )
+
+
+@dataclass
+class RollupResult:
+    rows: int = 0        # số PageView đã xử lý
+    buckets: int = 0     # số dòng PageViewDaily được tạo/cập nhật
+    last_id: int = 0
+
+
+def rollup_pageviews(*, batch_size: int = PAGEVIEW_ROLLUP_BATCH,
+                     log: Optional[Callable[[str], None]] = None) -> RollupResult:
+    log = log or (lambda msg: None)
+    batch_size = max(1, int(batch_size))
+    result = RollupResult()
+    RollupWatermark.objects.get_or_create(name=WATERMARK_NAME)
+    with transaction.atomic():
+        wm = RollupWatermark.objects.select_for_update().get(name=WATERMARK_NAME)
+        max_id = _safe_max_id(wm)
+        wm.save(update_fields=["horizon_id", "horizon_at", "updated_at"])
+
+    while True:
+        with transaction.atomic():
+            wm = RollupWatermark.objects.select_for_update().get(name=WATERMARK_NAME)
+            result.last_id = lo = wm.last_id
+            if lo >= max_id:
+                wm.save(update_fields=["updated_at"])  # đánh dấu đã chạy
+                break
+            hi = min(lo + batch_size, max_id)
+
+            agg = (
+                PageView.objects.filter(id__gt=lo, id__lte=hi)
+                .annotate(d=TruncDate("created_at"))
+                .values("d", "path")
+                .annotate(views=Count("id", filter=HUMAN), bot_views=Count("id", filter=~HUMAN),
+                          sessions=Count(session_expr(), distinct=True, filter=HUMAN),
+                          product_id=Max("product_id"))
+            )
+            agg = list(agg)
+            result.buckets += _merge(agg)
+            result.rows += sum(r["views"] + r["bot_views"] for r in agg)
+            _merge_sketches(_sketch_rows(PageView.objects.filter(id__gt=lo, id__lte=hi)))
+
+            wm.last_id = hi
+            wm.save(update_fields=["last_id", "updated_at"])
+            result.last_id = hi
+        log(f"rolled up to id {hi} ({result.rows} rows)")
+    return result
+
+
+def _safe_max_id(wm: RollupWatermark) -> int:
+    """
+    id lớn nhất được phép gom lần này: MAX(id) đã quan sát cách đây ít nhất
+    PAGEVIEW_ROLLUP_LAG_SECONDS (mọi transaction có id nhỏ hơn đã commit xong).
+    Cập nhật horizon_id/horizon_at trên wm (caller lưu).
+    """
+    current = PageView.objects.aggregate(m=Max("id"))["m"] or 0
+    if PAGEVIEW_ROLLUP_LAG_SECONDS <= 0:
+        return current
+    now = timezone.now()
+    safe = wm.last_id
+    if wm.horizon_at is None or now - wm.horizon_at >= timedelta(seconds=PAGEVIEW_ROLLUP_LAG_SECONDS):
+        if wm.horizon_at is not None:
+            safe = max(safe, wm.horizon_id)
+        # mốc mới chỉ được dùng ở lần chạy sau, khi đã "chín"
+        wm.horizon_id, wm.horizon_at = current, now
+    return safe
+
+
+def _merge(agg: List[dict]) -> int:
+    """Cộng dồn kết quả GROUP BY của 1 lô vào PageViewDaily."""
+    if not agg:
+        return 0
+    days = {r["d"] for r in agg}
+    existing: Dict[Tuple[date, str], PageViewDaily] = {
+        (x.date, x.path): x for x in PageViewDaily.objects.filter(date__in=days)
+    }
+    to_create, to_update = [], []
+    for r in agg:
+        obj = existing.get((r["d"], r["path"]))
+        if obj is None:
+            to_create.append(PageViewDaily(date=r["d"], path=r["path"], product_id=r["product_id"],
+                                           views=r["views"], sessions=r["sessions"], bot_views=r["bot_views"]))
+        else:
+            obj.views += r["views"]
+            obj.bot_views += r["bot_views"]
+            obj.sessions += r["sessions"]
+            obj.product_id = obj.product_id or r["product_id"]
+            to_update.append(obj)
+    if to_create:
+        PageViewDaily.objects.bulk_create(to_create, batch_size=500)
+    if to_update:
+        PageViewDaily.objects.bulk_update(to_update, ["views", "sessions", "bot_views", "product"], batch_size=500)
+    return len(to_create) + len(to_update)
+
+
+def _sketch_rows(qs) -> Dict[Tuple[date, Optional[int]], HyperLogLog]:
+    """HLL theo (ngày, product_id) và (ngày, None) cho các PageView (không phải bot) trong qs."""
+    sketches: Dict[Tuple[date, Optional[int]], HyperLogLog] = {}
+    rows = qs.filter(HUMAN).annotate(d=TruncDate("created_at"), k=session_expr()).values_list("d", "product_id", "k")
+    for d, pid, key in rows.iterator(chunk_size=5000):
+        _add_key(sketches, d, pid, key)
+    return sketches
+
+
+def _add_key(sketches: Dict[Tuple[date, Optional[int]], HyperLogLog], d: date, pid: Optional[int], key: str) -> None:
+    sketches.setdefault((d, None), HyperLogLog()).add(key)
+    if pid:
+        sketches.setdefault((d, pid), HyperLogLog()).add(key)
+
+
+def _merge_sketches(sketches: Dict[Tuple[date, Optional[int]], HyperLogLog]) -> None:
+    """Gộp (max từng thanh ghi) vào PageViewSketch đã lưu."""
+    if not sketches:
+        return
+    days = {d for d, _ in sketches}
+    existing = {(x.date, x.product_id): x for x in PageViewSketch.objects.filter(date__in=days)}
+    to_create, to_update = [], []
+    for (d, pid), hll in sketches.items():
+        obj = existing.get((d, pid))
+        if obj is None:
+            to_create.append(PageViewSketch(date=d, product_id=pid, data=hll.to_bytes()))
+        else:
+            obj.data = hll.merge(HyperLogLog.from_bytes(obj.data)).to_bytes()
+            to_update.append(obj)
+    if to_create:
+        PageViewSketch.objects.bulk_create(to_create, batch_size=500)
+    if to_update:
+        PageViewSketch.objects.bulk_update(to_update, ["data"], batch_size=500)
+
+
+def rebuild_sketches(*, batch_size: int = PAGEVIEW_ROLLUP_BATCH,
+                     log: Optional[Callable[[str], None]] = None) -> int:
+    """
+    Dựng lại toàn bộ PageViewSketch từ PageView (tới watermark) + file lưu trữ.
+    Dùng 1 lần sau khi nâng cấp, hoặc khi nghi sketch sai.
+    """
+    log = log or (lambda msg: None)
+    rollup_pageviews(batch_size=batch_size)
+    last_id = RollupWatermark.objects.get(name=WATERMARK_NAME).last_id
+    PageViewSketch.objects.all().delete()
+
+    for day in archive.partition_days():
+        sketches: Dict[Tuple[date, Optional[int]], HyperLogLog] = {}
+        for row in archive.iter_partition(day):
+            if row.get("is_bot"):
+                continue
+            _add_key(sketches, day, row.get("product_id"), archive.visitor_key(row))
+        _merge_sketches(sketches)
+        log(f"archive {day}")
+
+    lo = 0
+    while lo < last_id:
+        hi = min(lo + batch_size, last_id)
+        _merge_sketches(_sketch_rows(PageView.objects.filter(id__gt=lo, id__lte=hi)))
+        log(f"pageview id {hi}")
+        lo = hi
+    return PageViewSketch.objects.count()
+
+
+# ---------------------- đọc cho báo cáo ----------------------
+def period_start(d: date, group_by: str) -> date:
+    if group_by == "week":
+        return d - timedelta(days=d.weekday())
+    if group_by == "month":
+        return d.replace(day=1)
+    return d
+
+
+def _covered_to(date_to: datetime) -> datetime:
+    """date_to >= hiện tại (kỳ đang mở) -> coi như hết hôm nay: chưa có dữ liệu tương lai."""
+    if date_to >= timezone.now():
+        return max(date_to, day_start(timezone.localdate() + timedelta(days=1)))
+    return date_to
+
+
+def _rolled_up_to() -> int:
+    return RollupWatermark.objects.filter(name=WATERMARK_NAME).values_list("last_id", flat=True).first() or 0
+
+
+def _pending(first_day: date, end_day: date, product_id: Optional[int] = None):
+    """PageView job chưa gom (id > watermark) trong các ngày trọn vẹn: quét theo khóa chính, nhỏ."""
+    qs = PageView.objects.filter(id__gt=_rolled_up_to(), created_at__gte=day_start(first_day),
+                                 created_at__lt=day_start(end_day))
+    return qs.filter(product_id=product_id) if product_id is not None else qs
+
+
+def _pending_keys(first_day: date, end_day: date, product_id: Optional[int] = None) -> Dict[date, set]:
+    out: Dict[date, set] = {}
+    rows = (
+        _pending(first_day, end_day, product_id).filter(HUMAN)
+        .annotate(d=TruncDate("created_at"), k=session_expr()).values_list("d", "k").distinct()
+    )
+    for d, key in rows.iterator():
+        out.setdefault(d, set()).add(key)
+    return out
+
+
+def _raw_keys(lo: datetime, hi: datetime, product_id: Optional[int] = None) -> Dict[date, List]:
+    """{ngày: [views, {khóa khách}, bot_views]} từ PageView thô (+ file lưu trữ) trong [lo, hi)."""
+    out: Dict[date, List] = {}
+    for row in archive.iter_rows(lo, hi, product_id):
+        b = out.setdefault(timezone.localtime(row["created_at"]).date(), [0, set(), 0])
+        if row.get("is_bot"):
+            b[2] += 1
+        else:
+            b[0] += 1
+            b[1].add(archive.visitor_key(row))
+    return out
+
+
+def visits_series(date_from: datetime, date_to: datetime, group_by: str = "day") -> List[dict]:
+    """
+    [{"period": "YYYY-MM-DD", "views", "sessions", "bot_views"}] cho [date_from, date_to).
+    views/sessions chỉ tính người thật; lượt của bot/crawler tách riêng ở bot_views.
+    - day: sessions đếm chính xác (tổng rollup theo ngày).
+    - week/month: sessions = số khách duy nhất trong kỳ, ước lượng bằng cách
+      gộp sketch HyperLogLog của từng ngày (sai số ~1.6%).
+    """
+    date_to = _covered_to(date_to)
+    exact = group_by not in ("week", "month")
+    first_day, end_day = whole_days(date_from, date_to)
+    buckets: Dict[date, list] = {}
+
+    def bucket(d: date) -> list:
+        return buckets.setdefault(period_start(d, group_by), [0, 0, HyperLogLog(), 0])
+
+    if first_day < end_day:
+        for r in (
+            PageViewDaily.objects.filter(date__gte=first_day, date__lt=end_day)
+            .values("date").annotate(views=Sum("views"), sessions=Sum("sessions"), bots=Sum("bot_views"))
+        ):
+            b = bucket(r["date"])
+            b[0] += r["views"] or 0
+            b[1] += r["sessions"] or 0
+            b[3] += r["bots"] or 0
+        if not exact:
+            for d, data in PageViewSketch.objects.filter(
+                date__gte=first_day, date__lt=end_day, product__isnull=True
+            ).values_list("date", "data"):
+                bucket(d)[2].merge(HyperLogLog.from_bytes(data))
+            for d, keys in _pending_keys(first_day, end_day).items():
+                bucket(d)[2].update(keys)
+        for r in (
+            _pending(first_day, end_day).annotate(d=TruncDate("created_at")).values("d")
+            .annotate(views=Count("id", filter=HUMAN), bots=Count("id", filter=~HUMAN),
+                      sessions=Count(session_expr(), distinct=True, filter=HUMAN))
+            .order_by()
+        ):
+            b = bucket(r["d"])
+            b[0] += r["views"]
+            b[1] += r["sessions"]  # session mới: mỗi session tối đa 1 lượt / ngày
+            b[3] += r["bots"]
+
+    for lo, hi in edge_ranges(date_from, date_to, first_day, end_day):
+        for d, (views, keys, bots) in _raw_keys(lo, hi).items():
+            b = bucket(d)
+            b[0] += views
+            b[1] += len(keys)
+            b[3] += bots
+            if not exact:
+                b[2].update(keys)
+
+    return [
+        {"period": p.isoformat(), "views": v, "sessions": s if exact else hll.count(), "bot_views": bots}
+        for p, (v, s, hll, bots) in sorted(buckets.items())
+    ]
+
+
+def unique_visitors(date_from: datetime, date_to: datetime, product_id: Optional[int] = None) -> int:
+    """Ước lượng số khách duy nhất trong [date_from, date_to) (toàn site hoặc 1 sản phẩm)."""
+    date_to = _covered_to(date_to)
+    first_day, end_day = whole_days(date_from, date_to)
+    hll = HyperLogLog()
+    if first_day < end_day:
+        sketches = PageViewSketch.objects.filter(date__gte=first_day, date__lt=end_day)
+        sketches = sketches.filter(product_id=product_id) if product_id else sketches.filter(product__isnull=True)
+        for data in sketches.values_list("data", flat=True):
+            hll.merge(HyperLogLog.from_bytes(data))
+        for keys in _pending_keys(first_day, end_day, product_id or None).values():
+            hll.update(keys)
+    for lo, hi in edge_ranges(date_from, date_to, first_day, end_day):
+        for _, keys, _ in _raw_keys(lo, hi, product_id).values():
+            hll.update(keys)
+    return hll.count()
@@ -0,0 +1,209 @@
+# shop/sales.py
+"""
+Read model SalesLine: mọi dòng bán hàng của shop.OrderItem (đơn staff tạo) và
+cart.OrderItem (checkout của khách) trong 1 bảng hẹp, có index, đã sao chép
+NCC/danh mục -> báo cáo không phải UNION 2 nguồn hay join Product/Category.
+
+Đồng bộ theo đơn (sync_orders) khi:
+- đơn được lưu (tạo / xác nhận / hủy / đổi trạng thái) -> post_save Order;
+- dòng hàng được lưu/xóa -> post_save/post_delete OrderItem;
+- dòng hàng tạo bằng bulk_create -> signal order_lines_created (shop/signals.py),
+  nơi gọi bulk_create phải tự gửi.
+Lịch sử: manage.py backfill_sales_lines; đối soát: manage.py check_sales_lines [--fix].
+"""
+from __future__ import annotations
+
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import cube
+from .facts import SOURCES, source_models
+from .models import Product, SalesLine
+from .signals import order_lines_created
+
+State = SalesLine.State
+
+# trạng thái gốc -> trạng thái chuẩn hóa (còn lại: OPEN)
+STATE_OF = {
+    "shop": {"paid": State.CONFIRMED, "cancelled": State.CANCELLED, "refunded": State.CANCELLED},
+    "cart": {"CONFIRMED": State.CONFIRMED, "CANCELLED": State.CANCELLED},
+}
+CANCELLED_STATUSES = sorted({st for m in STATE_OF.values() for st, state in m.items() if state == State.CANCELLED})
+
+SALES_BACKFILL_BATCH = 500
+
+_FIELDS = ("order_id", "created_at", "status", "state", "user_id", "product_id", "plan_id",
+           "category_id", "supplier", "quantity", "price", "line_total")
+# đổi các cột này (hoặc vào/ra trạng thái hủy) -> cube báo cáo phải nạp lại
+_CUBE_FIELDS = ("created_at", "product_id", "category_id", "supplier", "quantity", "line_total")
+
+
+def state_of(source: str, status: str) -> str:
+    return STATE_OF[source].get(status, State.OPEN)
+
+
+def _lines_for(source: str, order_ids: Iterable[int]) -> List[SalesLine]:
+    _, Item = source_models(source)
+    rows = Item.objects.filter(order_id__in=list(order_ids)).values_list(
+        "id", "order_id", "order__created_at", "order__status", "order__user_id",
+        "product_id", "plan_id", "product__category_id", "product__supplier", "quantity", "price",
+    )
+    return [
+        SalesLine(
+            source=source, item_id=pk, order_id=order_id, created_at=created_at,
+            status=status, state=state_of(source, status), user_id=user_id,
+            product_id=product_id, plan_id=plan_id, category_id=category_id, supplier=supplier or "",
+            quantity=qty or 0, price=price or 0, line_total=(price or 0) * (qty or 0),
+        )
+        for pk, order_id, created_at, status, user_id, product_id, plan_id, category_id, supplier, qty, price in rows
+    ]
+
+
+def sync_orders(source: str, order_ids: Iterable[int]) -> int:
+    """Đưa SalesLine của các đơn về đúng dữ liệu gốc. Trả về số dòng đã thêm/sửa/xóa."""
+    order_ids = list(order_ids)
+    if not order_ids:
+        return 0
+    cube_dirty = False
+    with transaction.atomic():
+        existing: Dict[int, SalesLine] = {
+            line.item_id: line for line in SalesLine.objects.filter(source=source, order_id__in=order_ids)
+        }
+        create, update = [], []
+        for line in _lines_for(source, order_ids):
+            old = existing.pop(line.item_id, None)
+            if old is None:
+                create.append(line)
+                continue
+            if any(getattr(old, f) != getattr(line, f) for f in _FIELDS):
+                line.pk = old.pk
+                update.append(line)
+                if ((old.state == State.CANCELLED) != (line.state == State.CANCELLED)
+                        or any(getattr(old, f) != getattr(line, f) for f in _CUBE_FIELDS)):
+                    cube_dirty = True
+        if existing:  # dòng gốc đã bị xóa
+            SalesLine.objects.filter(pk__in=[line.pk for line in existing.values()]).delete()
+            cube_dirty = True
+        SalesLine.objects.bulk_create(create)
+        SalesLine.objects.bulk_update(update, _FIELDS)
+    if cube_dirty:
+        cube.invalidate()
+    return len(create) + len(update) + len(existing)
+
+
+def backfill(sources: Iterable[str] = tuple(SOURCES), batch_size: int = SALES_BACKFILL_BATCH,
+             log: Optional[Callable[[str], None]] = None) -> int:
+    """Đồng bộ toàn bộ đơn, theo lô id đơn."""
+    total = 0
+    for source in sources:
+        Order, _ = source_models(source)
+        last = 0
+        while True:
+            ids = list(Order.objects.filter(pk__gt=last).order_by("pk").values_list("pk", flat=True)[:batch_size])
+            if not ids:
+                break
+            total += sync_orders(source, ids)
+            last = ids[-1]
+            if log:
+                log(f"{source}: tới đơn #{last}")
+        # dòng của đơn không còn tồn tại
+        orphans = SalesLine.objects.filter(source=source).exclude(order_id__in=Order.objects.values("pk"))
+        n, _ = orphans.delete()
+        total += n
+    return total
+
+
+# ---------------------------------------------------------------- đối soát
+Summary = Tuple[str, int, int, object]  # (status, số dòng, tổng số lượng, tổng tiền)
+
+
+def _raw_summary(source: str) -> Dict[int, Summary]:
+    _, Item = source_models(source)
+    line_total = ExpressionWrapper(
+        Coalesce(F("price"), 0) * Coalesce(F("quantity"), 0),
+        output_field=DecimalField(max_digits=18, decimal_places=2),
+    )
+    qs = (
+        Item.objects.values("order_id", "order__status")
+        .annotate(n=Count("id"), qty=Sum("quantity"), total=Sum(line_total)).order_by()
+    )
+    return {r["order_id"]: (r["order__status"], r["n"], r["qty"] or 0, r["total"] or 0) for r in qs.iterator()}
+
+
+def _mirror_summary(source: str) -> Dict[int, Summary]:
+    qs = (
+        SalesLine.objects.filter(source=source).values("order_id", "status")
+        .annotate(n=Count("id"), qty=Sum("quantity"), total=Sum("line_total")).order_by()
+    )
+    return {r["order_id"]: (r["status"], r["n"], r["qty"] or 0, r["total"] or 0) for r in qs.iterator()}
+
+
+def check(sources: Iterable[str] = tuple(SOURCES), fix: bool = False) -> Dict[str, List[int]]:
+    """{source: [order_id lệch]} — so số dòng/số lượng/tổng tiền/trạng thái từng đơn; fix=True thì đồng bộ lại."""
+    out: Dict[str, List[int]] = {}
+    for source in sources:
+        raw, mirror = _raw_summary(source), _mirror_summary(source)
+        bad = sorted(oid for oid in raw.keys() | mirror.keys() if raw.get(oid) != mirror.get(oid))
+        out[source] = bad
+        if fix and bad:
+            for i in range(0, len(bad), SALES_BACKFILL_BATCH):
+                chunk = bad[i:i + SALES_BACKFILL_BATCH]
+                sync_orders(source, chunk)
+                # đơn đã bị xóa hẳn: sync không thấy dòng gốc -> xóa theo order_id
+                SalesLine.objects.filter(source=source, order_id__in=[o for o in chunk if o not in raw]).delete()
+    return out
+
+
+# ---------------------------------------------------------------- signal
+def _order_saved(source: str):
+    def handler(sender, instance, **kwargs):
+        sync_orders(source, [instance.pk])
+    return handler
+
+
+def _order_deleted(source: str):
+    def handler(sender, instance, **kwargs):
+        if SalesLine.objects.filter(source=source, order_id=instance.pk).delete()[0]:
+            cube.invalidate()
+    return handler
+
+
+def _item_saved(source: str):
+    def handler(sender, instance, **kwargs):
+        sync_orders(source, [instance.order_id])
+    return handler
+
+
+def _item_deleted(source: str):
+    def handler(sender, instance, **kwargs):
+        if SalesLine.objects.filter(source=source, item_id=instance.pk).delete()[0]:
+            cube.invalidate()
+    return handler
+
+
+def _lines_created(source: str):
+    def handler(sender, order, **kwargs):
+        sync_orders(source, [order.pk])
+    return handler
+
+
+for _source, (_order_label, _item_label) in SOURCES.items():
+    post_save.connect(_order_saved(_source), sender=_order_label, weak=False, dispatch_uid=f"sales_{_source}_order_saved")
+    post_delete.connect(_order_deleted(_source), sender=_order_label, weak=False, dispatch_uid=f"sales_{_source}_order_deleted")
+    post_save.connect(_item_saved(_source), sender=_item_label, weak=False, dispatch_uid=f"sales_{_source}_item_saved")
+    post_delete.connect(_item_deleted(_source), sender=_item_label, weak=False, dispatch_uid=f"sales_{_source}_item_deleted")
+    # Signal thường không nhận sender dạng chuỗi "app.Model" -> truyền class
+    order_lines_created.connect(_lines_created(_source), sender=source_models(_source)[0], weak=False,
+                                dispatch_uid=f"sales_{_source}_lines_created")
+
+
+@receiver(post_save, sender=Product, dispatch_uid="sales_product_saved")
+def _product_saved(sender, instance, **kwargs):
+    SalesLine.objects.filter(product_id=instance.pk).exclude(
+        supplier=instance.supplier or "", category_id=instance.category_id,
+    ).update(supplier=instance.supplier or "", category_id=instance.category_id)
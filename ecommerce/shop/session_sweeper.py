@@ -0,0 +1,120 @@
+# shop/session_sweeper.py
+"""
+Dọn bảng django_session theo lô nhỏ.
+
+- Xóa session hết hạn (expire_date < now).
+- (tùy chọn) Xóa session "rỗng": không đăng nhập, giỏ trống, không dữ liệu gì khác.
+- Mỗi lô là 1 câu DELETE ngắn (autocommit) + nghỉ giữa các lô, để không giữ
+  khóa ghi lâu trên SQLite.
+
+Gọi trực tiếp sweep_sessions() từ cron/task, hoặc qua lệnh:
+    python manage.py sweep_sessions --empty
+"""
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.db.models import Sum
+from django.db.models.functions import Length
+from django.utils import timezone
+
+SWEEP_BATCH_SIZE = getattr(settings, "SESSION_SWEEP_BATCH_SIZE", 500)
+SWEEP_PAUSE_SECONDS = getattr(settings, "SESSION_SWEEP_PAUSE_SECONDS", 0.05)
+
+# Giá trị coi là "không có gì" trong session
+_EMPTY_VALUES = (None, "", [], {})
+
+
+def _is_empty_payload(data: dict) -> bool:
+    """Session không mang thông tin hữu ích (chưa đăng nhập, giỏ trống...)."""
+    from cart.cart import CART_SESSION_ID  # import chậm: cart phụ thuộc shop
+
+    for key, value in (data or {}).items():
+        if value in _EMPTY_VALUES:
+            continue
+        if key == CART_SESSION_ID and isinstance(value, dict) and not value.get("l"):
+            continue  # giỏ v2 không có dòng nào
+        return False
+    return True
+
+
+@dataclass
+class SweepResult:
+    expired: int = 0
+    empty: int = 0
+    scanned: int = 0
+
+
+def _delete_in_batches(keys: List[str], batch_size: int) -> int:
+    deleted = 0
+    for i in range(0, len(keys), batch_size):
+        deleted += Session.objects.filter(session_key__in=keys[i:i + batch_size]).delete()[0]
+    return deleted
+
+
+def sweep_sessions(
+    *,
+    include_empty: bool = False,
+    batch_size: int = SWEEP_BATCH_SIZE,
+    pause: float = SWEEP_PAUSE_SECONDS,
+    dry_run: bool = False,
+    log: Optional[Callable[[str], None]] = None,
+) -> SweepResult:
+    result = SweepResult()
+    now = timezone.now()
+    log = log or (lambda msg: None)
+
+    # 1) Hết hạn: lấy 1 lô khóa -> DELETE theo khóa -> nghỉ -> lặp
+    while True:
+        keys = list(
+            Session.objects.filter(expire_date__lt=now)
+            .order_by("session_key")
+            .values_list("session_key", flat=True)[:batch_size]
+        )
+        if not keys:
+            break
+        if dry_run:
+            result.expired += Session.objects.filter(expire_date__lt=now).count()
+            break
+        result.expired += _delete_in_batches(keys, batch_size)
+        log(f"expired: {result.expired}")
+        if pause:
+            time.sleep(pause)
+
+    # 2) Rỗng: duyệt theo khóa tăng dần (keyset), giải mã và xóa theo lô
+    if include_empty:
+        store = Session.get_session_store_class()()
+        last = ""
+        while True:
+            rows = list(
+                Session.objects.filter(session_key__gt=last, expire_date__gte=now)
+                .order_by("session_key")
+                .values_list("session_key", "session_data")[:batch_size]
+            )
+            if not rows:
+                break
+            last = rows[-1][0]
+            result.scanned += len(rows)
+            empty_keys = [k for k, data in rows if _is_empty_payload(store.decode(data))]
+            if empty_keys:
+                result.empty += len(empty_keys) if dry_run else _delete_in_batches(empty_keys, batch_size)
+                log(f"empty: {result.empty} / scanned: {result.scanned}")
+            if pause:
+                time.sleep(pause)
+
+    return result
+
+
+def session_table_stats() -> dict:
+    """Số liệu kích thước bảng session (để theo dõi tăng trưởng)."""
+    now = timezone.now()
+    agg = Session.objects.aggregate(bytes=Sum(Length("session_data")))
+    return {
+        "rows": Session.objects.count(),
+        "expired": Session.objects.filter(expire_date__lt=now).count(),
+        "data_bytes": int(agg["bytes"] or 0),
+    }
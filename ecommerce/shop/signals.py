@@ -0,0 +1,6 @@
+# shop/signals.py
+from django.dispatch import Signal
+
+# Gửi sau khi tạo hàng loạt dòng đơn hàng bằng bulk_create (không có post_save).
+# sender = model Order (shop.Order hoặc cart.Order), kwargs: order
+order_lines_created = Signal()
@@ -0,0 +1,78 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.db.models.query import QuerySet
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import analytics
+from ..analytics import PageViewWriter, SeenTodayFilter, seen_today
+from ..models import Category, PageView, Product
+
+
+def _event(key, created_at=None, path="/"):
+    return {"path": path, "session_key": key, "user_agent": "Mozilla/5.0", "ip": "10.0.0.1",
+            "created_at": created_at or timezone.now()}
+
+
+class PageViewWriterTests(TestCase):
+    def test_writes_synchronously_under_tests(self):
+        writer = PageViewWriter()
+        self.assertFalse(writer.buffered)
+        self.assertTrue(writer.put(_event("sync")))
+        self.assertIsNone(writer._thread)  # không có thread nền
+        self.assertTrue(PageView.objects.filter(session_key="sync").exists())
+
+    def test_request_is_counted_in_test_transaction(self):
+        seen_today._bloom = None
+        cat = Category.objects.create(name="Danh mục xem")
+        product = Product.objects.create(name="SP xem", category=cat, price=1000)
+        self.client.get(reverse("shop:product_detail", kwargs={"slug": product.slug}), REMOTE_ADDR="10.9.9.9")
+        self.assertEqual(PageView.objects.get().product, product)
+
+    @mock.patch.object(analytics, "PAGEVIEW_ASYNC", True)
+    def test_buffered_flush_keeps_request_time(self):
+        writer = PageViewWriter(batch_size=10)
+        writer._ensure_started = lambda: None  # chỉ xếp hàng, flush tay
+        yesterday = timezone.now() - timedelta(days=1)
+        writer.put(_event("late", created_at=yesterday))
+        self.assertFalse(PageView.objects.exists())
+
+        self.assertEqual(writer.flush(), 1)
+        self.assertEqual(PageView.objects.get().created_at, yesterday)
+
+    def test_dedupes_per_session_and_local_day(self):
+        now = timezone.now()
+        PageView.objects.create(path="/", session_key="old", created_at=now)
+        PageView.objects.create(path="/", session_key="yday", created_at=now - timedelta(days=1))
+        written = PageViewWriter()._write([_event("new"), _event("new"), _event("old"), _event("yday")])
+        self.assertEqual(written, 2)
+        self.assertEqual(PageView.objects.filter(created_at__gte=analytics._start_of_day()).count(), 3)
+
+    def test_failed_batch_drops_only_the_bad_row(self):
+        real = QuerySet.bulk_create
+
+        def bulk_create(qs, objs, *args, **kwargs):
+            if any(o.session_key == "bad" for o in objs):
+                raise ValueError("bad row")
+            return real(qs, objs, *args, **kwargs)
+
+        events = [_event(f"k{i}") for i in range(5)] + [_event("bad")] + [_event(f"k{i}") for i in range(5, 9)]
+        with mock.patch.object(QuerySet, "bulk_create", bulk_create), self.assertLogs("shop.analytics", "WARNING"):
+            self.assertEqual(PageViewWriter(batch_size=100)._write(events), 9)
+        self.assertFalse(PageView.objects.filter(session_key="bad").exists())
+
+    def test_stop_without_background_thread_touches_nothing(self):
+        writer = PageViewWriter()
+        with mock.patch.object(writer, "flush") as flush:
+            writer.stop()
+        flush.assert_not_called()
+
+    @override_settings(DEBUG=True)
+    @mock.patch.object(analytics, "PAGEVIEW_ASYNC", None)
+    def test_setting_overrides_auto_mode(self):
+        writer = PageViewWriter()
+        self.assertFalse(writer.buffered)
+        with mock.patch.object(analytics, "PAGEVIEW_ASYNC", True):
+            self.assertTrue(writer.buffered)
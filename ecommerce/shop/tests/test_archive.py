@@ -0,0 +1,75 @@
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from .. import archive, rollups
+from ..archive import archive_pageviews, iter_partition, iter_rows
+from ..facts import day_start
+from ..models import PageView, PageViewDaily
+from ..rollups import visits_series
+
+
+@mock.patch.object(rollups, "PAGEVIEW_ROLLUP_LAG_SECONDS", 0)
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.base = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.base, ignore_errors=True)
+        patcher = mock.patch.object(archive, "PAGEVIEW_ARCHIVE_DIR", self.base)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.old = timezone.now() - timedelta(days=100)
+        self.day = timezone.localtime(self.old).date()
+
+    def _views(self, n, created_at):
+        return [PageView.objects.create(path="/", session_key=f"k{i}", created_at=created_at) for i in range(n)]
+
+    def _series_views(self):
+        rows = visits_series(day_start(self.day), day_start(self.day + timedelta(days=1)))
+        return sum(r["views"] for r in rows)
+
+    def test_archives_rolled_up_rows_and_keeps_totals(self):
+        self._views(3, self.old)
+        recent = self._views(1, timezone.now())
+        res = archive_pageviews(older_than_days=90, pause=0)
+        self.assertEqual((res.days, res.written, res.deleted), (1, 3, 3))
+        self.assertEqual(list(PageView.objects.all()), recent)
+        self.assertEqual(len(list(iter_partition(self.day))), 3)
+        self.assertEqual(PageViewDaily.objects.get(date=self.day).views, 3)
+        self.assertEqual(self._series_views(), 3)
+
+    def test_never_deletes_rows_above_the_watermark(self):
+        self._views(2, self.old)
+        with mock.patch.object(rollups, "PAGEVIEW_ROLLUP_LAG_SECONDS", 60):
+            res = archive_pageviews(older_than_days=90, pause=0)  # rollup mới ghi nhận mốc
+        self.assertEqual(res.deleted, 0)
+        self.assertEqual(PageView.objects.count(), 2)
+        self.assertEqual(self._series_views(), 2)
+
+    def test_crash_between_write_and_delete_is_not_double_counted(self):
+        rows = self._views(2, self.old)
+        with mock.patch.object(archive.time, "sleep", side_effect=RuntimeError("chết giữa chừng")):
+            with self.assertRaises(RuntimeError):
+                archive_pageviews(older_than_days=90, batch_size=1, pause=1)
+        self.assertEqual(PageView.objects.count(), 1)  # đã ghi file, mới xóa 1 dòng
+        lo, hi = day_start(self.day), day_start(self.day + timedelta(days=1))
+        self.assertEqual(sorted(r["id"] for r in iter_rows(lo, hi)), [r.pk for r in rows])
+
+        res = archive_pageviews(older_than_days=90, pause=0)
+        self.assertEqual((res.written, res.deleted), (1, 1))
+        self.assertEqual(len(list(iter_partition(self.day))), 2)  # không ghi lặp
+        self.assertEqual(self._series_views(), 2)
+
+    def test_command_has_no_dir_option(self):
+        self._views(1, self.old)
+        out = StringIO()
+        call_command("archive_pageviews", "--days", "90", "--pause", "0", stdout=out)
+        self.assertIn("xóa 1 dòng", out.getvalue())
+        self.assertEqual(archive.partition_days(), [self.day])
+        with self.assertRaises(TypeError):
+            call_command("archive_pageviews", dir=self.base)
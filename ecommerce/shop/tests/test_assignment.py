@@ -0,0 +1,111 @@
+from unittest import mock
+
+from django.contrib.auth.models import Group, User
+from django.contrib.auth.signals import user_logged_in
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
+
+from .. import assignment
+from ..assignment import active_staff, loads, pick_staff
+from ..models import Category, ConsultationRequest, Product
+
+
+class AssignmentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cat = Category.objects.create(name="Danh mục phân công")
+        cls.product = Product.objects.create(name="SP phân công", category=cat, price=1000)
+        cls.a = User.objects.create_user("assign-a", is_staff=True)
+        cls.b = User.objects.create_user("assign-b", is_staff=True)
+        User.objects.create_user("assign-customer")
+
+    def setUp(self):
+        cache.clear()
+
+    def _consult(self, **kwargs):
+        return ConsultationRequest.objects.create(product=self.product, **kwargs)
+
+    def test_least_loaded_gets_the_new_request(self):
+        self._consult(handled_by=self.a)
+        self._consult(handled_by=self.a)
+        self._consult(handled_by=self.b, status=ConsultationRequest.Status.DONE)  # đã đóng: không tính tải
+        new = self._consult()
+        self.assertEqual(new.handled_by_id, self.b.pk)
+        self.assertEqual(loads(), {self.a.pk: 2, self.b.pk: 1})
+
+    def test_ties_rotate_between_staff(self):
+        first, second = self._consult(), self._consult()
+        self.assertEqual({first.handled_by_id, second.handled_by_id}, {self.a.pk, self.b.pk})
+
+    def test_round_robin_cycles_regardless_of_load(self):
+        self._consult(handled_by=self.a)
+        picks = [pick_staff("round_robin") for _ in range(4)]
+        self.assertEqual(picks, [self.a.pk, self.b.pk, self.a.pk, self.b.pk])
+
+    @mock.patch.object(assignment, "CONSULT_ASSIGN_MODE", "off")
+    def test_off_leaves_request_unassigned(self):
+        self.assertIsNone(self._consult().handled_by_id)
+
+    def test_load_follows_close_reassign_and_delete(self):
+        req = self._consult(handled_by=self.a)
+        self.assertEqual(loads()[self.a.pk], 1)
+
+        req.handled_by = self.b
+        req.save()
+        self.assertEqual(loads(), {self.a.pk: 0, self.b.pk: 1})
+
+        req.status = ConsultationRequest.Status.DONE
+        req.save()
+        self.assertEqual(loads(), {self.a.pk: 0, self.b.pk: 0})
+
+        req.status = ConsultationRequest.Status.NEW  # mở lại
+        req.save()
+        self.assertEqual(loads()[self.b.pk], 1)
+        req.delete()
+        self.assertEqual(loads()[self.b.pk], 0)
+
+    def test_queryset_update_is_fixed_by_rebuild(self):
+        req = self._consult(handled_by=self.a)
+        loads()
+        ConsultationRequest.objects.filter(pk=req.pk).update(status=ConsultationRequest.Status.DONE)
+        self.assertEqual(loads()[self.a.pk], 1)  # update() không phát signal
+        self.assertEqual(assignment.rebuild_loads()[self.a.pk], 0)
+
+
+class StaffCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user("cache-staff", is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+        self.assertEqual(active_staff(), [self.staff.pk])
+
+    def test_login_keeps_cached_list(self):
+        request = RequestFactory().get("/")
+        with mock.patch.object(assignment.cache, "delete", wraps=assignment.cache.delete) as delete:
+            user_logged_in.send(sender=User, request=request, user=User.objects.get(pk=self.staff.pk))
+            self.staff.first_name = "Đổi tên"
+            self.staff.save()
+        delete.assert_not_called()
+
+    def test_staff_flag_change_invalidates(self):
+        customer = User.objects.create_user("cache-customer")  # tạo mới cũng xóa cache
+        self.assertEqual(active_staff(), [self.staff.pk])
+        customer.is_staff = True
+        customer.save()
+        self.assertEqual(active_staff(), [self.staff.pk, customer.pk])
+
+        self.staff.is_active = False
+        self.staff.save(update_fields=["is_active"])
+        self.assertEqual(active_staff(), [customer.pk])
+
+    @mock.patch.object(assignment, "CONSULT_ASSIGN_GROUP", "tư vấn")
+    def test_group_membership_change_invalidates(self):
+        cache.clear()
+        group = Group.objects.create(name="tư vấn")
+        self.assertEqual(active_staff(), [])
+        self.staff.groups.add(group)
+        self.assertEqual(active_staff(), [self.staff.pk])
+        self.staff.groups.remove(group)
+        self.assertEqual(active_staff(), [])
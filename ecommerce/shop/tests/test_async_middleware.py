@@ -0,0 +1,73 @@
+import asyncio
+from unittest import mock
+
+from asgiref.sync import iscoroutinefunction
+from django.contrib.auth.models import User
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase
+
+from ..analytics import AsyncPageViewRelay, SeenTodayFilter
+from ..middleware import PageViewMiddleware
+from ..models import PageView
+
+
+class _Writer:
+    def __init__(self):
+        self.events = []
+
+    def put(self, event):
+        self.events.append(event)
+        return True
+
+
+class AsyncRelayTests(SimpleTestCase):
+    async def test_drain_forwards_events_to_writer(self):
+        writer = _Writer()
+        relay = AsyncPageViewRelay(writer, max_queue=10)
+        for i in range(3):
+            self.assertTrue(relay.put({"n": i}))
+        await asyncio.sleep(0)
+        self.assertEqual([e["n"] for e in writer.events], [0, 1, 2])
+
+    async def test_full_queue_drops_without_blocking(self):
+        relay = AsyncPageViewRelay(_Writer(), max_queue=1)
+        self.assertTrue(relay.put({}))
+        self.assertFalse(relay.put({}))  # task rút hàng chưa kịp chạy
+        self.assertEqual(relay.dropped, 1)
+
+
+class AsyncMiddlewareTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch("shop.middleware.seen_today", SeenTodayFilter(capacity=100))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_detects_async_chain(self):
+        async def view(request):
+            return HttpResponse()
+
+        self.assertTrue(iscoroutinefunction(PageViewMiddleware(view)))
+        self.assertFalse(iscoroutinefunction(PageViewMiddleware(lambda r: HttpResponse())))
+
+    async def test_buffered_mode_only_enqueues_on_the_loop(self):
+        async def view(request):
+            return HttpResponse("ok")
+
+        middleware = PageViewMiddleware(view)
+        with mock.patch("shop.middleware.pageview_writer") as writer, \
+                mock.patch("shop.middleware.pageview_relay") as relay:
+            writer.buffered = True
+            resp = await middleware(RequestFactory().get("/san-pham/", REMOTE_ADDR="10.1.1.1"))
+        self.assertEqual(resp.content, b"ok")
+        relay.put.assert_called_once()
+        writer.put.assert_not_called()
+        self.assertEqual(relay.put.call_args.args[0]["path"], "/san-pham/")
+
+    async def test_asgi_request_records_logged_in_user(self):
+        user = await User.objects.acreate_user("async-viewer")
+        await self.async_client.aforce_login(user)
+        resp = await self.async_client.get("/", REMOTE_ADDR="10.1.1.2")
+        self.assertLess(resp.status_code, 500)
+        view = await PageView.objects.aget()
+        self.assertEqual(view.user_id, user.pk)
+        self.assertEqual(view.path, "/")
@@ -0,0 +1,66 @@
+from django.test import SimpleTestCase
+
+from ..bots import is_bot
+
+
+class BotClassifierTests(SimpleTestCase):
+    HUMANS = [
+        # Chrome / Firefox / Safari / Samsung
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+        "Mozilla/5.0 (X11; Linux x86_64; rv:121.0) Gecko/20100101 Firefox/121.0",
+        "Mozilla/5.0 (iPhone; CPU iPhone OS 17_2 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) "
+        "Version/17.2 Mobile/15E148 Safari/604.1",
+        "Mozilla/5.0 (Linux; Android 13; SM-S911B) AppleWebKit/537.36 (KHTML, like Gecko) SamsungBrowser/23.0 "
+        "Chrome/115.0.0.0 Mobile Safari/537.36",
+        # DuckDuckGo browser (Android, iOS)
+        "Mozilla/5.0 (Linux; Android 13; Pixel 7) AppleWebKit/537.36 (KHTML, like Gecko) Version/4.0 "
+        "Chrome/120.0.0.0 Mobile Safari/537.36 DuckDuckGo/5",
+        "Mozilla/5.0 (iPhone; CPU iPhone OS 17_2 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) "
+        "Version/17.2 Mobile/15E148 DuckDuckGo/7 Safari/605.1.15",
+        # máy Cubot
+        "Mozilla/5.0 (Linux; Android 10; CUBOT_X30) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 "
+        "Mobile Safari/537.36",
+        "Mozilla/5.0 (Linux; Android 11; CUBOT NOTE 20 PRO Build/RP1A.200720.011) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/119.0.0.0 Mobile Safari/537.36",
+        # app Baidu, Cốc Cốc, Yandex Browser
+        "Mozilla/5.0 (Linux; Android 12; V2145A) AppleWebKit/537.36 (KHTML, like Gecko) Version/4.0 "
+        "Chrome/97.0.4692.98 Mobile Safari/537.36 T7/13.32 SP-engine/2.70.0 baiduboxapp/13.32.0.10 (Baidu; P1 12)",
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) coc_coc_browser/117.0.220 "
+        "Chrome/111.0.5563.220 Safari/537.36",
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 "
+        "YaBrowser/23.11.0.0 Safari/537.36",
+        # trình duyệt trong app: Zalo, Telegram, Facebook
+        "Mozilla/5.0 (Linux; Android 12; SM-A325F) AppleWebKit/537.36 (KHTML, like Gecko) Version/4.0 "
+        "Chrome/120.0.6099.43 Mobile Safari/537.36 Zalo android/12100685 ZaloTheme/light ZaloLanguage/vn",
+        "Mozilla/5.0 (Linux; Android 13; SM-A525F) AppleWebKit/537.36 (KHTML, like Gecko) Version/4.0 "
+        "Chrome/120.0.6099.43 Mobile Safari/537.36 Telegram-Android/10.5.0 (Samsung SM-A525F; Android 13; SDK 33)",
+        "Mozilla/5.0 (iPhone; CPU iPhone OS 17_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) "
+        "Mobile/15E148 [FBAN/FBIOS;FBAV/442.0.0.32.113;FBBV/545042417;FBDV/iPhone14,5;FBMD/iPhone;FBSN/iOS]",
+    ]
+    BOTS = [
+        "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)",
+        "Mozilla/5.0 (compatible; bingbot/2.0; +http://www.bing.com/bingbot.htm)",
+        "Mozilla/5.0 (compatible; YandexBot/3.0; +http://yandex.com/bots)",
+        "Mozilla/5.0 (compatible; YandexImages/3.0; +http://yandex.com/bots)",
+        "Mozilla/5.0 (compatible; Baiduspider/2.0; +http://www.baidu.com/search/spider.html)",
+        "DuckDuckBot/1.1; (+http://duckduckgo.com/duckduckbot.html)",
+        "Mozilla/5.0 (compatible; AhrefsBot/7.0; +http://ahrefs.com/robot/)",
+        "coccocbot-web/1.0 (+http://help.coccoc.com/searchengine)",
+        "Mozilla/5.0 (compatible; UptimeRobot/2.0; http://www.uptimerobot.com/)",
+        "Pingdom.com_bot_version_1.4_(http://www.pingdom.com/)",
+        "facebookexternalhit/1.1 (+http://www.facebook.com/externalhit_uatext.php)",
+        "TelegramBot (like TwitterBot)",
+        "WhatsApp/2.23.20.0",
+        "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) HeadlessChrome/120.0.0.0 Safari/537.36",
+        "curl/8.4.0", "python-requests/2.31.0", "Java/17.0.2", "Go-http-client/1.1", "okhttp/4.9.0", "",
+    ]
+
+    def test_browsers_are_not_bots(self):
+        for ua in self.HUMANS:
+            with self.subTest(ua=ua):
+                self.assertFalse(is_bot(ua))
+
+    def test_crawlers_and_tools_are_bots(self):
+        for ua in self.BOTS:
+            with self.subTest(ua=ua):
+                self.assertTrue(is_bot(ua))
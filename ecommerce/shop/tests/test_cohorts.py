@@ -0,0 +1,59 @@
+from datetime import datetime
+from unittest import mock
+
+from cart.models import Order as CartOrder
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from .. import reports
+from ..reports import ReportParams, get_dataset
+
+
+def _at(y, m, d=10):
+    return timezone.make_aware(datetime(y, m, d, 12))
+
+
+class CohortTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        a = User.objects.create_user("cohort-a", date_joined=_at(2025, 1))
+        b = User.objects.create_user("cohort-b", date_joined=_at(2025, 1, 20))
+        User.objects.create_user("cohort-c", date_joined=_at(2025, 3))
+        d = User.objects.create_user("cohort-d", date_joined=_at(2025, 3, 5))
+        # a mua ngay tháng đăng ký, b mua sau 2 tháng (đơn đầu tiên mới tính), d chỉ có đơn bị hủy
+        for user, when, status in (
+            (a, _at(2025, 1, 15), CartOrder.Status.CONFIRMED),
+            (b, _at(2025, 3, 1), CartOrder.Status.CONFIRMED),
+            (b, _at(2025, 5, 1), CartOrder.Status.CONFIRMED),
+            (d, _at(2025, 3, 6), CartOrder.Status.CANCELLED),
+        ):
+            CartOrder.objects.create(user=user, status=status, confirmed_at=when)
+
+    def setUp(self):
+        cache.clear()
+        self.params = ReportParams.from_query({"date_from": "2025-01-01", "date_to": "2025-06-01"})
+
+    def _expected(self, cohort, users, converted, months):
+        row = {"cohort": cohort, "users": users, "converted": converted}
+        row.update({f"m{k}": months.get(k, 0) for k in range(reports.COHORT_MONTHS)})
+        row[f"m{reports.COHORT_MONTHS}_plus"] = 0
+        return row
+
+    def test_rows_count_first_confirmed_order(self):
+        self.assertEqual(get_dataset("cohorts", self.params), [
+            self._expected("2025-01", 2, 2, {0: 1, 2: 1}),
+            self._expected("2025-03", 2, 0, {}),
+        ])
+
+    def test_python_fallback_matches_numpy(self):
+        with_np = reports._cohort_rows(self.params.date_from, self.params.date_to)
+        with mock.patch.object(reports, "np", None):
+            self.assertEqual(reports._cohort_rows(self.params.date_from, self.params.date_to), with_np)
+
+    def test_cached_once_with_report_ttl(self):
+        with mock.patch.object(reports, "get_or_compute", wraps=reports.get_or_compute) as goc:
+            get_dataset("cohorts", self.params)
+        goc.assert_called_once()
+        self.assertEqual(goc.call_args.args[1], reports.report_ttl(True))
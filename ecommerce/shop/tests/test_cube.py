@@ -0,0 +1,74 @@
+import unittest
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from .. import cube
+from ..cube import SalesCube
+from ..models import Category, Order, OrderItem, Product
+
+
+@unittest.skipIf(cube.np is None, "numpy chưa cài")
+@mock.patch.object(cube, "CUBE_REFRESH_SECONDS", 0)
+class SalesCubeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cat = Category.objects.create(name="Danh mục cube")
+        cls.product = Product.objects.create(name="SP cube", category=cls.cat, price=100, supplier="ACME")
+
+    def _order(self, qty=1, price="100", status=Order.Status.PAID):
+        order = Order.objects.create(status=status)
+        OrderItem.objects.create(order=order, product=self.product, quantity=qty, price=Decimal(price))
+        return order
+
+    def _totals(self, sales_cube, group_by="supplier"):
+        now = timezone.now()
+        return sales_cube.query(group_by, now - timedelta(days=1), now + timedelta(days=1))
+
+    def test_disabled_by_default(self):
+        self.assertFalse(cube.REPORT_CUBE_ENABLED)
+        self.assertFalse(cube.available())
+
+    def test_new_lines_are_appended_incrementally(self):
+        sales_cube = SalesCube()
+        self._order(qty=2)
+        self.assertEqual(self._totals(sales_cube), [{"key": "ACME", "orders": 1, "quantity": 2, "revenue": 200.0}])
+        version = sales_cube._snap.version
+        self._order(qty=1, price="50")
+        self.assertEqual(self._totals(sales_cube)[0]["revenue"], 250.0)
+        self.assertEqual(sales_cube._snap.version, version)  # không nạp lại toàn bộ
+
+    def test_cancelled_order_leaves_totals_in_every_process(self):
+        self._order(qty=1)
+        cancel = self._order(qty=3)
+        here, other = SalesCube(), SalesCube()  # 2 worker, mỗi worker 1 cube
+        self.assertEqual(self._totals(other)[0]["quantity"], 4)
+
+        cancel.status = Order.Status.CANCELLED
+        cancel.save()
+        cache.clear()  # phiên bản nằm trong DB, không phụ thuộc cache của process
+        self.assertEqual(self._totals(here)[0]["quantity"], 1)
+        self.assertEqual(self._totals(other), [{"key": "ACME", "orders": 1, "quantity": 1, "revenue": 100.0}])
+
+    def test_edited_product_dimension_reloads(self):
+        self._order()
+        sales_cube = SalesCube()
+        self.assertEqual(self._totals(sales_cube)[0]["key"], "ACME")
+        version = cube.current_version()
+        self.product.supplier = "Globex"
+        self.product.save()
+        self.assertGreater(cube.current_version(), version)
+
+    def test_readers_keep_their_snapshot(self):
+        self._order()
+        sales_cube = SalesCube()
+        snap = sales_cube.refresh()
+        self._order()
+        cube.invalidate()
+        fresh = sales_cube.refresh()
+        self.assertIsNot(fresh, snap)
+        self.assertEqual((len(snap), len(fresh)), (1, 2))
@@ -0,0 +1,64 @@
+import io
+import unittest
+import zipfile
+from decimal import Decimal
+from unittest import mock
+from xml.etree import ElementTree
+
+from django.test import SimpleTestCase
+
+from .. import exports
+from ..exports import write_export
+
+NS = {"s": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+
+
+class MinimalXlsxTests(SimpleTestCase):
+    def _write(self, headers, rows, title="báo cáo"):
+        fh = io.BytesIO()
+        with mock.patch.object(exports, "openpyxl", None):
+            write_export(fh, "xlsx", title, headers, rows)
+        fh.seek(0)
+        return zipfile.ZipFile(fh)
+
+    def _cells(self, zf):
+        sheet = ElementTree.fromstring(zf.read("xl/worksheets/sheet1.xml"))  # lỗi nếu XML hỏng
+        out = []
+        for row in sheet.iterfind("s:sheetData/s:row", NS):
+            out.append([
+                "".join(c.itertext()) if c.get("t") == "inlineStr" else c.findtext("s:v", default=None, namespaces=NS)
+                for c in row.iterfind("s:c", NS)
+            ])
+        return out
+
+    def test_all_parts_are_valid_xml(self):
+        zf = self._write(["a"], [{"a": 1}])
+        self.assertIsNone(zf.testzip())
+        for name in zf.namelist():
+            ElementTree.fromstring(zf.read(name))
+
+    def test_cell_types_and_escaping(self):
+        rows = [{"name": "A & <B>", "n": 3, "price": Decimal("1.50"), "ok": True, "empty": None}]
+        cells = self._cells(self._write(["name", "n", "price", "ok", "empty"], rows))
+        self.assertEqual(cells[0], ["name", "n", "price", "ok", "empty"])
+        self.assertEqual(cells[1], ["A & <B>", "3", "1.50", "1", None])
+
+    def test_illegal_xml_characters_are_stripped(self):
+        zf = self._write(["note"], [{"note": "a\x00b\x1fc\ufffe"}], title="x\x01y")
+        self.assertEqual(self._cells(zf)[1], ["abc"])
+        ElementTree.fromstring(zf.read("xl/workbook.xml"))
+
+    def test_many_rows_are_written_in_blocks(self):
+        with mock.patch.object(exports, "EXPORT_CSV_CHUNK_ROWS", 3):
+            cells = self._cells(self._write(["i"], ({"i": i} for i in range(10))))
+        self.assertEqual([c[0] for c in cells[1:]], [str(i) for i in range(10)])
+
+
+@unittest.skipIf(exports.openpyxl is None, "openpyxl chưa cài")
+class OpenpyxlXlsxTests(SimpleTestCase):
+    def test_illegal_characters_do_not_break_workbook(self):
+        fh = io.BytesIO()
+        write_export(fh, "xlsx", "báo cáo", ["note", "price"], [{"note": "a\x00b", "price": Decimal("2.5")}])
+        fh.seek(0)
+        ws = exports.openpyxl.load_workbook(fh).active
+        self.assertEqual([c.value for c in ws[2]], ["ab", 2.5])
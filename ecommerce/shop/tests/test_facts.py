@@ -0,0 +1,90 @@
+import unittest
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from .. import cube, facts
+from ..facts import day_start
+from ..models import Category, Order, OrderDailyFact, OrderItem, Product
+from ..reports import ReportParams, orders_by_supplier
+
+
+class OrderFactTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cat = Category.objects.create(name="Danh mục fact")
+        cls.acme = Product.objects.create(name="SP acme", category=cat, price=100, supplier="ACME")
+        cls.globex = Product.objects.create(name="SP globex", category=cat, price=100, supplier="Globex")
+
+    def setUp(self):
+        cache.clear()
+        self.today = timezone.localdate()
+
+    def _order(self, product, qty=1, status=Order.Status.PAID, days_ago=0):
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(status=status)
+            if days_ago:
+                Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+                order.refresh_from_db()
+            OrderItem.objects.create(order=order, product=product, quantity=qty, price=Decimal("10"))
+        return order
+
+    def _params(self, date_from, date_to):
+        return ReportParams(date_from=date_from, date_to=date_to, can_see_revenue=True,
+                            open_start=False, open_ended=False)
+
+    def _whole_days(self):
+        return self._params(day_start(self.today - timedelta(days=7)), day_start(self.today))
+
+    def test_default_source_is_the_fact_table(self):
+        self._order(self.acme, qty=2, days_ago=2)
+        with mock.patch.object(cube, "orders_by", side_effect=AssertionError("cube không được dùng")), \
+                mock.patch("shop.reports.sales_lines", side_effect=AssertionError("ngày trọn vẹn đọc fact")):
+            rows = orders_by_supplier(self._whole_days())
+        self.assertEqual(rows, [{"supplier": "ACME", "orders": 1, "quantity": 2, "revenue": 20.0}])
+
+    def test_partial_days_read_sales_lines(self):
+        self._order(self.acme, days_ago=2)
+        self._order(self.acme, qty=3)  # hôm nay: phần lẻ cuối khoảng
+        params = self._params(day_start(self.today - timedelta(days=7)), timezone.now() + timedelta(minutes=1))
+        self.assertEqual(orders_by_supplier(params)[0]["quantity"], 4)
+
+    def test_cancelled_orders_are_excluded(self):
+        order = self._order(self.acme, days_ago=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            order.status = Order.Status.CANCELLED
+            order.save()
+        self.assertEqual(orders_by_supplier(self._whole_days()), [])
+        self.assertTrue(OrderDailyFact.objects.filter(status="cancelled").exists())
+
+    def test_changing_item_product_refreshes_old_bucket(self):
+        order = self._order(self.acme, days_ago=2)
+        item = order.items.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            item.product = self.globex
+            item.save()
+        self.assertEqual(set(OrderDailyFact.objects.values_list("product_id", flat=True)), {self.globex.pk})
+        self.assertEqual([r["supplier"] for r in orders_by_supplier(self._whole_days())], ["Globex"])
+
+    def test_rebuild_restores_drifted_facts(self):
+        self._order(self.acme, qty=2, days_ago=2)
+        self._order(self.globex, days_ago=3)
+        expected = list(OrderDailyFact.objects.order_by("product_id").values("product_id", "quantity", "revenue"))
+        OrderDailyFact.objects.all().delete()
+        self.assertEqual(facts.rebuild(), 2)
+        self.assertEqual(
+            list(OrderDailyFact.objects.order_by("product_id").values("product_id", "quantity", "revenue")), expected)
+
+    @unittest.skipIf(cube.np is None, "numpy chưa cài")
+    def test_cube_gives_the_same_numbers(self):
+        self._order(self.acme, qty=2, days_ago=2)
+        self._order(self.globex, days_ago=3)
+        params = self._whole_days()
+        from_facts = orders_by_supplier(params)
+        with mock.patch.object(cube, "REPORT_CUBE_ENABLED", True), \
+                mock.patch.object(cube, "sales_cube", cube.SalesCube()):
+            self.assertEqual(orders_by_supplier(params), from_facts)
@@ -0,0 +1,30 @@
+from django.test import SimpleTestCase
+
+from ..hll import HyperLogLog
+
+
+class HyperLogLogTests(SimpleTestCase):
+    def test_estimate_within_error(self):
+        hll = HyperLogLog().update(f"visitor-{i}" for i in range(20000))
+        self.assertAlmostEqual(hll.count(), 20000, delta=20000 * 0.05)
+
+    def test_merge_equals_union(self):
+        a = HyperLogLog().update(f"v{i}" for i in range(0, 3000))
+        b = HyperLogLog().update(f"v{i}" for i in range(2000, 5000))
+        union = HyperLogLog().update(f"v{i}" for i in range(0, 5000))
+        self.assertEqual(a.merge(b).registers, union.registers)
+
+    def test_serialization_round_trip_sparse_and_dense(self):
+        for n in (0, 30, 50000):  # rỗng, thưa, đặc
+            hll = HyperLogLog().update(str(i) for i in range(n))
+            data = hll.to_bytes()
+            self.assertEqual(data[:1], b"D" if n == 50000 else b"S")
+            restored = HyperLogLog.from_bytes(data)
+            self.assertEqual(restored.registers, hll.registers)
+            self.assertEqual(restored.count(), hll.count())
+
+    def test_rejects_mismatched_precision_and_bad_data(self):
+        with self.assertRaises(ValueError):
+            HyperLogLog(12).merge(HyperLogLog(10))
+        with self.assertRaises(ValueError):
+            HyperLogLog.from_bytes(b"X\x0c")
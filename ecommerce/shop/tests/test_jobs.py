@@ -0,0 +1,128 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import jobs
+from ..jobs import JobLimitExceeded, claim_jobs, enqueue_export, heartbeat, requeue_stale, run_job
+from ..models import ExportJob
+
+
+class ExportJobTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user("job-staff", is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        for patcher in (
+            mock.patch.object(ExportJob._meta.get_field("file"), "storage", FileSystemStorage(location=root)),
+            # run_job tự đóng kết nối khi chạy trong process con; ở đây dùng chung transaction của test
+            mock.patch.object(jobs, "close_old_connections", lambda: None),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _job(self, **kwargs):
+        return enqueue_export(kwargs.pop("kind", "users"), kwargs.pop("fmt", "csv"), kwargs, self.staff)
+
+    def _go_stale(self, job_id):
+        ExportJob.objects.filter(pk=job_id).update(
+            heartbeat_at=timezone.now() - timedelta(seconds=jobs.EXPORT_JOB_STALE_SECONDS + 1))
+
+    def test_enqueue_validates_and_limits_pending_jobs(self):
+        with self.assertRaises(ValueError):
+            self._job(kind="nope")
+        with self.assertRaises(ValueError):
+            self._job(fmt="pdf")
+        job = self._job(kind="supplier", supplier="ACME", junk="x")
+        self.assertEqual((job.kind, job.params, job.can_see_revenue), ("orders_by_supplier", {"supplier": "ACME"}, True))
+        for _ in range(jobs.EXPORT_JOB_MAX_PENDING - 1):
+            self._job()
+        with self.assertRaises(JobLimitExceeded):
+            self._job()
+
+    def test_claim_is_exclusive(self):
+        first, second = self._job(), self._job()
+        claimed = claim_jobs(5)
+        self.assertEqual([job_id for job_id, _ in claimed], [first.pk, second.pk])
+        self.assertEqual(claim_jobs(5), [])  # worker khác không giành lại được
+
+        job = ExportJob.objects.get(pk=first.pk)
+        self.assertEqual((job.status, job.claim, job.attempts), ("running", claimed[0][1], 1))
+
+    def test_claim_skips_job_taken_between_select_and_update(self):
+        job = self._job()
+        real_filter = ExportJob.objects.filter
+
+        def filter(*args, **kwargs):
+            if "pk" in kwargs:  # worker khác vừa giành trước bước UPDATE
+                real_filter(pk=job.pk).update(status=ExportJob.Status.RUNNING, claim="other")
+            return real_filter(*args, **kwargs)
+
+        with mock.patch.object(ExportJob.objects, "filter", side_effect=filter):
+            self.assertEqual(claim_jobs(1), [])
+        self.assertEqual(ExportJob.objects.get(pk=job.pk).claim, "other")
+
+    def test_requeue_only_jobs_without_heartbeat(self):
+        live, dead = self._job(), self._job()
+        claims = dict(claim_jobs(2))
+        self._go_stale(dead.pk)
+        self.assertEqual(heartbeat([(live.pk, claims[live.pk]), (dead.pk, "wrong-claim")]), 1)
+
+        self.assertEqual(requeue_stale(), 1)
+        self.assertEqual(ExportJob.objects.get(pk=live.pk).status, "running")
+        dead.refresh_from_db()
+        self.assertEqual((dead.status, dead.claim), ("queued", ""))
+
+        claim_jobs(1)
+        self._go_stale(dead.pk)
+        requeue_stale()  # hết lượt thử
+        dead.refresh_from_db()
+        self.assertEqual((dead.status, dead.error), ("failed", "timeout"))
+
+    def test_stale_run_does_not_overwrite_new_run(self):
+        job = self._job()
+        [(_, old_claim)] = claim_jobs(1)
+        self._go_stale(job.pk)
+        requeue_stale()
+        [(_, new_claim)] = claim_jobs(1)
+
+        self.assertEqual(run_job(job.pk, old_claim), "stale")
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.claim, job.file.name), ("running", new_claim, ""))
+        self.assertEqual(os.listdir(job.file.storage.path(jobs.EXPORT_DIR)), [])  # file lượt cũ đã xóa
+
+        self.assertEqual(run_job(job.pk, new_claim), "done")
+        job.refresh_from_db()
+        self.assertEqual(job.status, "done")
+        self.assertTrue(job.file.storage.exists(job.file.name))
+
+    def test_download_only_for_owner_when_done(self):
+        job = self._job()
+        [(_, claim)] = claim_jobs(1)
+        url = reverse("shop:admin_export_job_download", args=[job.pk])
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(url).status_code, 404)  # chưa xong
+
+        run_job(job.pk, claim)
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp["Content-Disposition"].startswith('attachment; filename="users-'))
+        self.assertTrue(b"".join(resp.streaming_content).startswith(b"\xef\xbb\xbfperiod,count"))
+        resp.close()
+
+        self.client.force_login(User.objects.create_user("job-other", is_staff=True))
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.force_login(User.objects.create_user("job-customer"))
+        self.assertEqual(self.client.get(url).status_code, 302)
@@ -0,0 +1,80 @@
+import threading
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from .. import live
+from ..live import CONSULT_WATERMARK, Watermark
+from ..models import Category, ConsultationRequest, Product
+
+
+class WatermarkTests(SimpleTestCase):
+    def test_bump_wakes_waiting_thread(self):
+        mark = Watermark(lambda: 3, refresh_seconds=60)
+        self.assertEqual(mark.current(), 3)
+        got = []
+        t = threading.Thread(target=lambda: got.append(mark.wait_for(3, timeout=5)))
+        t.start()
+        mark.bump(7)
+        t.join(2)
+        self.assertEqual(got, [7])
+
+    def test_wait_times_out_and_ignores_lower_ids(self):
+        mark = Watermark(lambda: 10, refresh_seconds=60)
+        mark.current()
+        mark.bump(4)
+        self.assertEqual(mark.wait_for(10, timeout=0.05), 10)
+
+    async def test_await_for_sees_bump(self):
+        mark = Watermark(lambda: 1, refresh_seconds=60)
+        mark.bump(5)
+        self.assertEqual(await mark.await_for(1, timeout=1), 5)
+        self.assertEqual(await mark.await_for(5, timeout=0.05), 5)
+
+
+class ConsultFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cat = Category.objects.create(name="Danh mục feed")
+        cls.product = Product.objects.create(name="SP feed", category=cat, price=1000)
+        cls.staff = User.objects.create_user("feed-staff", is_staff=True)
+        cls.old = ConsultationRequest.objects.create(product=cls.product)
+        cls.new = ConsultationRequest.objects.create(product=cls.product)
+
+    def setUp(self):
+        CONSULT_WATERMARK.bump(self.new.pk)  # on_commit không chạy trong TestCase
+        self.url = reverse("shop:consult_feed")
+
+    def test_requires_staff(self):
+        self.client.force_login(User.objects.create_user("feed-customer"))
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+    def test_wsgi_returns_new_rows_and_closes(self):
+        self.client.force_login(self.staff)
+        resp = self.client.get(self.url, {"after": self.old.pk})
+        body = b"".join(resp.streaming_content).decode()
+        self.assertEqual(resp["Content-Type"], "text/event-stream; charset=utf-8")
+        self.assertIn(f"retry: {live.LIVE_POLL_SECONDS * 1000}", body)
+        self.assertIn(f"id: {self.new.pk}\nevent: item", body)
+        self.assertNotIn(f"id: {self.old.pk}\nevent: item", body)
+        self.assertTrue(body.endswith(f'id: {self.new.pk}\nevent: watermark\ndata: {{"after": {self.new.pk}}}\n\n'))
+
+    def test_wsgi_poll_does_not_wait(self):
+        self.client.force_login(self.staff)
+        with mock.patch.object(CONSULT_WATERMARK, "wait_for", wraps=CONSULT_WATERMARK.wait_for) as wait_for:
+            data = self.client.get(self.url, {"after": self.new.pk, "poll": 1}).json()
+        wait_for.assert_called_once_with(self.new.pk, 0)
+        self.assertEqual(data, {"items": [], "after": self.new.pk, "retry": live.LIVE_POLL_SECONDS})
+
+    @mock.patch.object(live, "LIVE_MAX_SECONDS", 0.3)
+    @mock.patch.object(live, "LIVE_HEARTBEAT_SECONDS", 0.1)
+    async def test_asgi_streams_with_async_iterator(self):
+        await self.async_client.aforce_login(self.staff)
+        resp = await self.async_client.get(self.url, {"after": self.old.pk})
+        self.assertTrue(resp.is_async)
+        body = "".join([chunk.decode() async for chunk in resp.streaming_content])
+        self.assertTrue(body.startswith("retry: 3000\n\n"))
+        self.assertIn(f"id: {self.new.pk}\nevent: item", body)
+        self.assertIn(": ping", body)  # giữ kết nối tới hết LIVE_MAX_SECONDS
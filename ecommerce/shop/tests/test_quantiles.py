@@ -0,0 +1,42 @@
+import random
+
+from django.test import SimpleTestCase
+
+from ..quantiles import QuantileSketch
+
+
+class QuantileSketchTests(SimpleTestCase):
+    def setUp(self):
+        rnd = random.Random(42)
+        self.values = [rnd.lognormvariate(6, 1.5) for _ in range(5000)] + [0.0] * 50
+
+    def _exact(self, q):
+        ordered = sorted(self.values)
+        return ordered[int(q * (len(ordered) - 1))]
+
+    def test_relative_error_bound(self):
+        sk = QuantileSketch(0.01).update(self.values)
+        for q in (0.5, 0.9, 0.99):
+            self.assertAlmostEqual(sk.quantile(q), self._exact(q), delta=self._exact(q) * 0.011)
+
+    def test_merge_matches_single_sketch(self):
+        whole = QuantileSketch().update(self.values)
+        merged = QuantileSketch().update(self.values[:1700]).merge(QuantileSketch().update(self.values[1700:]))
+        self.assertEqual(merged.bins, whole.bins)
+        self.assertEqual((merged.zeros, merged.min, merged.max), (whole.zeros, whole.min, whole.max))
+        for q in (0.5, 0.9, 0.99):
+            self.assertEqual(merged.quantile(q), whole.quantile(q))
+
+    def test_serialization_round_trip(self):
+        sk = QuantileSketch(0.02).update(self.values)
+        restored = QuantileSketch.from_bytes(sk.to_bytes())
+        self.assertEqual((restored.alpha, restored.bins, restored.zeros), (sk.alpha, sk.bins, sk.zeros))
+        self.assertEqual((restored.min, restored.max), (sk.min, sk.max))
+        self.assertEqual(restored.quantile(0.99), sk.quantile(0.99))
+
+    def test_empty_sketch(self):
+        restored = QuantileSketch.from_bytes(QuantileSketch().to_bytes())
+        self.assertEqual(restored.count, 0)
+        self.assertIsNone(restored.quantile(0.5))
+        with self.assertRaises(ValueError):
+            QuantileSketch(0.01).merge(QuantileSketch(0.02))
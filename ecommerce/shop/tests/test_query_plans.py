@@ -0,0 +1,42 @@
+import importlib
+import unittest
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+
+from .. import query_plans
+from ..models import PageView
+
+
+@unittest.skipIf(connection.vendor != "sqlite", "EXPLAIN QUERY PLAN chỉ có trên SQLite")
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # test dựng schema từ models, không chạy RunSQL của migration -> tạo index auth_user như 0023
+        migration = importlib.import_module("shop.migrations.0023_report_query_indexes").Migration
+        with connection.cursor() as cur:
+            for op in migration.operations:
+                if hasattr(op, "sql"):
+                    cur.execute(op.sql)
+        query_plans.seed(rows=300)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_reports_and_pages_do_not_scan_large_tables(self):
+        queries = []
+        query_plans._report_queries(queries)
+        query_plans._page_queries(queries)
+        planned = query_plans.explain(queries, large_rows=100)
+        self.assertGreater(len(planned), 20)
+        self.assertEqual([(pq.label, pq.full_scans) for pq in planned if pq.full_scans], [])
+
+    def test_unindexed_filter_is_reported(self):
+        queries = []
+        with query_plans._capture("referer", queries):
+            list(PageView.objects.filter(referer="x").order_by())
+        [pq] = query_plans.explain(queries, large_rows=100)
+        self.assertTrue(pq.full_scans)
+        self.assertIn("shop_pageview", pq.full_scans[0])
+        self.assertEqual(query_plans.explain(queries, large_rows=10**6)[0].full_scans, [])
@@ -0,0 +1,76 @@
+import json
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+
+from .. import ratelimit
+
+
+@mock.patch.dict(ratelimit.RATES, {"test": "2/m"})
+class RateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user("rl-user")
+
+    def _view(self, **kwargs):
+        @ratelimit.ratelimit("test", **kwargs)
+        def view(request):
+            return HttpResponse("ok")
+        return view
+
+    def _post(self, view, user=None, ip="10.0.0.1", **headers):
+        request = self.factory.post("/x/", REMOTE_ADDR=ip, **headers)
+        request.user = user or self.user
+        request.session = {}
+        request._messages = FallbackStorage(request)
+        return view(request)
+
+    def test_parse_rate(self):
+        self.assertEqual(ratelimit.parse_rate("5/m"), (5, 60))
+        self.assertEqual(ratelimit.parse_rate("3/10m"), (3, 600))
+        with self.assertRaises(ValueError):
+            ratelimit.parse_rate("5 per minute")
+
+    def test_blocks_after_limit_with_json_429(self):
+        view = self._view(json=True)
+        self.assertEqual(self._post(view).status_code, 200)
+        self.assertEqual(self._post(view).status_code, 200)
+        resp = self._post(view)
+        self.assertEqual(resp.status_code, 429)
+        self.assertGreaterEqual(int(resp["Retry-After"]), 1)
+        self.assertTrue(json.loads(resp.content)["rate_limited"])
+
+    def test_html_request_is_redirected_with_message(self):
+        view = self._view()
+        for _ in range(2):
+            self._post(view)
+        resp = self._post(view, HTTP_REFERER="/cart/")
+        self.assertEqual((resp.status_code, resp["Location"]), (302, "/cart/"))
+
+    def test_keys_are_independent(self):
+        view = self._view(key="ip", json=True)
+        for _ in range(2):
+            self._post(view, ip="10.0.0.1")
+        self.assertEqual(self._post(view, ip="10.0.0.1").status_code, 429)
+        self.assertEqual(self._post(view, ip="10.0.0.2").status_code, 200)
+
+    def test_only_listed_methods_are_counted(self):
+        view = self._view(json=True)
+        for _ in range(3):
+            request = self.factory.get("/x/")
+            request.user = AnonymousUser()
+            self.assertEqual(view(request).status_code, 200)
+
+    def test_previous_window_is_weighted(self):
+        with mock.patch("shop.ratelimit.time.time", return_value=6000.0):  # đầu cửa sổ 100
+            self.assertTrue(ratelimit.hit("k", 2, 60)[0])
+            self.assertTrue(ratelimit.hit("k", 2, 60)[0])
+        with mock.patch("shop.ratelimit.time.time", return_value=6070.0):  # 1/6 vào cửa sổ 101
+            self.assertFalse(ratelimit.hit("k", 2, 60)[0])  # ceil(2 * 5/6) = 2
+        with mock.patch("shop.ratelimit.time.time", return_value=6115.0):
+            self.assertTrue(ratelimit.hit("k", 2, 60)[0])  # ceil(2 * 1/12) = 1
@@ -0,0 +1,80 @@
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+from .. import report_cache
+from ..report_cache import get_or_compute, report_cache_key, report_ttl
+from ..reports import ReportParams
+
+
+class ReportCacheKeyTests(SimpleTestCase):
+    def test_key_ignores_argument_order(self):
+        self.assertEqual(report_cache_key(a=1, b="x"), report_cache_key(b="x", a=1))
+        self.assertNotEqual(report_cache_key(a=1), report_cache_key(a=2))
+
+    def test_default_range_shares_one_key(self):
+        first = ReportParams.from_query({"supplier": " ACME "})
+        with mock.patch("django.utils.timezone.now", return_value=timezone.now() + timedelta(minutes=5)):
+            later = ReportParams.from_query({"supplier": "acme"})
+        self.assertEqual(first.cache_key("users"), later.cache_key("users"))
+        self.assertNotEqual(first.cache_key("users"), first.cache_key("visits"))
+
+    def test_revenue_permission_is_part_of_the_key(self):
+        params = ReportParams.from_query({})
+        staff = ReportParams.from_query({}, can_see_revenue=True)
+        self.assertNotEqual(params.cache_key("orders_by_supplier"), staff.cache_key("orders_by_supplier"))
+
+    def test_closed_period_gets_long_ttl(self):
+        closed = ReportParams.from_query({"date_from": "2025-01-01", "date_to": "2025-02-01"})
+        current = ReportParams.from_query({"date_from": "2025-01-01"})
+        self.assertTrue(closed.closed)
+        self.assertFalse(current.closed)
+        self.assertEqual(report_ttl(closed.closed), report_cache.REPORT_CACHE_TTL_CLOSED)
+        self.assertEqual(report_ttl(current.closed), report_cache.REPORT_CACHE_TTL_CURRENT)
+
+
+class GetOrComputeTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_computes_once_then_serves_cache(self):
+        compute = mock.Mock(return_value=[1])
+        self.assertEqual(get_or_compute("k", 60, compute), [1])
+        self.assertEqual(get_or_compute("k", 60, compute), [1])
+        compute.assert_called_once()
+
+    def test_concurrent_requests_share_one_computation(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.1)
+            return ["x"]
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(get_or_compute("k2", 60, compute)))
+                   for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(5)
+        self.assertEqual(results, [["x"]] * 5)
+        self.assertEqual(len(calls), 1)
+
+    def test_waits_for_other_process_holding_the_lock(self):
+        cache.add("k3:lock", 1)  # process khác đang tính
+        compute = mock.Mock(return_value=["mine"])
+        threading.Timer(0.2, lambda: cache.set("k3", ["theirs"], 60)).start()
+        self.assertEqual(get_or_compute("k3", 60, compute), ["theirs"])
+        compute.assert_not_called()
+
+    @mock.patch.object(report_cache, "REPORT_CACHE_WAIT_SECONDS", 0.2)
+    def test_computes_itself_when_lock_holder_is_too_slow(self):
+        cache.add("k4:lock", 1)
+        self.assertEqual(get_or_compute("k4", 60, lambda: ["mine"]), ["mine"])
+        self.assertTrue(cache.get("k4:lock"))  # khóa của process khác không bị xóa
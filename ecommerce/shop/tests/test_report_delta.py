@@ -0,0 +1,67 @@
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from .. import reports
+from ..models import Category, ConsultationRequest, Product
+
+
+class ReportDeltaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user("delta-staff", is_staff=True)
+        cat = Category.objects.create(name="Danh mục delta")
+        cls.product = Product.objects.create(name="SP delta", category=cat, price=1000)
+        ConsultationRequest.objects.create(product=cls.product)
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse("shop:admin_reports_data")
+        self.client.force_login(self.staff)
+        self.full = self.client.get(self.url).json()
+
+    def _since(self, version, **query):
+        cache.clear()  # bỏ cache kết quả để thấy dữ liệu mới ngay
+        return self.client.get(self.url, {"since": version, **query}).json()
+
+    def test_full_payload_carries_version(self):
+        self.assertFalse(self.full["delta"])
+        self.assertIn("consult_by_status", self.full)
+        self.assertTrue(self.full["version"])
+
+    def test_unchanged_data_returns_empty_delta(self):
+        data = self._since(self.full["version"])
+        self.assertTrue(data["delta"])
+        self.assertEqual(data["removed"], {})
+        changed = {ds.payload_key for ds in reports.DATASETS.values()} & set(data)
+        self.assertEqual(changed, set())
+
+    def test_only_changed_datasets_are_sent(self):
+        ConsultationRequest.objects.create(product=self.product, status=ConsultationRequest.Status.DONE)
+        data = self._since(self.full["version"])
+        self.assertTrue(data["delta"])
+        self.assertEqual(len(data["consult_by_status"]), 2)
+        self.assertEqual([r["total"] for r in data["consult_by_period"]], [2])  # chỉ kỳ hôm nay
+        self.assertNotIn("users_by_period", data)
+        # version mới làm mốc cho lần sau
+        self.assertTrue(self._since(data["version"])["delta"])
+        self.assertNotIn("consult_by_status", self._since(data["version"]))
+
+    def test_invalid_token_returns_full_payload(self):
+        data = self._since("not-a-token")
+        self.assertFalse(data["delta"])
+        self.assertIn("users_by_period", data)
+
+    def test_stale_token_returns_full_payload(self):
+        later = time.time() + reports.REPORT_DELTA_FULL_SECONDS + 1
+        with mock.patch("shop.reports.time.time", return_value=later):
+            data = self._since(self.full["version"])
+        self.assertFalse(data["delta"])
+
+    def test_token_from_other_filters_returns_full_payload(self):
+        data = self._since(self.full["version"], supplier="ACME")
+        self.assertFalse(data["delta"])
@@ -0,0 +1,59 @@
+import codecs
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from ..exports import csv_chunks
+
+
+class CsvChunksTests(SimpleTestCase):
+    def test_bom_once_then_row_blocks(self):
+        rows = [{"a": i, "b": None} for i in range(5)]
+        chunks = list(csv_chunks(["a", "b"], rows, chunk_rows=2))
+        self.assertTrue(chunks[0].startswith(codecs.BOM_UTF8))
+        self.assertEqual(b"".join(chunks).count(codecs.BOM_UTF8), 1)
+        self.assertEqual(len(chunks), 1 + 3)  # tiêu đề + 2 + 2 + 1 dòng
+        self.assertEqual(chunks[-1], b"4,\r\n")
+
+    def test_rows_are_consumed_lazily(self):
+        def rows():
+            yield {"a": 1}
+            raise AssertionError("không được đọc trước")
+
+        chunks = csv_chunks(["a"], rows(), chunk_rows=1)
+        next(chunks)
+        self.assertEqual(next(chunks), b"1\r\n")
+
+
+class ReportsDataViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.url = reverse("shop:admin_reports_data")
+
+    def test_anonymous_is_redirected_to_login(self):
+        for query in ({}, {"fmt": "csv", "kind": "order_lines"}, {"fmt": "csv", "kind": "users"}):
+            resp = self.client.get(self.url, query)
+            self.assertEqual(resp.status_code, 302)
+            self.assertNotIn(b"\xef\xbb\xbf", resp.content)
+
+    def test_non_staff_is_refused(self):
+        self.client.force_login(User.objects.create_user("report-customer"))
+        resp = self.client.get(self.url, {"fmt": "csv", "kind": "users"})
+        self.assertIn(resp.status_code, (302, 403))
+
+    def test_staff_gets_json_and_csv(self):
+        self.client.force_login(User.objects.create_user("report-staff", is_staff=True))
+        self.assertIn("users_by_period", self.client.get(self.url).json())
+
+        resp = self.client.get(self.url, {"fmt": "csv", "kind": "users"})
+        self.assertTrue(resp.streaming)
+        body = b"".join(resp.streaming_content)
+        self.assertTrue(body.startswith(codecs.BOM_UTF8 + b"period,count"))
+
+    def test_streaming_dataset_needs_background_export(self):
+        self.client.force_login(User.objects.create_user("report-staff", is_staff=True))
+        resp = self.client.get(self.url, {"fmt": "csv", "kind": "order_lines"})
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.json(), {"error": "use background export"})
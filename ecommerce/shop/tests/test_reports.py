@@ -0,0 +1,51 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from ..models import Category, ConsultationRequest, Product
+from ..reports import DATASETS, ReportParams, build_payload, get_dataset, iter_rows, resolve
+
+
+class DatasetRegistryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_resolve_accepts_legacy_aliases(self):
+        self.assertEqual(resolve("supplier").name, "orders_by_supplier")
+        self.assertEqual(resolve(" Consult_Status ").name, "consult_by_status")
+        self.assertIsNone(resolve("nope"))
+
+    def test_streaming_dataset_is_not_cached_or_in_payload(self):
+        with self.assertRaises(KeyError):
+            get_dataset("order_lines", ReportParams.from_query({}))
+        payload = build_payload(ReportParams.from_query({}))
+        self.assertNotIn("order_lines", payload)
+        expected = {ds.payload_key for ds in DATASETS.values() if not ds.streaming}
+        self.assertTrue(expected <= set(payload))
+
+    def test_money_columns_hidden_without_permission(self):
+        ds = resolve("orders_by_supplier")
+        self.assertNotIn("revenue", ds.headers(ReportParams.from_query({})))
+        self.assertIn("revenue", ds.headers(ReportParams.from_query({}, can_see_revenue=True)))
+
+    def test_each_dataset_computes_only_itself(self):
+        User.objects.create_user("report-a")
+        User.objects.create_user("report-b")
+        cat = Category.objects.create(name="Danh mục báo cáo")
+        product = Product.objects.create(name="SP báo cáo", category=cat, price=1000)
+        ConsultationRequest.objects.create(product=product)
+        ConsultationRequest.objects.create(product=product, status=ConsultationRequest.Status.DONE)
+
+        params = ReportParams.from_query({"date_to": (timezone.localdate() + timedelta(days=1)).isoformat()})
+        users = list(iter_rows(resolve("users"), params))
+        self.assertEqual(sum(r["count"] for r in users), 2)
+        self.assertEqual(
+            get_dataset("consult_by_status", params),
+            [{"status": "done", "count": 1}, {"status": "new", "count": 1}],
+        )
+        # kết quả đã nằm trong cache theo khóa của riêng dataset
+        self.assertEqual(cache.get(params.cache_key("users")), users)
+        self.assertIsNone(cache.get(params.cache_key("visits")))
@@ -0,0 +1,72 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from .. import rollups
+from ..facts import day_start
+from ..models import PageView, PageViewDaily, RollupWatermark
+from ..rollups import WATERMARK_NAME, rollup_pageviews, visits_series
+
+
+def _view(key, created_at=None, **kwargs):
+    return PageView.objects.create(path="/", session_key=key, created_at=created_at or timezone.now(), **kwargs)
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.yesterday = timezone.now() - timedelta(days=1)
+
+    def _series(self):
+        today = timezone.localdate()
+        return visits_series(day_start(today - timedelta(days=2)), day_start(today + timedelta(days=1)))
+
+    @mock.patch.object(rollups, "PAGEVIEW_ROLLUP_LAG_SECONDS", 0)
+    def test_series_same_before_and_after_rollup(self):
+        for i in range(3):
+            _view(f"k{i}", self.yesterday)
+        _view("bot", self.yesterday, is_bot=True)
+        _view("k0")
+        before = self._series()
+
+        result = rollup_pageviews(batch_size=2)
+        self.assertEqual(result.rows, 5)
+        self.assertEqual(self._series(), before)
+        self.assertEqual(before[0]["views"], 3)
+        self.assertEqual(before[0]["bot_views"], 1)
+
+    @mock.patch.object(rollups, "PAGEVIEW_ROLLUP_LAG_SECONDS", 0)
+    def test_rerun_does_not_double_count(self):
+        _view("a", self.yesterday)
+        rollup_pageviews()
+        rollup_pageviews()
+        self.assertEqual(PageViewDaily.objects.get().views, 1)
+
+    @mock.patch.object(rollups, "PAGEVIEW_ROLLUP_LAG_SECONDS", 60)
+    def test_watermark_waits_for_lag_before_passing_new_ids(self):
+        first = _view("a", self.yesterday)
+        gap = _view("late", self.yesterday)  # id đã cấp, giả lập transaction chưa commit
+        gap_data = {"id": gap.pk, "path": gap.path, "session_key": gap.session_key, "created_at": gap.created_at}
+        gap.delete()
+        last = _view("b", self.yesterday)
+
+        self.assertEqual(rollup_pageviews().rows, 0)  # lần đầu chỉ ghi nhận mốc
+        wm = RollupWatermark.objects.get(name=WATERMARK_NAME)
+        self.assertEqual((wm.last_id, wm.horizon_id), (0, last.pk))
+
+        PageView.objects.create(**gap_data)  # commit trễ, id nhỏ hơn mốc
+        self.assertEqual(rollup_pageviews().rows, 0)  # mốc chưa đủ tuổi
+
+        later = timezone.now() + timedelta(seconds=61)
+        with mock.patch("shop.rollups.timezone.now", return_value=later):
+            self.assertEqual(rollup_pageviews().rows, 3)
+        self.assertEqual(RollupWatermark.objects.get(name=WATERMARK_NAME).last_id, last.pk)
+        self.assertEqual(PageViewDaily.objects.get().views, 3)
+        self.assertLess(first.pk, gap_data["id"])
+
+    @mock.patch.object(rollups, "PAGEVIEW_ROLLUP_LAG_SECONDS", 60)
+    def test_pending_rows_still_reported_while_waiting(self):
+        _view("a", self.yesterday)
+        rollup_pageviews()
+        self.assertEqual(self._series()[0]["views"], 1)
@@ -0,0 +1,77 @@
+from decimal import Decimal
+from io import StringIO
+
+from cart.models import Order as CartOrder, OrderItem as CartItem
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+
+from .. import sales
+from ..models import Category, Order, OrderItem, Product, SalesLine
+from ..signals import order_lines_created
+
+
+class SalesLineSyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cat = Category.objects.create(name="Danh mục sales")
+        cls.product = Product.objects.create(name="SP sales", category=cls.cat, price=100, supplier="ACME")
+        cls.user = User.objects.create_user("sales-buyer")
+
+    def _shop_order(self, status=Order.Status.PAID, qty=2):
+        order = Order.objects.create(status=status, user=self.user)
+        OrderItem.objects.create(order=order, product=self.product, quantity=qty, price=Decimal("10"))
+        return order
+
+    def test_shop_order_is_mirrored_with_copied_dimensions(self):
+        order = self._shop_order()
+        line = SalesLine.objects.get()
+        self.assertEqual((line.source, line.order_id, line.state), ("shop", order.pk, "confirmed"))
+        self.assertEqual((line.supplier, line.category_id, line.line_total), ("ACME", self.cat.pk, Decimal("20")))
+
+    def test_status_change_and_item_delete_follow_the_order(self):
+        order = self._shop_order()
+        order.status = Order.Status.REFUNDED
+        order.save()
+        self.assertEqual(SalesLine.objects.get().state, "cancelled")
+        order.items.get().delete()
+        self.assertFalse(SalesLine.objects.exists())
+
+    def test_cart_bulk_created_lines_need_the_signal(self):
+        order = CartOrder.objects.create(user=self.user, status=CartOrder.Status.PENDING_ADMIN)
+        CartItem.objects.bulk_create([CartItem(order=order, product=self.product, price=Decimal("5"), quantity=3)])
+        self.assertFalse(SalesLine.objects.exists())  # bulk_create không có post_save
+
+        order_lines_created.send(sender=CartOrder, order=order)
+        line = SalesLine.objects.get()
+        self.assertEqual((line.source, line.state, line.quantity), ("cart", "open", 3))
+
+        order.status = CartOrder.Status.CONFIRMED
+        order.save()
+        self.assertEqual(SalesLine.objects.get().state, "confirmed")
+
+    def test_product_dimension_change_is_copied(self):
+        self._shop_order()
+        self.product.supplier = "Globex"
+        self.product.save()
+        self.assertEqual(SalesLine.objects.get().supplier, "Globex")
+
+    def test_check_finds_and_fixes_drift(self):
+        order = self._shop_order()
+        other = self._shop_order(qty=1)
+        SalesLine.objects.filter(order_id=order.pk).update(quantity=99)
+        SalesLine.objects.filter(order_id=other.pk).delete()
+        self.assertEqual(sales.check(["shop"]), {"shop": sorted([order.pk, other.pk])})
+
+        out = StringIO()
+        call_command("check_sales_lines", "--fix", stdout=out)
+        self.assertEqual(sales.check(), {"shop": [], "cart": []})
+        self.assertEqual(SalesLine.objects.get(order_id=order.pk).quantity, 2)
+
+    def test_backfill_rebuilds_from_scratch_without_duplicates(self):
+        self._shop_order()
+        self._shop_order(status=Order.Status.CANCELLED)
+        SalesLine.objects.all().delete()
+        self.assertEqual(sales.backfill(batch_size=1), 2)
+        self.assertEqual(sales.backfill(), 0)  # chạy lại: không thêm/sửa gì
+        self.assertEqual(sorted(SalesLine.objects.values_list("state", flat=True)), ["cancelled", "confirmed"])
@@ -0,0 +1,80 @@
+from datetime import date
+from unittest import mock
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from .. import analytics
+from ..analytics import BloomFilter, PageViewWriter, SeenTodayFilter
+from ..middleware import PageViewMiddleware
+
+
+class BloomFilterTests(SimpleTestCase):
+    def test_no_false_negatives_and_low_false_positive_rate(self):
+        bloom = BloomFilter(2000, 0.01)
+        for i in range(2000):
+            bloom.add(f"in-{i}")
+        self.assertTrue(all(f"in-{i}" in bloom for i in range(2000)))
+        false_pos = sum(f"out-{i}" in bloom for i in range(5000))
+        self.assertLess(false_pos, 5000 * 0.03)
+
+    def test_add_reports_new_keys(self):
+        bloom = BloomFilter(100, 0.01)
+        self.assertTrue(bloom.add("a"))
+        self.assertFalse(bloom.add("a"))
+        self.assertEqual(bloom.count, 1)
+
+
+class SeenTodayFilterTests(SimpleTestCase):
+    def test_seen_only_after_mark(self):
+        f = SeenTodayFilter(capacity=100)
+        self.assertFalse(f.seen("s1"))
+        self.assertFalse(f.seen("s1"))  # seen() không tự ghi nhận
+        f.mark("s1")
+        self.assertTrue(f.seen("s1"))
+        self.assertFalse(f.seen(""))
+
+    def test_rotates_at_local_midnight(self):
+        f = SeenTodayFilter(capacity=100)
+        with mock.patch("shop.analytics.timezone.localdate", return_value=date(2026, 1, 1)):
+            f.mark("s1")
+            self.assertTrue(f.seen("s1"))
+        with mock.patch("shop.analytics.timezone.localdate", return_value=date(2026, 1, 2)):
+            self.assertFalse(f.seen("s1"))
+
+    def test_saturated_filter_stops_answering_seen(self):
+        f = SeenTodayFilter(capacity=3)
+        for key in ("a", "b", "c"):
+            f.mark(key)
+        self.assertTrue(f.stats()["saturated"])
+        self.assertFalse(f.seen("a"))  # rơi về kiểm tra DB ở writer
+
+
+@mock.patch.object(analytics, "PAGEVIEW_ASYNC", True)
+class MarkAfterEnqueueTests(SimpleTestCase):
+    def _writer(self, max_queue):
+        writer = PageViewWriter(max_queue=max_queue, seen=SeenTodayFilter(capacity=100))
+        writer._ensure_started = lambda: None
+        return writer
+
+    def test_marked_when_queued(self):
+        writer = self._writer(10)
+        self.assertTrue(writer.put({"session_key": "s1"}))
+        self.assertTrue(writer.seen.seen("s1"))
+
+    def test_dropped_visit_is_not_marked(self):
+        writer = self._writer(1)
+        writer.put({"session_key": "s1"})
+        self.assertFalse(writer.put({"session_key": "s2"}))
+        self.assertEqual(writer.dropped, 1)
+        self.assertFalse(writer.seen.seen("s2"))  # lần sau vẫn được xếp hàng
+
+    def test_middleware_skips_visitor_seen_today(self):
+        seen = SeenTodayFilter(capacity=100)
+        middleware = PageViewMiddleware(lambda r: HttpResponse())
+        request = RequestFactory().get("/", REMOTE_ADDR="10.0.0.7")
+        with mock.patch("shop.middleware.seen_today", seen):
+            event = middleware._event(request)
+            self.assertIsNotNone(event)
+            seen.mark(event["session_key"])
+            self.assertIsNone(middleware._event(RequestFactory().get("/", REMOTE_ADDR="10.0.0.7")))
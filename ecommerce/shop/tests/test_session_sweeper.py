@@ -0,0 +1,72 @@
+from datetime import timedelta
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+
+from cart.cart import CART_SESSION_ID, CART_SESSION_VERSION
+
+from ..middleware import PageViewMiddleware, visitor_key
+from ..session_sweeper import session_table_stats, sweep_sessions
+
+SessionStore = import_module(settings.SESSION_ENGINE).SessionStore
+
+
+def _session(data, expired=False):
+    store = SessionStore()
+    store.update(data)
+    store.create()
+    if expired:
+        Session.objects.filter(session_key=store.session_key).update(expire_date=timezone.now() - timedelta(days=1))
+    return store.session_key
+
+
+class SweepSessionsTests(TestCase):
+    def setUp(self):
+        self.expired = [_session({"x": 1}, expired=True) for _ in range(3)]
+        self.empty = [
+            _session({}),
+            _session({CART_SESSION_ID: {"v": CART_SESSION_VERSION, "l": []}}),  # giỏ v2 rỗng
+            _session({"flag": None}),
+        ]
+        self.kept = [
+            _session({"_auth_user_id": "1"}),
+            _session({CART_SESSION_ID: {"v": CART_SESSION_VERSION, "l": [[1, None, 1, 1000]]}}),
+        ]
+
+    def _left(self):
+        return set(Session.objects.values_list("session_key", flat=True))
+
+    def test_expired_only_by_default(self):
+        res = sweep_sessions(batch_size=2, pause=0)
+        self.assertEqual((res.expired, res.empty), (3, 0))
+        self.assertEqual(self._left(), set(self.empty + self.kept))
+
+    def test_empty_sessions_are_removed_in_batches(self):
+        res = sweep_sessions(include_empty=True, batch_size=2, pause=0)
+        self.assertEqual((res.expired, res.empty, res.scanned), (3, 3, 5))
+        self.assertEqual(self._left(), set(self.kept))
+
+    def test_dry_run_counts_without_deleting(self):
+        res = sweep_sessions(include_empty=True, batch_size=2, pause=0, dry_run=True)
+        self.assertEqual((res.expired, res.empty), (3, 3))
+        self.assertEqual(len(self._left()), 8)
+
+    def test_table_stats(self):
+        stats = session_table_stats()
+        self.assertEqual((stats["rows"], stats["expired"]), (8, 3))
+        self.assertGreater(stats["data_bytes"], 0)
+
+
+class AnonymousVisitTests(TestCase):
+    def test_pageview_does_not_create_session(self):
+        request = RequestFactory().get("/", HTTP_USER_AGENT="Mozilla/5.0 Firefox/121.0")
+        request.session = SessionStore()
+        event = PageViewMiddleware(lambda r: HttpResponse())._event(request)
+
+        self.assertEqual(event["session_key"], visitor_key(request))
+        self.assertIsNone(request.session.session_key)
+        self.assertFalse(Session.objects.exists())
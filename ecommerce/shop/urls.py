@@ -22,6 +22,8 @@ urlpatterns = [
     
     path('consult/request/<int:product_id>/', views.consult_request, name='consult_request'),
     path('manage/consults/', views.consult_list, name='consult_list'),
+    path('manage/consults/mine/', views.consult_my_queue, name='consult_my_queue'),
+    path('manage/consults/feed/', views.consult_feed, name='consult_feed'),
     path('manage/consults/<int:pk>/done/', views.consult_mark_done, name='consult_mark_done'),
     
     
@@ -36,6 +38,9 @@ urlpatterns = [
     path('manage/reports/', views.admin_reports, name='admin_reports'),
     path('manage/reports/data/', views.admin_reports_data, name='admin_reports_data'),
     path('manage/reports/export/', views.admin_reports_export, name='admin_reports_export'),
+    path('manage/reports/jobs/', views.admin_export_jobs, name='admin_export_jobs'),
+    path('manage/reports/jobs/<int:pk>/', views.admin_export_job_status, name='admin_export_job_status'),
+    path('manage/reports/jobs/<int:pk>/download/', views.admin_export_job_download, name='admin_export_job_download'),
     
     # Quản lý gói dịch vụ
     path('manage/product/<int:product_id>/plans/create/', views.admin_serviceplan_create, name='admin_serviceplan_create'),
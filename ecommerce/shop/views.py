@@ -5,13 +5,16 @@ from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
 from django.db.models import Prefetch, Q
 from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.template.loader import render_to_string
 from django.urls import reverse
 from django.utils import timezone
 from django.views.decorators.http import require_GET, require_POST
 from django.http import JsonResponse, HttpRequest  
 
 from .forms import CategoryForm, ProductForm, ProductImagesForm, ServicePlanForm
+from .live import CONSULT_WATERMARK, live_feed_response
 from .models import Category, Product, ProductImage, ConsultationRequest
+from .ratelimit import ratelimit
 
 # (tuỳ dự án) nếu có app news
 try:
@@ -193,26 +196,20 @@ def product_detail(request, slug):
 
 @login_required
 @require_POST
+@ratelimit(
+    "consult",
+    key=lambda request, product_id: f"u:{request.user.pk}:p:{product_id}",
+    message="Bạn đã gửi yêu cầu tư vấn gần đây. Vui lòng đợi nhân viên liên hệ.",
+)
 def consult_request(request, product_id: int):
     """
     Khách xác nhận cần tư vấn 1 sản phẩm:
-    - Chống spam: chặn gửi lặp trong 2 phút.
+    - Chống spam: mỗi user/sản phẩm 1 lần mỗi 2 phút (shop/ratelimit.py, đếm trong cache).
     - Lưu snapshot SĐT tại thời điểm gửi.
     - AJAX: trả JSON {ok, message}; non-AJAX: messages + redirect.
     """
     product = get_object_or_404(Product, pk=product_id, is_active=True)
 
-    # chống spam
-    recent = timezone.now() - timezone.timedelta(minutes=2)
-    if ConsultationRequest.objects.filter(
-        user=request.user, product=product, status="pending", created_at__gte=recent
-    ).exists():
-        msg = "Bạn đã gửi yêu cầu tư vấn gần đây. Vui lòng đợi nhân viên liên hệ."
-        if _is_ajax(request):
-            return JsonResponse({"ok": False, "message": msg}, status=200)
-        messages.info(request, msg)
-        return redirect(request.META.get("HTTP_REFERER") or reverse("shop:product_detail", args=[product.slug]))
-
     # tạo mới
     phone = _get_user_phone(request.user)
     ConsultationRequest.objects.create(
@@ -236,8 +233,13 @@ def consult_list(request):
     ?status=pending|done (mặc định pending)
     """
     status = request.GET.get("status") or "pending"
+    # đọc watermark TRƯỚC khi query danh sách: dòng tạo xen giữa sẽ đến qua feed
+    # (JS bỏ qua nếu đã có trên trang)
+    feed_after = CONSULT_WATERMARK.current()
     qs = ConsultationRequest.objects.select_related("user", "product", "handled_by")
-    if status in ("pending", "done"):
+    if status == "pending":
+        qs = qs.filter(status__in=ConsultationRequest.OPEN_STATUSES)
+    elif status == "done":
         qs = qs.filter(status=status)
 
     paginator = Paginator(qs.order_by("-created_at"), 30)
@@ -251,10 +253,63 @@ def consult_list(request):
     return render(
         request,
         "shop/consult_list.html",
-        {"items": page.object_list, "status": status, "page_obj": page, "paginator": paginator},
+        {
+            "items": page.object_list, "status": status, "page_obj": page, "paginator": paginator,
+            # chỉ bật feed live ở trang đầu của tab đang chờ (dòng mới chèn lên đầu)
+            "feed_after": feed_after if (status == "pending" and page.number == 1) else None,
+        },
+    )
+
+
+@user_passes_test(lambda u: u.is_staff)
+def consult_my_queue(request):
+    """
+    Hàng đợi của staff đang đăng nhập: yêu cầu đang mở được giao cho mình
+    (shop/assignment.py), cũ nhất lên đầu. Đọc thẳng index (handled_by, status, created_at).
+    """
+    qs = (
+        ConsultationRequest.objects
+        .filter(handled_by=request.user, status__in=ConsultationRequest.OPEN_STATUSES)
+        .select_related("user", "product", "handled_by")
+        .order_by("created_at")
+    )
+    paginator = Paginator(qs, 30)
+    try:
+        page = paginator.page(int(request.GET.get("page", 1)))
+    except (PageNotAnInteger, ValueError):
+        page = paginator.page(1)
+    except EmptyPage:
+        page = paginator.page(paginator.num_pages)
+
+    return render(
+        request,
+        "shop/consult_list.html",
+        {"items": page.object_list, "status": "mine", "page_obj": page, "paginator": paginator, "feed_after": None},
     )
 
 
+@user_passes_test(lambda u: u.is_staff)
+@require_GET
+def consult_feed(request):
+    """
+    SSE (hoặc long-poll với ?poll=1): đẩy các yêu cầu tư vấn MỚI đang chờ.
+    Client gửi ?after=<id> (hoặc header Last-Event-ID khi tự nối lại).
+    """
+    def fetch_new(after, limit):
+        return (
+            ConsultationRequest.objects
+            .filter(pk__gt=after, status__in=ConsultationRequest.OPEN_STATUSES)
+            .select_related("user", "product", "handled_by")
+            .order_by("pk")[:limit]
+        )
+
+    def render_item(r):
+        html = render_to_string("shop/_consult_row.html", {"r": r}, request=request)
+        return {"id": r.pk, "html": html}
+
+    return live_feed_response(request, CONSULT_WATERMARK, fetch_new, render_item)
+
+
 # shop/views.py  (chỉ thay trong consult_mark_done)
 @user_passes_test(lambda u: u.is_staff)
 @require_POST
@@ -483,9 +538,11 @@ def _staff(u): return u.is_staff
 def admin_reports(request):
     categories = Category.objects.all().order_by("name")
     suppliers = Product.objects.exclude(supplier="").values_list("supplier", flat=True).distinct().order_by("supplier")
+    from .reports import DATASETS
     return render(request, "shop/admin_reports.html", {
         "categories": categories,
-        "suppliers": suppliers
+        "suppliers": suppliers,
+        "export_kinds": list(DATASETS),
     })
 
 from django.http import JsonResponse
@@ -508,16 +565,37 @@ from django.db.models.functions import TruncDate, TruncWeek, TruncMonth, Coalesc
 from django.contrib.auth.models import User
 from .models import OrderItem, Category, Product, PageView, ConsultationRequest
 
+def _export_dataset(ds, params, fmt):
+    """CSV/XLSX cho đúng 1 dataset (chỉ tính dataset đó), ghi theo dòng."""
+    from .exports import csv_response, xlsx_response
+    from .reports import iter_rows
+
+    if fmt not in ("csv", "xlsx"):
+        return JsonResponse({"error": "invalid format"}, status=400)
+
+    headers = ds.headers(params)
+    rows = iter_rows(ds, params)
+    if fmt == "csv":
+        # stream: BOM 1 lần + từng khối dòng, không dựng cả file trong bộ nhớ
+        return csv_response(ds.name, headers, rows)
+    # file tạm + FileResponse (openpyxl write_only, hoặc bộ ghi tối giản nếu thiếu openpyxl)
+    return xlsx_response(ds.name, headers, rows)
+
+
+@login_required
+@user_passes_test(_staff)
 def admin_reports_data(request):
     """
     JSON báo cáo cho dashboard admin:
       - users_by_period
       - visits_by_period
+      - unique_visitors
       - orders_by_supplier
       - orders_by_category
       - consult_by_status
       - consult_by_staff
       - consult_by_period
+      - cohorts (tháng đăng ký x số tháng tới đơn xác nhận đầu tiên)
       - can_see_revenue (bool)
 
     Query params:
@@ -525,311 +603,106 @@ def admin_reports_data(request):
       group_by = day|week|month (default: day)
       supplier (optional, exact match)
       category_id (optional, int)
-      fmt = csv|xlsx (optional, để xuất file)
-      kind = users|visits|orders_by_supplier|orders_by_category|consult_by_status|consult_by_staff|consult_by_period
-    """
-    # ====== imports cục bộ cho export tránh thiếu ======
-    import io, csv
-    try:
-        import openpyxl   # pip install openpyxl nếu muốn export xlsx
-    except Exception:
-        openpyxl = None
-
-    from django.http import JsonResponse, HttpResponse, HttpResponseBadRequest
-    from django.utils import timezone
-    from django.db.models import (
-        Q, F, Count, Sum, Avg, DurationField, DecimalField, ExpressionWrapper,
-        Value, CharField
-    )
-    from django.db.models.functions import (
-        TruncDate, TruncWeek, TruncMonth, Coalesce, Concat
-    )
-    from django.contrib.auth.models import User
-
-    from .models import OrderItem, Category, Product, PageView, ConsultationRequest
-
-    # ====== parse params ======
-    df = request.GET.get("date_from")
-    dt = request.GET.get("date_to")
-    supplier = (request.GET.get("supplier") or "").strip()
-    category_id = request.GET.get("category_id")
-    group_by = (request.GET.get("group_by") or "day").lower()
-
-    now = timezone.now()
-    date_to = timezone.datetime.fromisoformat(dt) if dt else now
-    date_from = timezone.datetime.fromisoformat(df) if df else (now - timezone.timedelta(days=30))
-    if timezone.is_naive(date_from): date_from = timezone.make_aware(date_from)
-    if timezone.is_naive(date_to):   date_to   = timezone.make_aware(date_to)
-
-    # Chọn hàm group theo kỳ
-    G = TruncDate
-    if group_by == "week":
-        G = TruncWeek
-    elif group_by == "month":
-        G = TruncMonth
-
-    # Quyền xem doanh thu
-    can_see_revenue = bool(getattr(request.user, "is_staff", False) or getattr(request.user, "is_superuser", False))
-
-    # ====== Users mới theo kỳ ======
-    users_qs = (
-        User.objects.filter(date_joined__gte=date_from, date_joined__lt=date_to)
-        .annotate(p=G("date_joined"))
-        .values("p")
-        .annotate(count=Count("id"))
-        .order_by("p")
-    )
-    users_by_period = [
-        {
-            "period": (x["p"].isoformat() if hasattr(x["p"], "isoformat") else str(x["p"])),
-            "count": x["count"]
-        }
-        for x in users_qs
-    ]
-
-    # ====== OrderItem base + filters ======
-    items = (
-        OrderItem.objects
-        .filter(order__created_at__gte=date_from, order__created_at__lt=date_to)
-        .select_related("product", "order", "product__category")
-    )
-    if supplier:
-        items = items.filter(product__supplier__iexact=supplier)
-    if category_id and str(category_id).isdigit():
-        items = items.filter(product__category_id=int(category_id))
-
-    # Tính line_total trước rồi mới Sum để tránh lỗi aggregate
-    items = items.annotate(
-        line_total=ExpressionWrapper(
-            Coalesce(F("price"), 0) * Coalesce(F("quantity"), 0),
-            output_field=DecimalField(max_digits=18, decimal_places=2),
-        )
-    )
+      fmt = csv|xlsx (optional, để xuất file; dataset streaming như order_lines
+            chỉ xuất qua job nền admin_reports_export)
+      kind = users|visits|orders_by_supplier|orders_by_category|consult_by_status|consult_by_staff|consult_by_period|cohorts
+      since = "version" của lần tải trước (optional): chỉ trả phần đổi ("delta": true),
+              token hỏng/quá cũ/khác bộ lọc thì trả đủ ("delta": false)
 
-    # ====== Orders by supplier ======
-    by_supplier_qs = (
-        items.values("product__supplier")
-        .annotate(
-            orders=Count("id"),
-            quantity=Sum("quantity"),
-            revenue=Sum("line_total"),
-        )
-        .order_by("product__supplier")
-    )
-    orders_by_supplier = [
-        {
-            "supplier": r["product__supplier"] or "(khác/không rõ)",
-            "orders": r["orders"] or 0,
-            "quantity": int(r["quantity"] or 0),
-            "revenue": float(r["revenue"] or 0) if can_see_revenue else None,
-        }
-        for r in by_supplier_qs
-    ]
-
-    # ====== Orders by category ======
-    by_category_qs = (
-        items.values("product__category__name")
-        .annotate(
-            orders=Count("id"),
-            quantity=Sum("quantity"),
-            revenue=Sum("line_total"),
-        )
-        .order_by("product__category__name")
-    )
-    orders_by_category = [
-        {
-            "category": r["product__category__name"] or "(khác)",
-            "orders": r["orders"] or 0,
-            "quantity": int(r["quantity"] or 0),
-            "revenue": float(r["revenue"] or 0) if can_see_revenue else None,
-        }
-        for r in by_category_qs
-    ]
-
-    # ====== Lượt truy cập theo kỳ (sessions ~ ip + user_agent) ======
-    visits_qs = (
-        PageView.objects.filter(created_at__gte=date_from, created_at__lt=date_to)
-        .annotate(p=G("created_at"))
-        .annotate(k=Concat("ip", Value("|"), "user_agent", output_field=CharField()))
-        .values("p")
-        .annotate(views=Count("id"), sessions=Count("k", distinct=True))
-        .order_by("p")
-    )
-    visits_by_period = [
-        {
-            "period": (x["p"].isoformat() if hasattr(x["p"], "isoformat") else str(x["p"])),
-            "views": x["views"],
-            "sessions": x["sessions"],
-        }
-        for x in visits_qs
-    ]
-
-    # ====== Báo cáo Tư vấn ======
-    consult_base = ConsultationRequest.objects.filter(created_at__gte=date_from, created_at__lt=date_to)
-
-    consult_by_status_qs = consult_base.values("status").annotate(count=Count("id")).order_by("status")
-    consult_by_status = [{"status": c["status"], "count": c["count"]} for c in consult_by_status_qs]
-
-    consult_by_staff_qs = (
-        consult_base.values(staff=F("handled_by__username"))
-        .annotate(count=Count("id"))
-        .order_by("staff")
-    )
-    consult_by_staff = [{"staff": r["staff"] or "(chưa phân công)", "count": r["count"]} for r in consult_by_staff_qs]
-
-    # TB thời gian xử lý (handled_at - created_at); chỉ tính bản ghi có handled_at
-    handle_delta = ExpressionWrapper(F("handled_at") - F("created_at"), output_field=DurationField())
-    consult_period_qs = (
-        consult_base.annotate(p=G("created_at"))
-        .values("p")
-        .annotate(
-            total=Count("id"),
-            done=Count("id", filter=Q(status="done")),
-            avg_secs=Avg(handle_delta),
-        )
-        .order_by("p")
-    )
-    consult_by_period = []
-    for x in consult_period_qs:
-        avg_seconds = x["avg_secs"].total_seconds() if x["avg_secs"] else None
-        consult_by_period.append({
-            "period": (x["p"].isoformat() if hasattr(x["p"], "isoformat") else str(x["p"])),
-            "total": x["total"],
-            "done": x["done"],
-            "avg_seconds": avg_seconds,
-        })
+    Số liệu từng phần nằm ở shop/reports.py (mỗi dataset 1 hàm, có cache).
+    """
+    from .reports import ReportParams, build_delta, build_payload, resolve
 
-    # ====== Build JSON ======
-    payload = {
-        "users_by_period": users_by_period,
-        "visits_by_period": visits_by_period,
-        "orders_by_supplier": orders_by_supplier,
-        "orders_by_category": orders_by_category,
-        "consult_by_status": consult_by_status,
-        "consult_by_staff": consult_by_staff,
-        "consult_by_period": consult_by_period,
-        "can_see_revenue": can_see_revenue,
-    }
+    params = ReportParams.from_request(request)
 
-    # ====== Xuất CSV/XLSX nếu được yêu cầu ======
+    # ====== Xuất CSV/XLSX nếu được yêu cầu: chỉ tính dataset đó ======
     fmt = (request.GET.get("fmt") or "").lower().strip()
     kind = (request.GET.get("kind") or "").lower().strip()
-
-    def _rows_and_headers(kind: str):
-        if kind == "users":
-            return users_by_period, ["period", "count"]
-        if kind == "visits":
-            return visits_by_period, ["period", "views", "sessions"]
-        if kind == "orders_by_supplier":
-            return orders_by_supplier, ["supplier", "orders", "quantity", "revenue"]
-        if kind == "orders_by_category":
-            return orders_by_category, ["category", "orders", "quantity", "revenue"]
-        if kind == "consult_by_status":
-            return consult_by_status, ["status", "count"]
-        if kind == "consult_by_staff":
-            return consult_by_staff, ["staff", "count"]
-        if kind == "consult_by_period":
-            return consult_by_period, ["period", "total", "done", "avg_seconds"]
-        return None, None
-
     if fmt in {"csv", "xlsx"} and kind:
-        rows, headers = _rows_and_headers(kind)
-        if rows is None:
+        ds = resolve(kind)
+        if ds is None:
             return JsonResponse({"error": "invalid kind"}, status=400)
+        if ds.streaming:
+            # quét toàn bộ dòng bán hàng -> không giữ worker web, chạy bằng job nền
+            return JsonResponse({"error": "use background export"}, status=400)
+        return _export_dataset(ds, params, fmt)
 
-        if fmt == "csv":
-            buf = io.StringIO()
-            w = csv.writer(buf)
-            w.writerow(headers)
-            for r in rows:
-                w.writerow([r.get(h, "") for h in headers])
-            out = buf.getvalue().encode("utf-8-sig")
-            resp = HttpResponse(out, content_type="text/csv; charset=UTF-8")
-            resp["Content-Disposition"] = f'attachment; filename="{kind}-{timezone.now():%Y%m%d%H%M%S}.csv"'
-            return resp
-
-        if fmt == "xlsx":
-            if openpyxl is None:
-                return JsonResponse({"error": "openpyxl not installed"}, status=400)
-            wb = openpyxl.Workbook()
-            ws = wb.active; ws.title = kind
-            ws.append(headers)
-            for r in rows:
-                ws.append([r.get(h, "") for h in headers])
-            bio = io.BytesIO()
-            wb.save(bio)
-            resp = HttpResponse(bio.getvalue(),
-                content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-            resp["Content-Disposition"] = f'attachment; filename="{kind}-{timezone.now():%Y%m%d%H%M%S}.xlsx"'
-            return resp
-
-    return JsonResponse(payload)
-
-
-
-
+    since = request.GET.get("since")
+    payload = build_delta(params, since) if since else None
+    return JsonResponse(payload if payload is not None else build_payload(params))
 
 
 @user_passes_test(_staff)
 def admin_reports_export(request):
     """
-    Xuất CSV/XLSX cho 1 'dataset':
+    Tạo job xuất CSV/XLSX chạy nền (POST) cho 1 'dataset':
       kind=users|visits|supplier|category|consult_status|consult_staff|consult_period
+           (hoặc tên đầy đủ: orders_by_supplier, consult_by_status, ...)
+           | order_lines (mọi dòng đơn hàng cart)
       format=csv|xlsx
       (dùng chung tham số date_from/date_to/supplier/category_id/group_by như /data)
+
+    Trả 202 + thông tin job; file do worker `manage.py run_export_jobs` ghi vào
+    storage riêng ngoài MEDIA_ROOT, chỉ tải qua admin_export_job_download khi status=done.
     """
-    kind = request.GET.get("kind") or "supplier"
-    fmt  = (request.GET.get("format") or "csv").lower()
-    # gọi lại data JSON để tái sử dụng logic & phân quyền
-    data_resp = admin_reports_data(request)
-    if data_resp.status_code != 200:
-        return data_resp
-    data = data_resp.json()
-
-    # map dataset
-    map_kind = {
-        "users": ("users_by_period", ["period","count"]),
-        "visits": ("visits_by_period", ["period","views","sessions"]),
-        "supplier": ("orders_by_supplier", ["supplier","orders","quantity"] + (["revenue"] if data.get("can_see_revenue") else [])),
-        "category": ("orders_by_category", ["category","orders","quantity"] + (["revenue"] if data.get("can_see_revenue") else [])),
-        "consult_status": ("consult_by_status", ["status","count"]),
-        "consult_staff": ("consult_by_staff", ["staff","count"]),
-        "consult_period": ("consult_by_period", ["period","total","done","avg_seconds"]),
+    from .jobs import JobLimitExceeded, enqueue_export
+
+    if request.method != "POST":
+        return JsonResponse({"error": "POST required"}, status=405)
+    q = request.POST
+    try:
+        job = enqueue_export(q.get("kind") or "supplier", q.get("format") or "csv", q, request.user)
+    except JobLimitExceeded:
+        return JsonResponse({"error": "too many pending exports"}, status=429)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse(_job_json(job), status=202)
+
+
+def _job_json(job):
+    from django.urls import reverse
+    return {
+        "id": job.pk,
+        "kind": job.kind,
+        "format": job.fmt,
+        "status": job.status,
+        "rows": job.rows,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "status_url": reverse("shop:admin_export_job_status", args=[job.pk]),
+        "download_url": reverse("shop:admin_export_job_download", args=[job.pk]) if job.status == "done" else None,
     }
-    if kind not in map_kind:
-        return JsonResponse({"error": "invalid kind"}, status=400)
-    key, headers = map_kind[kind]
-    rows = data.get(key, [])
 
-    # CSV
-    if fmt == "csv":
-        buf = io.StringIO()
-        writer = csv.writer(buf)
-        writer.writerow(headers)
-        for r in rows:
-            writer.writerow([r.get(h, "") for h in headers])
-        out = buf.getvalue().encode("utf-8-sig")
-        resp = HttpResponse(out, content_type="text/csv; charset=UTF-8")
-        resp["Content-Disposition"] = f'attachment; filename="{kind}-{datetime.now():%Y%m%d%H%M%S}.csv"'
-        return resp
-
-    # XLSX
-    if fmt == "xlsx":
-        if openpyxl is None:
-            return JsonResponse({"error":"openpyxl not installed"}, status=400)
-        wb = openpyxl.Workbook()
-        ws = wb.active; ws.title = kind
-        ws.append(headers)
-        for r in rows:
-            ws.append([r.get(h, "") for h in headers])
-        bio = io.BytesIO()
-        wb.save(bio)
-        resp = HttpResponse(bio.getvalue(),
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-        resp["Content-Disposition"] = f'attachment; filename="{kind}-{datetime.now():%Y%m%d%H%M%S}.xlsx"'
-        return resp
-
-    return JsonResponse({"error": "invalid format"}, status=400)
+
+def _my_jobs(request):
+    from .models import ExportJob
+    qs = ExportJob.objects.all()
+    return qs if request.user.is_superuser else qs.filter(created_by=request.user)
+
+
+@user_passes_test(_staff)
+def admin_export_jobs(request):
+    jobs = _my_jobs(request)[:20]
+    return JsonResponse({"jobs": [_job_json(j) for j in jobs]})
+
+
+@user_passes_test(_staff)
+def admin_export_job_status(request, pk):
+    return JsonResponse(_job_json(get_object_or_404(_my_jobs(request), pk=pk)))
+
+
+@user_passes_test(_staff)
+def admin_export_job_download(request, pk):
+    from django.http import FileResponse, Http404
+    import os
+
+    job = get_object_or_404(_my_jobs(request), pk=pk, status="done")
+    if not job.file or not job.file.storage.exists(job.file.name):
+        raise Http404("File đã bị xóa")
+    # tên lưu: <id>-<token>-<tên>; khách nhận <tên>
+    filename = os.path.basename(job.file.name).split("-", 2)[-1]
+    return FileResponse(job.file.open("rb"), as_attachment=True, filename=filename)
 
 
 